@@ -1,7 +1,11 @@
 """Gap detection and analysis."""
-import aiosqlite
-from typing import Any, Dict, List, Set
+import asyncio
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, List, Sequence, Set
 
+import numpy as np
+
+from app.utils.database import DatabasePool
 from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -18,211 +22,289 @@ PRIORITY_HIGH = 'high'
 PRIORITY_MEDIUM = 'medium'
 PRIORITY_LOW = 'low'
 
+# One connection per detector so all four queries can run at once
+DETECTOR_POOL_SIZE = 4
+# Rows per worker-thread hop when iterating detector cursors
+DETECTOR_FETCH_SIZE = 1000
+# Batches at least this large get their priorities bucketed with NumPy
+VECTORIZE_MIN_ROWS = 256
+
+# Metadata fields checked by detect_metadata_gaps, in query column order
+METADATA_FIELDS = ('title', 'description', 'h1')
+
+# Priority bucket edges, ordered from the lowest bucket up
+MISSING_PAGE_BINS = (0.2, 0.35)
+MISSING_PAGE_PRIORITIES = (PRIORITY_HIGH, PRIORITY_MEDIUM, PRIORITY_LOW)
+THIN_CONTENT_BINS = (4.0, 5.0)
+THIN_CONTENT_PRIORITIES = (PRIORITY_LOW, PRIORITY_MEDIUM, PRIORITY_HIGH)
+
+
+def _bucket_priorities(
+    scores: Sequence[float],
+    bins: Sequence[float],
+    labels: Sequence[str],
+    right: bool = False
+) -> List[str]:
+    """
+    Map scores to priority labels by bucket.
+    
+    Follows ``np.digitize`` semantics: with ``right=False`` a score equal to an
+    edge falls in the upper bucket, with ``right=True`` in the lower one.
+    
+    Args:
+        scores: Scores to bucket
+        bins: Increasing bucket edges
+        labels: One label per bucket (``len(bins) + 1``)
+        right: Whether bucket intervals are closed on the right
+        
+    Returns:
+        Priority label for each score
+    """
+    if len(scores) >= VECTORIZE_MIN_ROWS:
+        arr = np.fromiter(scores, dtype=np.float64, count=len(scores))
+        indices = np.digitize(arr, bins, right=right)
+        return np.asarray(labels, dtype=object)[indices].tolist()
+    
+    find = bisect_left if right else bisect_right
+    return [labels[find(bins, score)] for score in scores]
+
+
+# Detector queries live at module scope so each is plain, reviewable SQL that
+# can be run and EXPLAINed on its own
+MISSING_PAGES_SQL = """
+    SELECT competitor_url, closest_match_url, similarity_score
+    FROM (
+        SELECT
+            competitor_url,
+            closest_match_url,
+            similarity_score,
+            ROW_NUMBER() OVER (
+                PARTITION BY competitor_url
+                ORDER BY similarity_score ASC
+            ) AS rn
+        FROM gaps
+        WHERE gap_type = ?
+        AND similarity_score < ?
+    )
+    WHERE rn = 1
+    ORDER BY similarity_score ASC
+"""
+
+# The title and h1 matches are separate joins so each can use its own partial
+# index; an OR in the join condition forces a nested-loop scan
+THIN_CONTENT_SQL = """
+    WITH matched AS (
+        SELECT p1.url AS primary_url, p1.word_count AS primary_words,
+               p2.url AS competitor_url, p2.word_count AS competitor_words
+        FROM pages p1
+        JOIN pages p2 ON p2.title = p1.title AND p2.is_primary = 0
+        WHERE p1.is_primary = 1
+        AND p1.word_count > 0
+        UNION ALL
+        SELECT p1.url, p1.word_count, p2.url, p2.word_count
+        FROM pages p1
+        JOIN pages p2 ON p2.h1 = p1.h1 AND p2.is_primary = 0
+        WHERE p1.is_primary = 1
+        AND p1.word_count > 0
+    ),
+    ranked AS (
+        SELECT
+            primary_url,
+            primary_words,
+            competitor_url,
+            competitor_words,
+            CAST(competitor_words AS FLOAT) / CAST(primary_words AS FLOAT) as ratio
+        FROM matched
+    )
+    SELECT primary_url, primary_words, competitor_url, competitor_words, ratio
+    FROM (
+        SELECT
+            primary_url, primary_words, competitor_url, competitor_words, ratio,
+            ROW_NUMBER() OVER (
+                PARTITION BY primary_url
+                ORDER BY ratio DESC
+            ) AS rn
+        FROM ranked
+        WHERE ratio > ?
+    )
+    WHERE rn = 1
+    ORDER BY ratio DESC
+"""
+
+# url is UNIQUE, so rows are already distinct
+METADATA_GAPS_SQL = """
+    SELECT
+        url,
+        IFNULL(title, '') = '' AS missing_title,
+        IFNULL(description, '') = '' AS missing_description,
+        IFNULL(h1, '') = '' AS missing_h1,
+        (IFNULL(title, '') = '')
+            + (IFNULL(description, '') = '')
+            + (IFNULL(h1, '') = '') AS missing_count
+    FROM pages
+    WHERE is_primary = 1
+    AND (title IS NULL OR description IS NULL OR h1 IS NULL)
+    ORDER BY url
+"""
+
+COMPETITOR_SCHEMA_PROBE_SQL = """
+    SELECT 1 FROM pages
+    WHERE is_primary = 0
+    AND schema_data IS NOT NULL
+    AND schema_data != ''
+    LIMIT 1
+"""
+
+SCHEMA_GAPS_SQL = """
+    SELECT
+        p1.url as primary_url,
+        p2.url as competitor_url,
+        g.similarity_score
+    FROM pages p1
+    JOIN gaps g ON g.closest_match_url = p1.url
+    JOIN pages p2 ON p2.url = g.competitor_url
+    WHERE p1.is_primary = 1
+    AND (p1.schema_data IS NULL OR p1.schema_data = '')
+    AND p2.is_primary = 0
+    AND p2.schema_data IS NOT NULL
+    AND p2.schema_data != ''
+    AND g.gap_type = ?
+    ORDER BY p1.url, g.similarity_score DESC
+"""
+
 
 async def detect_missing_pages(
-    db_path: str,
+    pool: DatabasePool,
     similarity_threshold: float = 0.45
 ) -> List[Dict[str, Any]]:
     """
     Detect competitor pages with no similar primary page.
     
     Args:
-        db_path: Path to database
+        pool: Database connection pool
         similarity_threshold: Threshold for considering pages similar
         
     Returns:
         List of missing page gaps (deduplicated)
     """
     gaps = []
-    processed_urls: Set[str] = set()  # Track URLs to avoid duplicates
     
-    async with aiosqlite.connect(db_path) as db:
-        # Enable foreign key constraints
-        await db.execute("PRAGMA foreign_keys = ON")
-        # Get all gaps below threshold
-        cursor = await db.execute("""
-            SELECT DISTINCT competitor_url, closest_match_url, similarity_score
-            FROM gaps
-            WHERE gap_type = ?
-            AND similarity_score < ?
-            ORDER BY similarity_score ASC
-        """, (GAP_TYPE_MISSING_CONTENT, similarity_threshold,))
-        
-        rows = await cursor.fetchall()
-        
-        for row in rows:
-            competitor_url = row[0]
-            
-            # Skip if we've already processed this URL
-            if competitor_url in processed_urls:
-                continue
-            
-            processed_urls.add(competitor_url)
-            
-            # Calculate priority based on similarity score
-            similarity_score = row[2]
-            if similarity_score < 0.2:
-                priority = PRIORITY_HIGH
-            elif similarity_score < 0.35:
-                priority = PRIORITY_MEDIUM
-            else:
-                priority = PRIORITY_LOW
-            
-            gaps.append({
-                'type': 'missing_page',
-                'competitor_url': competitor_url,
-                'closest_match_url': row[1],
-                'similarity_score': similarity_score,
-                'similarity_percentage': f"{similarity_score * 100:.1f}%",
-                'priority': priority
-            })
+    async with pool.connection() as db:
+        # Keep only the closest match per competitor URL
+        async with db.execute(
+            MISSING_PAGES_SQL, (GAP_TYPE_MISSING_CONTENT, similarity_threshold)
+        ) as cursor:
+            cursor.arraysize = DETECTOR_FETCH_SIZE
+            async for row in cursor:
+                similarity_score = row[2]
+                gaps.append({
+                    'type': 'missing_page',
+                    'competitor_url': row[0],
+                    'closest_match_url': row[1],
+                    'similarity_score': similarity_score,
+                    'similarity_percentage': f"{similarity_score * 100:.1f}%"
+                })
+    
+    # Priority based on similarity score: < 0.2 high, < 0.35 medium
+    priorities = _bucket_priorities(
+        [gap['similarity_score'] for gap in gaps], MISSING_PAGE_BINS, MISSING_PAGE_PRIORITIES
+    )
+    for gap, priority in zip(gaps, priorities):
+        gap['priority'] = priority
     
-    logger.info(f"Detected {len(gaps)} unique missing pages (deduplicated from {len(rows)} raw gaps)")
+    logger.info(f"Detected {len(gaps)} unique missing pages")
     return gaps
 
 
 async def detect_thin_content(
-    db_path: str,
+    pool: DatabasePool,
     ratio_threshold: float = 3.0
 ) -> List[Dict[str, Any]]:
     """
     Detect primary pages with thin content compared to competitors.
     
     Args:
-        db_path: Path to database
+        pool: Database connection pool
         ratio_threshold: Word count ratio threshold
         
     Returns:
         List of thin content gaps (deduplicated by primary URL)
     """
     gaps = []
-    processed_urls: Set[str] = set()
     
-    async with aiosqlite.connect(db_path) as db:
-        # Enable foreign key constraints
-        await db.execute("PRAGMA foreign_keys = ON")
-        # Compare word counts
-        cursor = await db.execute("""
-            SELECT 
-                p1.url as primary_url,
-                p1.word_count as primary_words,
-                p2.url as competitor_url,
-                p2.word_count as competitor_words,
-                CAST(p2.word_count AS FLOAT) / CAST(p1.word_count AS FLOAT) as ratio
-            FROM pages p1
-            JOIN pages p2 ON p1.title = p2.title OR p1.h1 = p2.h1
-            WHERE p1.is_primary = 1
-            AND p2.is_primary = 0
-            AND p1.word_count > 0
-            AND CAST(p2.word_count AS FLOAT) / CAST(p1.word_count AS FLOAT) > ?
-            ORDER BY ratio DESC
-        """, (ratio_threshold,))
-        
-        rows = await cursor.fetchall()
-        
-        for row in rows:
-            primary_url = row[0]
-            
-            # Only keep the worst case for each primary URL
-            if primary_url in processed_urls:
-                continue
-            
-            processed_urls.add(primary_url)
-            
-            ratio = row[4]
-            
-            # Calculate priority based on ratio
-            if ratio > 5.0:
-                priority = PRIORITY_HIGH
-            elif ratio > 4.0:
-                priority = PRIORITY_MEDIUM
-            else:
-                priority = PRIORITY_LOW
-            
-            # Calculate percentage difference
-            word_diff_percentage = ((row[3] - row[1]) / row[1]) * 100
-            
-            gaps.append({
-                'type': GAP_TYPE_THIN_CONTENT,
-                'primary_url': primary_url,
-                'primary_word_count': row[1],
-                'competitor_url': row[2],
-                'competitor_word_count': row[3],
-                'ratio': ratio,
-                'word_difference': row[3] - row[1],
-                'word_diff_percentage': f"{word_diff_percentage:.1f}%",
-                'priority': priority
-            })
+    async with pool.connection() as db:
+        # Compare word counts, keeping only the worst case per primary URL
+        async with db.execute(THIN_CONTENT_SQL, (ratio_threshold,)) as cursor:
+            cursor.arraysize = DETECTOR_FETCH_SIZE
+            async for row in cursor:
+                # Calculate percentage difference
+                word_diff_percentage = ((row[3] - row[1]) / row[1]) * 100
+                
+                gaps.append({
+                    'type': GAP_TYPE_THIN_CONTENT,
+                    'primary_url': row[0],
+                    'primary_word_count': row[1],
+                    'competitor_url': row[2],
+                    'competitor_word_count': row[3],
+                    'ratio': row[4],
+                    'word_difference': row[3] - row[1],
+                    'word_diff_percentage': f"{word_diff_percentage:.1f}%"
+                })
+    
+    # Priority based on ratio: > 5.0 high, > 4.0 medium
+    priorities = _bucket_priorities(
+        [gap['ratio'] for gap in gaps], THIN_CONTENT_BINS, THIN_CONTENT_PRIORITIES, right=True
+    )
+    for gap, priority in zip(gaps, priorities):
+        gap['priority'] = priority
     
-    logger.info(f"Detected {len(gaps)} unique thin content pages (deduplicated from {len(rows)} comparisons)")
+    logger.info(f"Detected {len(gaps)} unique thin content pages")
     return gaps
 
 
-async def detect_metadata_gaps(db_path: str) -> List[Dict[str, Any]]:
+async def detect_metadata_gaps(pool: DatabasePool) -> List[Dict[str, Any]]:
     """
     Detect pages with missing or poor metadata.
     
     Args:
-        db_path: Path to database
+        pool: Database connection pool
         
     Returns:
         List of metadata gaps (deduplicated by URL)
     """
     gaps = []
-    processed_urls: Set[str] = set()
     
-    async with aiosqlite.connect(db_path) as db:
-        # Enable foreign key constraints
-        await db.execute("PRAGMA foreign_keys = ON")
-        # Find pages with missing metadata
-        cursor = await db.execute("""
-            SELECT DISTINCT url, title, description, h1
-            FROM pages
-            WHERE is_primary = 1
-            AND (title IS NULL OR description IS NULL OR h1 IS NULL)
-            ORDER BY url
-        """)
-        
-        rows = await cursor.fetchall()
-        
-        for row in rows:
-            url = row[0]
-            
-            if url in processed_urls:
-                continue
-            
-            processed_urls.add(url)
-            
-            missing = []
-            if not row[1]:
-                missing.append('title')
-            if not row[2]:
-                missing.append('description')
-            if not row[3]:
-                missing.append('h1')
-            
-            # Calculate severity
-            missing_count = len(missing)
-            if 'title' in missing or missing_count >= 2:
-                priority = PRIORITY_HIGH
-            elif missing_count >= 1:
-                priority = PRIORITY_MEDIUM
-            else:
-                priority = PRIORITY_LOW
-            
-            gaps.append({
-                'type': GAP_TYPE_METADATA_GAP,
-                'url': url,
-                'missing_elements': missing,
-                'missing_count': missing_count,
-                'priority': priority
-            })
+    async with pool.connection() as db:
+        # Find pages with missing metadata; the flags and their count are computed in SQL
+        async with db.execute(METADATA_GAPS_SQL) as cursor:
+            cursor.arraysize = DETECTOR_FETCH_SIZE
+            async for row in cursor:
+                missing = [
+                    field for field, flag in zip(METADATA_FIELDS, row[1:4]) if flag
+                ]
+                missing_count = row[4]
+                
+                # Calculate severity
+                if row[1] or missing_count >= 2:
+                    priority = PRIORITY_HIGH
+                elif missing_count >= 1:
+                    priority = PRIORITY_MEDIUM
+                else:
+                    priority = PRIORITY_LOW
+                
+                gaps.append({
+                    'type': GAP_TYPE_METADATA_GAP,
+                    'url': row[0],
+                    'missing_elements': missing,
+                    'missing_count': missing_count,
+                    'priority': priority
+                })
     
     logger.info(f"Detected {len(gaps)} unique metadata gaps")
     return gaps
 
 
-async def detect_schema_gaps(db_path: str) -> List[Dict[str, Any]]:
+async def detect_schema_gaps(pool: DatabasePool) -> List[Dict[str, Any]]:
     """
     Detect pages missing schema markup compared to their nearest competitor matches.
     
@@ -230,7 +312,7 @@ async def detect_schema_gaps(db_path: str) -> List[Dict[str, Any]]:
     rather than checking for the existence of any competitor with schema.
     
     Args:
-        db_path: Path to database
+        pool: Database connection pool
         
     Returns:
         List of schema gaps (deduplicated by URL)
@@ -238,57 +320,43 @@ async def detect_schema_gaps(db_path: str) -> List[Dict[str, Any]]:
     gaps = []
     processed_urls: Set[str] = set()
     
-    async with aiosqlite.connect(db_path) as db:
-        # Enable foreign key constraints
-        await db.execute("PRAGMA foreign_keys = ON")
+    async with pool.connection() as db:
+        # Cheap one-row probe: without any competitor schema there can be no schema gaps
+        probe = await db.execute_fetchall(COMPETITOR_SCHEMA_PROBE_SQL)
+        if not probe:
+            logger.info("No competitor pages have schema markup, skipping schema gap detection")
+            return gaps
         
         # Find primary pages without schema that have matched competitors with schema
         # Using gaps table to find nearest competitors, then check if those have schema
-        cursor = await db.execute("""
-            SELECT DISTINCT 
-                p1.url as primary_url,
-                p2.url as competitor_url,
-                g.similarity_score
-            FROM pages p1
-            JOIN gaps g ON g.closest_match_url = p1.url
-            JOIN pages p2 ON p2.url = g.competitor_url
-            WHERE p1.is_primary = 1
-            AND (p1.schema_data IS NULL OR p1.schema_data = '')
-            AND p2.is_primary = 0
-            AND p2.schema_data IS NOT NULL
-            AND p2.schema_data != ''
-            AND g.gap_type = ?
-            ORDER BY p1.url, g.similarity_score DESC
-        """, (GAP_TYPE_MISSING_CONTENT,))
-        
-        rows = await cursor.fetchall()
-        
-        for row in rows:
-            primary_url = row[0]
-            competitor_url = row[1]
-            similarity_score = row[2]
-            
-            # Only keep one gap per primary URL (the one with highest similarity)
-            if primary_url in processed_urls:
-                continue
-            
-            processed_urls.add(primary_url)
-            
-            # Higher priority if it's a close match
-            if similarity_score is not None and similarity_score > 0.7:
-                priority = PRIORITY_HIGH
-            elif similarity_score is not None and similarity_score > 0.5:
-                priority = PRIORITY_MEDIUM
-            else:
-                priority = PRIORITY_LOW
-            
-            gaps.append({
-                'type': GAP_TYPE_SCHEMA_GAP,
-                'url': primary_url,
-                'competitor_url': competitor_url,
-                'similarity_score': similarity_score,
-                'priority': priority
-            })
+        async with db.execute(SCHEMA_GAPS_SQL, (GAP_TYPE_MISSING_CONTENT,)) as cursor:
+            cursor.arraysize = DETECTOR_FETCH_SIZE
+            async for row in cursor:
+                primary_url = row[0]
+                competitor_url = row[1]
+                similarity_score = row[2]
+                
+                # Only keep one gap per primary URL (the one with highest similarity)
+                if primary_url in processed_urls:
+                    continue
+                
+                processed_urls.add(primary_url)
+                
+                # Higher priority if it's a close match
+                if similarity_score is not None and similarity_score > 0.7:
+                    priority = PRIORITY_HIGH
+                elif similarity_score is not None and similarity_score > 0.5:
+                    priority = PRIORITY_MEDIUM
+                else:
+                    priority = PRIORITY_LOW
+                
+                gaps.append({
+                    'type': GAP_TYPE_SCHEMA_GAP,
+                    'url': primary_url,
+                    'competitor_url': competitor_url,
+                    'similarity_score': similarity_score,
+                    'priority': priority
+                })
     
     logger.info(f"Detected {len(gaps)} unique schema gaps based on matched competitors")
     return gaps
@@ -305,18 +373,19 @@ async def get_all_gaps(db_path: str, config: Dict[str, Any]) -> Dict[str, List[D
     Returns:
         Dictionary with all gap types
     """
-    missing_pages = await detect_missing_pages(
-        db_path,
-        config.get('similarity_threshold', 0.45)
-    )
-    
-    thin_content = await detect_thin_content(
-        db_path,
-        config.get('thin_content_ratio', 3.0)
-    )
+    # The detectors are independent read-only queries, so run them concurrently
+    # on separate read-only pooled connections that never block each other
+    pool = DatabasePool(db_path, max_connections=DETECTOR_POOL_SIZE, read_only=True)
     
-    metadata_gaps = await detect_metadata_gaps(db_path)
-    schema_gaps = await detect_schema_gaps(db_path)
+    try:
+        missing_pages, thin_content, metadata_gaps, schema_gaps = await asyncio.gather(
+            detect_missing_pages(pool, config.get('similarity_threshold', 0.45)),
+            detect_thin_content(pool, config.get('thin_content_ratio', 3.0)),
+            detect_metadata_gaps(pool),
+            detect_schema_gaps(pool)
+        )
+    finally:
+        await pool.close_all()
     
     return {
         'missing_pages': missing_pages,
@@ -1,12 +1,466 @@
 """LLM-based content comparison."""
 import asyncio
-from typing import Any, Dict, List, Optional
+import copy
+import hashlib
+import json
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
 
-from openai import AsyncOpenAI, APIError, RateLimitError, APIConnectionError
+import numpy as np
+from app.embeddings.generator import generate_embedding
+from app.utils import jsonutil
+from app.utils.database import (
+    get_cached_llm_response,
+    get_llm_cache_embeddings,
+    store_cached_llm_response,
+)
 from app.utils.logger import get_logger
+from app.utils.openai_client import RETRYABLE_ERRORS, get_openai_client, llm_retrying
+from app.utils.tokenizer import truncate_to_tokens
 
 logger = get_logger(__name__)
 
+T = TypeVar('T')
+
+# Cheap embedding model used only to find near-duplicate cached requests
+SEMANTIC_CACHE_MODEL = "text-embedding-3-small"
+
+# Chat completions endpoint used for Batch API requests
+BATCH_ENDPOINT = "/v1/chat/completions"
+
+# Batch file and status calls are not wrapped in llm_retrying, so let the SDK retry them
+BATCH_CLIENT_RETRIES = 2
+
+# Sampling settings per request type (part of the cache key)
+COMPARE_TEMPERATURE = 0.3
+OUTLINE_TEMPERATURE = 0.5
+OUTLINE_MAX_TOKENS = 1000
+REWRITE_TEMPERATURE = 0.5
+REWRITE_MAX_TOKENS = 800
+
+# Token budgets for page content included in prompts (~3000 and ~2000 characters)
+COMPARE_CONTENT_TOKENS = 750
+REWRITE_CONTENT_TOKENS = 500
+
+# System prompts
+COMPARE_SYSTEM_PROMPT = "You are an SEO content analyst. Provide detailed, actionable insights in valid JSON format."
+OUTLINE_SYSTEM_PROMPT = "You are a content strategist. Create detailed page outlines for SEO content."
+REWRITE_SYSTEM_PROMPT = "You are a content improvement specialist. Provide specific, actionable rewrite suggestions."
+
+# User prompt templates, split around the per-call values so prompts are
+# assembled with a single str.join instead of reformatting the whole text
+_COMPARE_PROMPT_HEAD = """Compare these two web pages and identify:
+
+1. Missing sections in the primary page
+2. Missing key arguments or points
+3. Competitive advantages in the competitor's content
+4. Recommended improvements
+
+Primary Page ("""
+_COMPARE_PROMPT_COMPETITOR = """
+
+Competitor Page ("""
+_COMPARE_PROMPT_TAIL = """
+
+Provide a structured analysis in JSON format with keys:
+- missing_sections: list of section topics missing
+- missing_arguments: list of key points not covered
+- competitive_advantages: what makes competitor content stronger
+- recommendations: specific improvements to make
+"""
+
+_OUTLINE_PROMPT_HEAD = """Based on this competitor page, create a comprehensive outline for a new page that would compete effectively:
+
+Competitor Content ("""
+_OUTLINE_PROMPT_TAIL = """
+
+Include:
+1. Suggested title and meta description
+2. H1 and main H2 sections
+3. Key topics to cover
+4. Content angles to emphasize
+5. Recommended word count range
+"""
+
+_REWRITE_PROMPT_HEAD = """For this page with the following issues:
+
+"""
+_REWRITE_PROMPT_CONTENT = """
+
+Current Content ("""
+_REWRITE_PROMPT_TAIL = """
+
+Provide specific suggestions to:
+1. Improve thin content
+2. Add missing sections
+3. Strengthen arguments
+4. Enhance SEO value
+"""
+
+# Weights for the cheap pre-LLM candidate score
+CANDIDATE_WEIGHT_SIMILARITY = 0.5
+CANDIDATE_WEIGHT_TITLE_MATCH = 0.3
+CANDIDATE_WEIGHT_WORD_RATIO = 0.2
+
+# Standard-library decoder for incremental parsing (orjson has no raw_decode)
+_json_decoder = json.JSONDecoder()
+
+# In-memory copies of cached input embeddings, loaded once per (db, kind, model)
+_semantic_indexes: Dict[Tuple[str, str, str], Tuple[List[np.ndarray], List[str]]] = {}
+
+# Requests currently awaiting a response, keyed by cache key, so concurrent
+# identical calls share one API request
+_inflight: Dict[bytes, asyncio.Future] = {}
+
+
+def _cache_key(
+    kind: str,
+    model: str,
+    messages: List[Dict[str, str]],
+    **params: Any
+) -> bytes:
+    """
+    Hash a chat request into a compact cache key.
+    
+    The key covers the full message list plus every sampling parameter, so
+    any change to the prompts or settings produces a different key.
+    
+    Args:
+        kind: Request type
+        model: Model name
+        messages: Chat messages sent to the model
+        **params: Request parameters that affect the output (temperature, max_tokens, ...)
+        
+    Returns:
+        16-byte BLAKE2b digest
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    parts = [kind, model]
+    parts.extend(f"{name}={value!r}" for name, value in sorted(params.items()))
+    for message in messages:
+        parts.extend((message['role'], message['content']))
+    for part in parts:
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\x1f')
+    return digest.digest()
+
+
+def _decode_members(buffer: str, pos: int) -> Tuple[List[Tuple[str, Any]], int]:
+    """
+    Decode the complete top-level members of a partially received JSON object.
+    
+    Args:
+        buffer: JSON text received so far
+        pos: Offset just past the opening brace or the last decoded member
+        
+    Returns:
+        Tuple of (decoded (key, value) pairs, offset to resume from)
+    """
+    members = []
+    length = len(buffer)
+    
+    while True:
+        start = pos
+        while start < length and buffer[start] in ' \t\r\n,':
+            start += 1
+        if start >= length or buffer[start] == '}':
+            return members, start
+        
+        try:
+            key, end = _json_decoder.raw_decode(buffer, start)
+            while end < length and buffer[end] in ' \t\r\n':
+                end += 1
+            if end >= length or buffer[end] != ':':
+                return members, pos
+            end += 1
+            while end < length and buffer[end] in ' \t\r\n':
+                end += 1
+            value, end = _json_decoder.raw_decode(buffer, end)
+        except json.JSONDecodeError:
+            # Member not fully received yet
+            return members, pos
+        
+        # A number at the very end of the buffer may still be growing
+        if end >= length and not isinstance(value, (str, list, dict)):
+            return members, pos
+        
+        members.append((key, value))
+        pos = end
+
+
+async def _chat(api_key: str, timeout: int, max_retries: int, **request: Any) -> str:
+    """
+    Send a chat completion request with jittered retries.
+    
+    Args:
+        api_key: OpenAI API key
+        timeout: Request timeout in seconds
+        max_retries: Maximum attempts, including the first
+        **request: Arguments for chat.completions.create
+        
+    Returns:
+        Content of the first choice
+    """
+    client = get_openai_client(api_key, timeout)
+    async for attempt in llm_retrying(max_retries, logger):
+        with attempt:
+            response = await client.chat.completions.create(**request)
+    return response.choices[0].message.content
+
+
+async def _single_flight(key: bytes, factory: Callable[[], Awaitable[T]]) -> T:
+    """
+    Run factory() once per key, sharing its result with concurrent callers.
+    
+    Every caller gets its own deep copy of the result, so one caller mutating
+    it cannot affect the others. If the leading caller is cancelled, waiting
+    followers that were not cancelled themselves start the request again.
+    
+    Args:
+        key: Request cache key
+        factory: Zero-argument callable returning the request coroutine
+        
+    Returns:
+        Result of the in-flight or newly started request
+    """
+    while (future := _inflight.get(key)) is not None:
+        try:
+            # Shield so a cancelled follower does not cancel the shared request
+            result = await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if future.cancelled() and not asyncio.current_task().cancelling():
+                # Only the leader was cancelled; retry, possibly as the new leader
+                continue
+            raise
+        return copy.deepcopy(result)
+    
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    try:
+        result = await factory()
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        # Mark retrieved so a leader without followers does not log it twice
+        future.exception()
+        raise
+    else:
+        future.set_result(result)
+        return copy.deepcopy(result)
+    finally:
+        del _inflight[key]
+
+
+async def _cache_get(cache_db_path: Optional[str], cache_key: bytes) -> Optional[str]:
+    """Return a cached response, treating cache failures as misses."""
+    if not cache_db_path:
+        return None
+    try:
+        return await get_cached_llm_response(cache_db_path, cache_key)
+    except Exception as e:
+        logger.warning(f"LLM cache lookup failed: {e}")
+        return None
+
+
+async def _cache_put(
+    cache_db_path: Optional[str],
+    cache_key: bytes,
+    kind: str,
+    model: str,
+    response: str,
+    embedding: Optional[np.ndarray] = None
+) -> None:
+    """Store a response in the cache, logging rather than raising on failure."""
+    if not cache_db_path:
+        return
+    try:
+        await store_cached_llm_response(
+            cache_db_path, cache_key, kind, model, response,
+            memoryview(np.ascontiguousarray(embedding)) if embedding is not None else None
+        )
+    except Exception as e:
+        logger.warning(f"LLM cache store failed: {e}")
+        return
+    
+    index = _semantic_indexes.get((cache_db_path, kind, model))
+    if index is not None and embedding is not None:
+        index[0].append(embedding)
+        index[1].append(response)
+
+
+async def _semantic_cache_get(
+    cache_db_path: str,
+    kind: str,
+    model: str,
+    embedding: np.ndarray,
+    threshold: float
+) -> Optional[str]:
+    """
+    Return the cached response whose inputs are most similar to the query.
+    
+    Args:
+        cache_db_path: Database holding the LLM response cache
+        kind: Request type
+        model: LLM model name
+        embedding: Normalized embedding of the request inputs
+        threshold: Minimum cosine similarity for a hit
+        
+    Returns:
+        Cached response text or None
+    """
+    key = (cache_db_path, kind, model)
+    try:
+        if key not in _semantic_indexes:
+            rows = await get_llm_cache_embeddings(cache_db_path, kind, model)
+            _semantic_indexes[key] = (
+                [np.frombuffer(row[0], dtype=np.float32) for row in rows],
+                [row[1] for row in rows]
+            )
+    except Exception as e:
+        logger.warning(f"LLM semantic cache lookup failed: {e}")
+        return None
+    
+    vectors, responses = _semantic_indexes[key]
+    if not vectors:
+        return None
+    
+    # Embeddings are normalized, so the dot product is the cosine similarity
+    scores = np.vstack(vectors) @ embedding
+    best = int(np.argmax(scores))
+    if scores[best] < threshold:
+        return None
+    
+    logger.debug(f"Semantic cache hit with similarity {scores[best]:.3f}")
+    return responses[best]
+
+
+def _build_compare_prompt(
+    primary_url: str,
+    primary_content: str,
+    competitor_url: str,
+    competitor_content: str
+) -> str:
+    """Build the user prompt for compare_pages."""
+    return "".join((
+        _COMPARE_PROMPT_HEAD, primary_url, "):\n", primary_content,
+        _COMPARE_PROMPT_COMPETITOR, competitor_url, "):\n", competitor_content,
+        _COMPARE_PROMPT_TAIL
+    ))
+
+
+def _build_compare_messages(
+    primary_url: str,
+    primary_content: str,
+    competitor_url: str,
+    competitor_content: str
+) -> List[Dict[str, str]]:
+    """Build the chat messages for a page comparison."""
+    return [
+        {"role": "system", "content": COMPARE_SYSTEM_PROMPT},
+        {"role": "user", "content": _build_compare_prompt(
+            primary_url, primary_content, competitor_url, competitor_content
+        )}
+    ]
+
+
+def _build_outline_prompt(competitor_url: str, competitor_content: str) -> str:
+    """Build the user prompt for generate_page_outline."""
+    return "".join((
+        _OUTLINE_PROMPT_HEAD, competitor_url, "):\n", competitor_content,
+        _OUTLINE_PROMPT_TAIL
+    ))
+
+
+def _build_rewrite_prompt(url: str, issues_text: str, content: str) -> str:
+    """Build the user prompt for suggest_rewrites."""
+    return "".join((
+        _REWRITE_PROMPT_HEAD, issues_text,
+        _REWRITE_PROMPT_CONTENT, url, "):\n", content,
+        _REWRITE_PROMPT_TAIL
+    ))
+
+
+def _normalize_heading(value: Optional[str]) -> str:
+    """Normalize a title or H1 for equality checks."""
+    return ' '.join((value or '').lower().split())
+
+
+def score_candidate(pair: Dict[str, Any]) -> float:
+    """
+    Score a primary/competitor page pair using cheap, local features.
+    
+    Args:
+        pair: Dictionary with 'similarity' (embedding cosine) and optional
+            'primary_title', 'competitor_title', 'primary_h1', 'competitor_h1',
+            'primary_word_count' and 'competitor_word_count' keys
+        
+    Returns:
+        Candidate score, higher means more worth an LLM comparison
+    """
+    similarity = pair.get('similarity') or 0.0
+    
+    title_match = 0.0
+    for field in ('title', 'h1'):
+        primary = _normalize_heading(pair.get(f'primary_{field}'))
+        if primary and primary == _normalize_heading(pair.get(f'competitor_{field}')):
+            title_match = 1.0
+            break
+    
+    primary_words = pair.get('primary_word_count') or 0
+    competitor_words = pair.get('competitor_word_count') or 0
+    if primary_words > 0 and competitor_words > 0:
+        word_ratio = min(primary_words, competitor_words) / max(primary_words, competitor_words)
+    else:
+        word_ratio = 0.0
+    
+    return (
+        CANDIDATE_WEIGHT_SIMILARITY * similarity
+        + CANDIDATE_WEIGHT_TITLE_MATCH * title_match
+        + CANDIDATE_WEIGHT_WORD_RATIO * word_ratio
+    )
+
+
+def rank_candidates(pairs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Rank page pairs by cheap score so LLM comparisons go to the best candidates first.
+    
+    Args:
+        pairs: Candidate pairs (see score_candidate for expected keys)
+        
+    Returns:
+        Copies of the pairs with a 'candidate_score' key, highest score first
+    """
+    ranked = [{**pair, 'candidate_score': score_candidate(pair)} for pair in pairs]
+    ranked.sort(key=lambda pair: pair['candidate_score'], reverse=True)
+    return ranked
+
+
+def select_candidates(
+    pairs: List[Dict[str, Any]],
+    max_pairs: int = 50,
+    min_score: float = 0.0
+) -> List[Dict[str, Any]]:
+    """
+    Pick the pairs worth sending to compare_pages.
+    
+    Args:
+        pairs: Candidate pairs (see score_candidate for expected keys)
+        max_pairs: Maximum number of pairs to keep
+        min_score: Minimum candidate score to keep a pair
+        
+    Returns:
+        Ranked pairs within the budget and above the score cutoff
+    """
+    selected = []
+    for pair in rank_candidates(pairs):
+        if len(selected) >= max_pairs or pair['candidate_score'] < min_score:
+            break
+        selected.append(pair)
+    
+    logger.info(f"Selected {len(selected)} of {len(pairs)} candidate pairs for LLM comparison")
+    return selected
+
 
 async def compare_pages(
     primary_content: str,
@@ -16,7 +470,9 @@ async def compare_pages(
     api_key: str,
     model: str = "gpt-4o-mini",
     timeout: int = 60,
-    max_retries: int = 3
+    max_retries: int = 3,
+    cache_db_path: Optional[str] = None,
+    semantic_cache_threshold: Optional[float] = None
 ) -> Optional[Dict[str, Any]]:
     """
     Compare two pages using LLM with retry logic.
@@ -30,85 +486,379 @@ async def compare_pages(
         model: Model to use
         timeout: Request timeout in seconds
         max_retries: Maximum retry attempts
+        cache_db_path: Database holding the LLM response cache (no caching if None)
+        semantic_cache_threshold: Cosine similarity above which a cached comparison
+            of near-identical content is reused (exact matches only if None)
         
     Returns:
         Comparison results dictionary
     """
-    client = AsyncOpenAI(api_key=api_key, timeout=timeout)
+    primary_excerpt = truncate_to_tokens(primary_content, COMPARE_CONTENT_TOKENS, model)
+    competitor_excerpt = truncate_to_tokens(competitor_content, COMPARE_CONTENT_TOKENS, model)
     
-    prompt = f"""Compare these two web pages and identify:
+    messages = _build_compare_messages(
+        primary_url, primary_excerpt, competitor_url, competitor_excerpt
+    )
+    
+    cache_key = _cache_key(
+        'compare', model, messages,
+        temperature=COMPARE_TEMPERATURE, response_format='json_object'
+    )
+    return await _single_flight(cache_key, lambda: _compare_pages(
+        messages, cache_key, primary_excerpt, competitor_excerpt, primary_url,
+        competitor_url, api_key, model, timeout, max_retries, cache_db_path,
+        semantic_cache_threshold
+    ))
 
-1. Missing sections in the primary page
-2. Missing key arguments or points
-3. Competitive advantages in the competitor's content
-4. Recommended improvements
 
-Primary Page ({primary_url}):
-{primary_content[:3000]}
+async def _compare_pages(
+    messages: List[Dict[str, str]],
+    cache_key: bytes,
+    primary_excerpt: str,
+    competitor_excerpt: str,
+    primary_url: str,
+    competitor_url: str,
+    api_key: str,
+    model: str,
+    timeout: int,
+    max_retries: int,
+    cache_db_path: Optional[str],
+    semantic_cache_threshold: Optional[float]
+) -> Optional[Dict[str, Any]]:
+    """Run a page comparison; callers coalesce through _single_flight."""
+    cached = await _cache_get(cache_db_path, cache_key)
+    if cached is not None:
+        logger.info(f"Using cached LLM comparison for {primary_url} vs {competitor_url}")
+        return jsonutil.loads(cached)
+    
+    embedding = None
+    if cache_db_path and semantic_cache_threshold is not None:
+        embedding = await generate_embedding(
+            f"{primary_excerpt}\n\n{competitor_excerpt}",
+            api_key,
+            model=SEMANTIC_CACHE_MODEL,
+            timeout=timeout
+        )
+        if embedding is not None:
+            cached = await _semantic_cache_get(
+                cache_db_path, 'compare', model, embedding, semantic_cache_threshold
+            )
+            if cached is not None:
+                logger.info(f"Using similar cached LLM comparison for {primary_url} vs {competitor_url}")
+                return jsonutil.loads(cached)
+    
+    try:
+        content = await _chat(
+            api_key, timeout, max_retries,
+            model=model,
+            messages=messages,
+            temperature=COMPARE_TEMPERATURE,
+            response_format={"type": "json_object"}
+        )
+        analysis = jsonutil.loads(content)
+    except RETRYABLE_ERRORS as e:
+        logger.error(f"Failed to compare pages after {max_retries} attempts: {e}")
+        return None
+    except Exception as e:
+        logger.error(f"Failed to compare pages with LLM: {e}")
+        return None
+    
+    logger.info(f"Completed LLM comparison for {primary_url} vs {competitor_url}")
+    await _cache_put(cache_db_path, cache_key, 'compare', model, jsonutil.dumps(analysis), embedding)
+    return analysis
 
-Competitor Page ({competitor_url}):
-{competitor_content[:3000]}
 
-Provide a structured analysis in JSON format with keys:
-- missing_sections: list of section topics missing
-- missing_arguments: list of key points not covered
-- competitive_advantages: what makes competitor content stronger
-- recommendations: specific improvements to make
-"""
+async def compare_pages_stream(
+    primary_content: str,
+    competitor_content: str,
+    primary_url: str,
+    competitor_url: str,
+    api_key: str,
+    model: str = "gpt-4o-mini",
+    timeout: int = 60,
+    max_retries: int = 3,
+    cache_db_path: Optional[str] = None
+) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Compare two pages, yielding analysis keys as soon as each one is complete.
     
-    for attempt in range(max_retries):
-        try:
-            response = await client.chat.completions.create(
-                model=model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an SEO content analyst. Provide detailed, actionable insights in valid JSON format."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                temperature=0.3,
-                response_format={"type": "json_object"}
-            )
-            
-            import json
-            analysis = json.loads(response.choices[0].message.content)
+    The completion is streamed and its JSON object decoded incrementally, so
+    callers can act on missing_sections before recommendations have arrived.
+    If the request fails the error is logged and iteration stops early.
+    
+    Args:
+        primary_content: Primary page content
+        competitor_content: Competitor page content
+        primary_url: Primary page URL
+        competitor_url: Competitor page URL
+        api_key: OpenAI API key
+        model: Model to use
+        timeout: Request timeout in seconds
+        max_retries: Maximum attempts for opening the stream
+        cache_db_path: Database holding the LLM response cache (no caching if None)
+        
+    Yields:
+        Tuples of (analysis key, value) in response order
+    """
+    primary_excerpt = truncate_to_tokens(primary_content, COMPARE_CONTENT_TOKENS, model)
+    competitor_excerpt = truncate_to_tokens(competitor_content, COMPARE_CONTENT_TOKENS, model)
+    
+    messages = _build_compare_messages(
+        primary_url, primary_excerpt, competitor_url, competitor_excerpt
+    )
+    
+    # Same key as compare_pages, so streamed and non-streamed results share the cache
+    cache_key = _cache_key(
+        'compare', model, messages,
+        temperature=COMPARE_TEMPERATURE, response_format='json_object'
+    )
+    cached = await _cache_get(cache_db_path, cache_key)
+    if cached is not None:
+        logger.info(f"Using cached LLM comparison for {primary_url} vs {competitor_url}")
+        for member in jsonutil.loads(cached).items():
+            yield member
+        return
+    
+    client = get_openai_client(api_key, timeout)
+    
+    try:
+        async for attempt in llm_retrying(max_retries, logger):
+            with attempt:
+                stream = await client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=COMPARE_TEMPERATURE,
+                    response_format={"type": "json_object"},
+                    stream=True
+                )
+        
+        buffer = ''
+        pos = None
+        async for chunk in stream:
+            if not chunk.choices or not chunk.choices[0].delta.content:
+                continue
+            buffer += chunk.choices[0].delta.content
             
-            logger.info(f"Completed LLM comparison for {primary_url} vs {competitor_url}")
-            return analysis
+            if pos is None:
+                brace = buffer.find('{')
+                if brace < 0:
+                    continue
+                pos = brace + 1
             
-        except RateLimitError as e:
-            wait_time = min(2 ** attempt, 60)
-            logger.warning(f"Rate limit hit, waiting {wait_time}s (attempt {attempt + 1}/{max_retries})")
-            if attempt < max_retries - 1:
-                await asyncio.sleep(wait_time)
-            else:
-                logger.error(f"Failed to compare pages after {max_retries} attempts: {e}")
-                return None
-                
-        except (APIError, APIConnectionError) as e:
-            wait_time = min(2 ** attempt, 30)
-            logger.warning(f"API error: {e}, retrying in {wait_time}s (attempt {attempt + 1}/{max_retries})")
-            if attempt < max_retries - 1:
-                await asyncio.sleep(wait_time)
-            else:
-                logger.error(f"Failed to compare pages after {max_retries} attempts: {e}")
-                return None
-                
-        except asyncio.TimeoutError:
-            logger.warning(f"Timeout comparing pages (attempt {attempt + 1}/{max_retries})")
-            if attempt >= max_retries - 1:
-                logger.error(f"Failed to compare pages after {max_retries} timeout attempts")
-                return None
-                
-        except Exception as e:
-            logger.error(f"Failed to compare pages with LLM: {e}")
+            members, pos = _decode_members(buffer, pos)
+            for member in members:
+                yield member
+        
+        analysis = jsonutil.loads(buffer)
+    except RETRYABLE_ERRORS as e:
+        logger.error(f"Failed to stream page comparison after {max_retries} attempts: {e}")
+        return
+    except Exception as e:
+        logger.error(f"Failed to stream page comparison with LLM: {e}")
+        return
+    
+    logger.info(f"Completed streamed LLM comparison for {primary_url} vs {competitor_url}")
+    await _cache_put(cache_db_path, cache_key, 'compare', model, jsonutil.dumps(analysis))
+
+
+async def compare_pages_batch(
+    pairs: List[Tuple[str, str, str, str]],
+    api_key: str,
+    model: str = "gpt-4o-mini",
+    max_concurrency: int = 8,
+    semaphore: Optional[asyncio.Semaphore] = None,
+    **kwargs: Any
+) -> List[Optional[Dict[str, Any]]]:
+    """
+    Compare many page pairs concurrently with bounded concurrency.
+    
+    Args:
+        pairs: List of (primary_content, competitor_content, primary_url, competitor_url)
+        api_key: OpenAI API key
+        model: Model to use
+        max_concurrency: Maximum number of comparisons in flight
+        semaphore: Shared semaphore to bound concurrency across several batches
+            (overrides max_concurrency)
+        **kwargs: Extra keyword arguments passed to compare_pages
+        
+    Returns:
+        Comparison results in the same order as pairs (None for failures)
+    """
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(max_concurrency)
+    
+    async def compare_one(
+        primary_content: str,
+        competitor_content: str,
+        primary_url: str,
+        competitor_url: str
+    ) -> Optional[Dict[str, Any]]:
+        async with semaphore:
+            return await compare_pages(
+                primary_content, competitor_content, primary_url, competitor_url,
+                api_key, model=model, **kwargs
+            )
+    
+    # Collect exceptions instead of letting one failed pair cancel the rest
+    outcomes = await asyncio.gather(
+        *(compare_one(*pair) for pair in pairs),
+        return_exceptions=True
+    )
+    
+    results: List[Optional[Dict[str, Any]]] = []
+    for pair, outcome in zip(pairs, outcomes):
+        if isinstance(outcome, BaseException):
+            logger.error(f"LLM comparison failed for {pair[2]} vs {pair[3]}: {outcome}")
+            results.append(None)
+        else:
+            results.append(outcome)
+    
+    completed = sum(1 for result in results if result is not None)
+    logger.info(f"Completed {completed}/{len(pairs)} LLM comparisons")
+    return results
+
+
+def batch_custom_id(primary_url: str, competitor_url: str) -> str:
+    """
+    Build the Batch API custom_id for a page pair.
+    
+    Args:
+        primary_url: Primary page URL
+        competitor_url: Competitor page URL
+        
+    Returns:
+        Stable hex identifier for the pair
+    """
+    return hashlib.blake2b(
+        f"{primary_url}\x1f{competitor_url}".encode('utf-8'), digest_size=16
+    ).hexdigest()
+
+
+async def compare_pages_batch_submit(
+    pairs: List[Tuple[str, str, str, str]],
+    api_key: str,
+    model: str = "gpt-4o-mini",
+    timeout: int = 60
+) -> str:
+    """
+    Submit page comparisons to the OpenAI Batch API.
+    
+    Batch requests cost half as much as realtime calls and do not count
+    against the realtime rate limits, at the price of up to 24h latency. Use
+    compare_pages_batch for realtime comparisons.
+    
+    Args:
+        pairs: List of (primary_content, competitor_content, primary_url, competitor_url)
+        api_key: OpenAI API key
+        model: Model to use
+        timeout: Request timeout in seconds
+        
+    Returns:
+        Batch ID to pass to compare_pages_batch_poll
+    """
+    # The Batch API rejects files with repeated custom_ids; keep the first
+    # occurrence of each URL pair, since results are keyed by the pair anyway
+    unique_pairs = {}
+    for pair in pairs:
+        unique_pairs.setdefault(batch_custom_id(pair[2], pair[3]), pair)
+    if len(unique_pairs) < len(pairs):
+        logger.warning(f"Dropped {len(pairs) - len(unique_pairs)} duplicate page pairs from batch")
+    
+    lines = []
+    for custom_id, (primary_content, competitor_content, primary_url, competitor_url) in unique_pairs.items():
+        messages = _build_compare_messages(
+            primary_url,
+            truncate_to_tokens(primary_content, COMPARE_CONTENT_TOKENS, model),
+            competitor_url,
+            truncate_to_tokens(competitor_content, COMPARE_CONTENT_TOKENS, model)
+        )
+        lines.append(jsonutil.dumps({
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": BATCH_ENDPOINT,
+            "body": {
+                "model": model,
+                "messages": messages,
+                "temperature": COMPARE_TEMPERATURE,
+                "response_format": {"type": "json_object"}
+            }
+        }))
+    
+    client = get_openai_client(api_key, timeout, BATCH_CLIENT_RETRIES)
+    input_file = await client.files.create(
+        file=("compare_pages.jsonl", "\n".join(lines).encode('utf-8')),
+        purpose="batch"
+    )
+    batch = await client.batches.create(
+        input_file_id=input_file.id,
+        endpoint=BATCH_ENDPOINT,
+        completion_window="24h"
+    )
+    
+    logger.info(f"Submitted batch {batch.id} with {len(lines)} page comparisons")
+    return batch.id
+
+
+async def compare_pages_batch_poll(
+    batch_id: str,
+    api_key: str,
+    poll_interval: float = 60.0,
+    max_wait: Optional[float] = None,
+    timeout: int = 60
+) -> Optional[Dict[str, Optional[Dict[str, Any]]]]:
+    """
+    Wait for a comparison batch to finish and collect its results.
+    
+    Args:
+        batch_id: ID returned by compare_pages_batch_submit
+        api_key: OpenAI API key
+        poll_interval: Seconds between status checks
+        max_wait: Give up after this many seconds (wait indefinitely if None)
+        timeout: Request timeout in seconds
+        
+    Returns:
+        Mapping of batch_custom_id(primary_url, competitor_url) to the analysis
+        (None for failed items), or None if the batch failed or timed out
+    """
+    client = get_openai_client(api_key, timeout, BATCH_CLIENT_RETRIES)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max_wait if max_wait is not None else None
+    
+    while True:
+        batch = await client.batches.retrieve(batch_id)
+        if batch.status == "completed":
+            break
+        if batch.status in ("failed", "expired", "cancelled"):
+            logger.error(f"Batch {batch_id} ended with status {batch.status}")
             return None
+        if deadline is not None and loop.time() >= deadline:
+            logger.warning(f"Batch {batch_id} still {batch.status} after {max_wait}s")
+            return None
+        await asyncio.sleep(poll_interval)
+    
+    results: Dict[str, Optional[Dict[str, Any]]] = {}
+    if not batch.output_file_id:
+        logger.error(f"Batch {batch_id} completed without an output file")
+        return results
+    
+    output = await client.files.content(batch.output_file_id)
+    for line in output.text.splitlines():
+        if not line.strip():
+            continue
+        record = jsonutil.loads(line)
+        response = record.get("response") or {}
+        try:
+            if response.get("status_code") != 200:
+                raise ValueError(f"status {response.get('status_code')}")
+            content = response["body"]["choices"][0]["message"]["content"]
+            results[record["custom_id"]] = jsonutil.loads(content)
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            logger.warning(f"Batch item {record.get('custom_id')} failed: {e}")
+            results[record.get("custom_id")] = None
     
-    return None
+    completed = sum(1 for result in results.values() if result is not None)
+    logger.info(f"Batch {batch_id} returned {completed}/{len(results)} comparisons")
+    return results
 
 
 async def generate_page_outline(
@@ -117,7 +867,8 @@ async def generate_page_outline(
     api_key: str,
     model: str = "gpt-4o-mini",
     timeout: int = 60,
-    max_retries: int = 3
+    max_retries: int = 3,
+    cache_db_path: Optional[str] = None
 ) -> Optional[str]:
     """
     Generate outline for a new page based on competitor content with retry logic.
@@ -129,74 +880,63 @@ async def generate_page_outline(
         model: Model to use
         timeout: Request timeout in seconds
         max_retries: Maximum retry attempts
+        cache_db_path: Database holding the LLM response cache (no caching if None)
         
     Returns:
         Page outline as string
     """
-    client = AsyncOpenAI(api_key=api_key, timeout=timeout)
+    competitor_excerpt = truncate_to_tokens(competitor_content, COMPARE_CONTENT_TOKENS, model)
     
-    for attempt in range(max_retries):
-        try:
-            response = await client.chat.completions.create(
-                model=model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a content strategist. Create detailed page outlines for SEO content."
-                    },
-                    {
-                        "role": "user",
-                        "content": f"""Based on this competitor page, create a comprehensive outline for a new page that would compete effectively:
-
-Competitor Content ({competitor_url}):
-{competitor_content[:3000]}
+    messages = [
+        {"role": "system", "content": OUTLINE_SYSTEM_PROMPT},
+        {"role": "user", "content": _build_outline_prompt(competitor_url, competitor_excerpt)}
+    ]
+    
+    cache_key = _cache_key(
+        'outline', model, messages,
+        temperature=OUTLINE_TEMPERATURE, max_tokens=OUTLINE_MAX_TOKENS
+    )
+    return await _single_flight(cache_key, lambda: _generate_page_outline(
+        messages, cache_key, competitor_url, api_key, model, timeout,
+        max_retries, cache_db_path
+    ))
 
-Include:
-1. Suggested title and meta description
-2. H1 and main H2 sections
-3. Key topics to cover
-4. Content angles to emphasize
-5. Recommended word count range
-"""
-                    }
-                ],
-                temperature=0.5,
-                max_tokens=1000
-            )
-            
-            outline = response.choices[0].message.content.strip()
-            logger.info(f"Generated outline based on {competitor_url}")
-            return outline
-            
-        except RateLimitError as e:
-            wait_time = min(2 ** attempt, 60)
-            logger.warning(f"Rate limit hit, waiting {wait_time}s (attempt {attempt + 1}/{max_retries})")
-            if attempt < max_retries - 1:
-                await asyncio.sleep(wait_time)
-            else:
-                logger.error(f"Failed to generate outline after {max_retries} attempts: {e}")
-                return None
-                
-        except (APIError, APIConnectionError) as e:
-            wait_time = min(2 ** attempt, 30)
-            logger.warning(f"API error: {e}, retrying in {wait_time}s")
-            if attempt < max_retries - 1:
-                await asyncio.sleep(wait_time)
-            else:
-                logger.error(f"Failed to generate outline after {max_retries} attempts: {e}")
-                return None
-                
-        except asyncio.TimeoutError:
-            logger.warning(f"Timeout generating outline (attempt {attempt + 1}/{max_retries})")
-            if attempt >= max_retries - 1:
-                logger.error(f"Failed to generate outline after {max_retries} timeout attempts")
-                return None
-                
-        except Exception as e:
-            logger.error(f"Failed to generate outline: {e}")
-            return None
+
+async def _generate_page_outline(
+    messages: List[Dict[str, str]],
+    cache_key: bytes,
+    competitor_url: str,
+    api_key: str,
+    model: str,
+    timeout: int,
+    max_retries: int,
+    cache_db_path: Optional[str]
+) -> Optional[str]:
+    """Generate a page outline; callers coalesce through _single_flight."""
+    cached = await _cache_get(cache_db_path, cache_key)
+    if cached is not None:
+        logger.info(f"Using cached outline for {competitor_url}")
+        return cached
     
-    return None
+    try:
+        content = await _chat(
+            api_key, timeout, max_retries,
+            model=model,
+            messages=messages,
+            temperature=OUTLINE_TEMPERATURE,
+            max_tokens=OUTLINE_MAX_TOKENS
+        )
+    except RETRYABLE_ERRORS as e:
+        logger.error(f"Failed to generate outline after {max_retries} attempts: {e}")
+        return None
+    except Exception as e:
+        logger.error(f"Failed to generate outline: {e}")
+        return None
+    
+    outline = content.strip()
+    logger.info(f"Generated outline based on {competitor_url}")
+    await _cache_put(cache_db_path, cache_key, 'outline', model, outline)
+    return outline
 
 
 async def suggest_rewrites(
@@ -206,7 +946,8 @@ async def suggest_rewrites(
     api_key: str,
     model: str = "gpt-4o-mini",
     timeout: int = 60,
-    max_retries: int = 3
+    max_retries: int = 3,
+    cache_db_path: Optional[str] = None
 ) -> Optional[str]:
     """
     Suggest content improvements and rewrites with retry logic.
@@ -219,74 +960,62 @@ async def suggest_rewrites(
         model: Model to use
         timeout: Request timeout in seconds
         max_retries: Maximum retry attempts
+        cache_db_path: Database holding the LLM response cache (no caching if None)
         
     Returns:
         Rewrite suggestions
     """
-    client = AsyncOpenAI(api_key=api_key, timeout=timeout)
-    
     issues_text = "\n".join(f"- {issue}" for issue in issues)
     
-    for attempt in range(max_retries):
-        try:
-            response = await client.chat.completions.create(
-                model=model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a content improvement specialist. Provide specific, actionable rewrite suggestions."
-                    },
-                    {
-                        "role": "user",
-                        "content": f"""For this page with the following issues:
-
-{issues_text}
-
-Current Content ({url}):
-{content[:2000]}
+    content_excerpt = truncate_to_tokens(content, REWRITE_CONTENT_TOKENS, model)
+    
+    messages = [
+        {"role": "system", "content": REWRITE_SYSTEM_PROMPT},
+        {"role": "user", "content": _build_rewrite_prompt(url, issues_text, content_excerpt)}
+    ]
+    
+    cache_key = _cache_key(
+        'rewrite', model, messages,
+        temperature=REWRITE_TEMPERATURE, max_tokens=REWRITE_MAX_TOKENS
+    )
+    return await _single_flight(cache_key, lambda: _suggest_rewrites(
+        messages, cache_key, url, api_key, model, timeout, max_retries,
+        cache_db_path
+    ))
 
-Provide specific suggestions to:
-1. Improve thin content
-2. Add missing sections
-3. Strengthen arguments
-4. Enhance SEO value
-"""
-                    }
-                ],
-                temperature=0.5,
-                max_tokens=800
-            )
-            
-            suggestions = response.choices[0].message.content.strip()
-            logger.info(f"Generated rewrite suggestions for {url}")
-            return suggestions
-            
-        except RateLimitError as e:
-            wait_time = min(2 ** attempt, 60)
-            logger.warning(f"Rate limit hit, waiting {wait_time}s (attempt {attempt + 1}/{max_retries})")
-            if attempt < max_retries - 1:
-                await asyncio.sleep(wait_time)
-            else:
-                logger.error(f"Failed to generate suggestions after {max_retries} attempts: {e}")
-                return None
-                
-        except (APIError, APIConnectionError) as e:
-            wait_time = min(2 ** attempt, 30)
-            logger.warning(f"API error: {e}, retrying in {wait_time}s")
-            if attempt < max_retries - 1:
-                await asyncio.sleep(wait_time)
-            else:
-                logger.error(f"Failed to generate suggestions after {max_retries} attempts: {e}")
-                return None
-                
-        except asyncio.TimeoutError:
-            logger.warning(f"Timeout generating suggestions (attempt {attempt + 1}/{max_retries})")
-            if attempt >= max_retries - 1:
-                logger.error(f"Failed to generate suggestions after {max_retries} timeout attempts")
-                return None
-                
-        except Exception as e:
-            logger.error(f"Failed to generate rewrite suggestions: {e}")
-            return None
+
+async def _suggest_rewrites(
+    messages: List[Dict[str, str]],
+    cache_key: bytes,
+    url: str,
+    api_key: str,
+    model: str,
+    timeout: int,
+    max_retries: int,
+    cache_db_path: Optional[str]
+) -> Optional[str]:
+    """Generate rewrite suggestions; callers coalesce through _single_flight."""
+    cached = await _cache_get(cache_db_path, cache_key)
+    if cached is not None:
+        logger.info(f"Using cached rewrite suggestions for {url}")
+        return cached
+    
+    try:
+        content = await _chat(
+            api_key, timeout, max_retries,
+            model=model,
+            messages=messages,
+            temperature=REWRITE_TEMPERATURE,
+            max_tokens=REWRITE_MAX_TOKENS
+        )
+    except RETRYABLE_ERRORS as e:
+        logger.error(f"Failed to generate suggestions after {max_retries} attempts: {e}")
+        return None
+    except Exception as e:
+        logger.error(f"Failed to generate rewrite suggestions: {e}")
+        return None
     
-    return None
+    suggestions = content.strip()
+    logger.info(f"Generated rewrite suggestions for {url}")
+    await _cache_put(cache_db_path, cache_key, 'rewrite', model, suggestions)
+    return suggestions
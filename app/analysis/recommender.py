@@ -1,62 +1,106 @@
 """Generate recommendations based on gap analysis."""
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Tuple
 
+import numpy as np
 from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# Base impact score per gap priority
+PRIORITY_WEIGHTS = {
+    'high': 3,
+    'medium': 2,
+    'low': 1
+}
+DEFAULT_PRIORITY_WEIGHT = 2
 
-def prioritize_gaps(gaps: Dict[str, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+# Gap lists in scoring order with their report categories
+GAP_CATEGORIES = (
+    ('missing_pages', 'Missing Content'),
+    ('thin_content', 'Thin Content'),
+    ('metadata_gaps', 'Metadata Issues'),
+    ('schema_gaps', 'Schema Missing'),
+)
+
+
+def _impact_bonus(gap_type: str, gap_list: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
     """
-    Prioritize all gaps by impact and urgency.
+    Compute the category-specific part of the impact score for a gap list.
     
     Args:
-        gaps: Dictionary of all gap types
+        gap_type: Key of the gap list in the gaps dictionary
+        gap_list: Gaps of that type
         
     Returns:
-        Sorted list of prioritized gaps
+        Tuple of (bonus scores, mask of gaps whose impact score is an integer),
+        both aligned with gap_list
     """
-    all_gaps = []
-    
-    # Add priority scores
-    priority_weights = {
-        'high': 3,
-        'medium': 2,
-        'low': 1
-    }
+    count = len(gap_list)
     
-    # Process missing pages
-    for gap in gaps.get('missing_pages', []):
-        gap['category'] = 'Missing Content'
-        gap['impact_score'] = priority_weights.get(gap.get('priority', 'medium'), 2)
+    if gap_type == 'missing_pages':
         # Lower similarity = higher impact
-        gap['impact_score'] += (1 - gap.get('similarity_score', 0.5)) * 2
-        all_gaps.append(gap)
-    
-    # Process thin content
-    for gap in gaps.get('thin_content', []):
-        gap['category'] = 'Thin Content'
-        gap['impact_score'] = priority_weights.get(gap.get('priority', 'medium'), 2)
-        # Higher ratio = higher impact
-        gap['impact_score'] += min(gap.get('ratio', 3.0) / 3.0, 2)
-        all_gaps.append(gap)
-    
-    # Process metadata gaps
-    for gap in gaps.get('metadata_gaps', []):
-        gap['category'] = 'Metadata Issues'
-        gap['impact_score'] = priority_weights.get(gap.get('priority', 'medium'), 2)
+        similarity = np.fromiter(
+            (gap.get('similarity_score', 0.5) for gap in gap_list), dtype=np.float64, count=count
+        )
+        return (1 - similarity) * 2, np.zeros(count, dtype=bool)
+    
+    if gap_type == 'thin_content':
+        # Higher ratio = higher impact; the cap of 2 is a whole number
+        ratio = np.fromiter(
+            (gap.get('ratio', 3.0) for gap in gap_list), dtype=np.float64, count=count
+        )
+        return np.minimum(ratio / 3.0, 2), ratio / 3.0 > 2
+    
+    if gap_type == 'metadata_gaps':
         # More missing elements = higher impact
-        gap['impact_score'] += len(gap.get('missing_elements', []))
-        all_gaps.append(gap)
+        missing = np.fromiter(
+            (len(gap.get('missing_elements', [])) for gap in gap_list), dtype=np.float64, count=count
+        )
+        return missing, np.ones(count, dtype=bool)
     
-    # Process schema gaps
-    for gap in gaps.get('schema_gaps', []):
-        gap['category'] = 'Schema Missing'
-        gap['impact_score'] = priority_weights.get(gap.get('priority', 'medium'), 2)
-        all_gaps.append(gap)
+    return np.zeros(count), np.ones(count, dtype=bool)
+
+
+def prioritize_gaps(gaps: Dict[str, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """
+    Prioritize all gaps by impact and urgency.
     
-    # Sort by impact score
-    all_gaps.sort(key=lambda x: x.get('impact_score', 0), reverse=True)
+    Args:
+        gaps: Dictionary of all gap types
+        
+    Returns:
+        Sorted list of prioritized gaps
+    """
+    all_gaps = []
+    bonuses = []
+    integral = []
+    
+    for gap_type, category in GAP_CATEGORIES:
+        gap_list = gaps.get(gap_type, [])
+        for gap in gap_list:
+            gap['category'] = category
+        all_gaps.extend(gap_list)
+        bonus, is_integral = _impact_bonus(gap_type, gap_list)
+        bonuses.append(bonus)
+        integral.append(is_integral)
+    
+    # Score all gaps at once: priority weight plus category bonus
+    weights = np.fromiter(
+        (PRIORITY_WEIGHTS.get(gap.get('priority', 'medium'), DEFAULT_PRIORITY_WEIGHT) for gap in all_gaps),
+        dtype=np.float64,
+        count=len(all_gaps)
+    )
+    impact_scores = weights + np.concatenate(bonuses)
+    
+    # Whole-number scores stay ints so reports serialize them as 4, not 4.0
+    for gap, impact_score, is_integral in zip(
+        all_gaps, impact_scores.tolist(), np.concatenate(integral).tolist()
+    ):
+        gap['impact_score'] = int(impact_score) if is_integral else impact_score
+    
+    # Sort by impact score, keeping input order for ties
+    order = np.argsort(-impact_scores, kind='stable')
+    all_gaps = [all_gaps[i] for i in order.tolist()]
     
     logger.info(f"Prioritized {len(all_gaps)} total gaps")
     return all_gaps
@@ -1,26 +1,42 @@
 """Content extraction from HTML pages."""
-import json
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from typing import Any, Dict, List, Optional
 
-from bs4 import BeautifulSoup
+from selectolax.lexbor import LexborHTMLParser
+from app.utils import jsonutil
 from app.utils.logger import get_logger
-from app.utils.text import normalize_whitespace, clean_html_remnants
+from app.utils.text import clean_html_and_whitespace, normalize_whitespace
 
 logger = get_logger(__name__)
 
 
-def extract_metadata(html: str) -> Dict[str, Optional[str]]:
-    """
-    Extract metadata from HTML.
-    
-    Args:
-        html: HTML content
-        
-    Returns:
-        Dictionary with metadata
-    """
-    soup = BeautifulSoup(html, 'lxml')
-    
+HEADING_LEVELS = ('h1', 'h2', 'h3', 'h4', 'h5', 'h6')
+HEADING_SELECTOR = ', '.join(HEADING_LEVELS)
+
+# Elements dropped before extracting the main content text
+NON_CONTENT_TAGS = ['script', 'style', 'nav', 'header', 'footer', 'aside', 'iframe', 'noscript']
+
+# Worker processes for CPU-bound extraction, created on first use
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def _parse_html(html: str) -> LexborHTMLParser:
+    """Parse HTML into a selectolax tree."""
+    return LexborHTMLParser(html)
+
+
+def _attribute(tree: LexborHTMLParser, selector: str, attribute: str) -> Optional[str]:
+    """Return an attribute of the first node matching selector, if non-empty."""
+    node = tree.css_first(selector)
+    if node is None:
+        return None
+    return node.attributes.get(attribute) or None
+
+
+def _extract_metadata(tree: LexborHTMLParser) -> Dict[str, Optional[str]]:
+    """Extract metadata from a parsed page."""
     metadata = {
         'title': None,
         'description': None,
@@ -32,54 +48,40 @@ def extract_metadata(html: str) -> Dict[str, Optional[str]]:
     }
     
     # Title
-    title_tag = soup.find('title')
-    if title_tag:
-        metadata['title'] = normalize_whitespace(title_tag.get_text())
+    title_tag = tree.css_first('title')
+    if title_tag is not None:
+        metadata['title'] = normalize_whitespace(title_tag.text())
     
     # Meta description
-    meta_desc = soup.find('meta', attrs={'name': 'description'})
-    if meta_desc and meta_desc.get('content'):
-        metadata['description'] = normalize_whitespace(meta_desc['content'])
+    description = _attribute(tree, 'meta[name="description"]', 'content')
+    if description:
+        metadata['description'] = normalize_whitespace(description)
     
     # H1
-    h1_tag = soup.find('h1')
-    if h1_tag:
-        metadata['h1'] = normalize_whitespace(h1_tag.get_text())
+    h1_tag = tree.css_first('h1')
+    if h1_tag is not None:
+        metadata['h1'] = normalize_whitespace(h1_tag.text())
     
     # Canonical
-    canonical = soup.find('link', attrs={'rel': 'canonical'})
-    if canonical and canonical.get('href'):
-        metadata['canonical'] = canonical['href']
+    metadata['canonical'] = _attribute(tree, 'link[rel~="canonical"]', 'href')
     
     # Open Graph
-    og_title = soup.find('meta', attrs={'property': 'og:title'})
-    if og_title and og_title.get('content'):
-        metadata['og_title'] = normalize_whitespace(og_title['content'])
+    og_title = _attribute(tree, 'meta[property="og:title"]', 'content')
+    if og_title:
+        metadata['og_title'] = normalize_whitespace(og_title)
     
-    og_desc = soup.find('meta', attrs={'property': 'og:description'})
-    if og_desc and og_desc.get('content'):
-        metadata['og_description'] = normalize_whitespace(og_desc['content'])
+    og_desc = _attribute(tree, 'meta[property="og:description"]', 'content')
+    if og_desc:
+        metadata['og_description'] = normalize_whitespace(og_desc)
     
-    og_type = soup.find('meta', attrs={'property': 'og:type'})
-    if og_type and og_type.get('content'):
-        metadata['og_type'] = og_type['content']
+    metadata['og_type'] = _attribute(tree, 'meta[property="og:type"]', 'content')
     
     return metadata
 
 
-def extract_schema(html: str) -> Optional[str]:
-    """
-    Extract schema.org JSON-LD data.
-    
-    Args:
-        html: HTML content
-        
-    Returns:
-        Schema JSON as string or None
-    """
-    soup = BeautifulSoup(html, 'lxml')
-    
-    schema_scripts = soup.find_all('script', attrs={'type': 'application/ld+json'})
+def _extract_schema(tree: LexborHTMLParser) -> Optional[str]:
+    """Extract schema.org JSON-LD data from a parsed page."""
+    schema_scripts = tree.css('script[type="application/ld+json"]')
     
     if not schema_scripts:
         return None
@@ -87,48 +89,91 @@ def extract_schema(html: str) -> Optional[str]:
     schemas = []
     for script in schema_scripts:
         try:
-            # Guard against None or whitespace-only content
-            if script.string and script.string.strip():
-                schema_data = json.loads(script.string)
+            # Guard against empty or whitespace-only content
+            script_text = script.text()
+            if script_text and script_text.strip():
+                schema_data = jsonutil.loads(script_text)
                 schemas.append(schema_data)
-        except (json.JSONDecodeError, TypeError, AttributeError):
+        except (ValueError, TypeError):
+            # JSONDecodeError from either json backend is a ValueError
             continue
     
     if schemas:
-        return json.dumps(schemas, ensure_ascii=False)
+        return jsonutil.dumps(schemas)
     
     return None
 
 
-def extract_content(html: str) -> str:
+def _extract_content(tree: LexborHTMLParser) -> str:
     """
-    Extract main content text from HTML.
+    Extract main content text from a parsed page.
     
-    Args:
-        html: HTML content
-        
-    Returns:
-        Extracted content text
+    Note: removes script, style and layout elements from the tree in place.
     """
-    soup = BeautifulSoup(html, 'lxml')
-    
     # Remove unwanted elements
-    for element in soup(['script', 'style', 'nav', 'header', 'footer', 'aside', 'iframe', 'noscript']):
-        element.decompose()
+    tree.strip_tags(NON_CONTENT_TAGS)
     
     # Try to find main content area
-    main_content = soup.find('main') or soup.find('article') or soup.find('div', class_='content')
+    main_content = tree.css_first('main') or tree.css_first('article') or tree.css_first('div.content')
+    if main_content is None:
+        main_content = tree.root
+    
+    if main_content is None:
+        return ''
     
-    if main_content:
-        text = main_content.get_text(separator=' ', strip=True)
-    else:
-        text = soup.get_text(separator=' ', strip=True)
+    text = main_content.text(separator=' ', strip=True)
     
     # Clean the text
-    text = clean_html_remnants(text)
-    text = normalize_whitespace(text)
+    return clean_html_and_whitespace(text)
+
+
+def _extract_headings(tree: LexborHTMLParser) -> Dict[str, List[str]]:
+    """Extract all headings from a parsed page in a single tree walk."""
+    headings: Dict[str, List[str]] = {level: [] for level in HEADING_LEVELS}
+    
+    for node in tree.css(HEADING_SELECTOR):
+        headings[node.tag].append(normalize_whitespace(node.text()))
     
-    return text
+    return headings
+
+
+def extract_metadata(html: str) -> Dict[str, Optional[str]]:
+    """
+    Extract metadata from HTML.
+    
+    Args:
+        html: HTML content
+        
+    Returns:
+        Dictionary with metadata
+    """
+    return _extract_metadata(_parse_html(html))
+
+
+def extract_schema(html: str) -> Optional[str]:
+    """
+    Extract schema.org JSON-LD data.
+    
+    Args:
+        html: HTML content
+        
+    Returns:
+        Schema JSON as string or None
+    """
+    return _extract_schema(_parse_html(html))
+
+
+def extract_content(html: str) -> str:
+    """
+    Extract main content text from HTML.
+    
+    Args:
+        html: HTML content
+        
+    Returns:
+        Extracted content text
+    """
+    return _extract_content(_parse_html(html))
 
 
 def extract_headings(html: str) -> Dict[str, List[str]]:
@@ -141,22 +186,7 @@ def extract_headings(html: str) -> Dict[str, List[str]]:
     Returns:
         Dictionary with heading levels and their texts
     """
-    soup = BeautifulSoup(html, 'lxml')
-    
-    headings = {
-        'h1': [],
-        'h2': [],
-        'h3': [],
-        'h4': [],
-        'h5': [],
-        'h6': []
-    }
-    
-    for level in ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']:
-        tags = soup.find_all(level)
-        headings[level] = [normalize_whitespace(tag.get_text()) for tag in tags]
-    
-    return headings
+    return _extract_headings(_parse_html(html))
 
 
 def extract_page_data(html: str) -> Dict[str, Any]:
@@ -169,10 +199,13 @@ def extract_page_data(html: str) -> Dict[str, Any]:
     Returns:
         Dictionary with all extracted data
     """
-    metadata = extract_metadata(html)
-    content = extract_content(html)
-    headings = extract_headings(html)
-    schema = extract_schema(html)
+    # Parse once and share the tree; content extraction strips elements in
+    # place, so it runs after everything that reads scripts and headings
+    tree = _parse_html(html)
+    metadata = _extract_metadata(tree)
+    headings = _extract_headings(tree)
+    schema = _extract_schema(tree)
+    content = _extract_content(tree)
     
     word_count = len(content.split())
     
@@ -183,3 +216,35 @@ def extract_page_data(html: str) -> Dict[str, Any]:
         'schema': schema,
         'word_count': word_count
     }
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    """Get the extraction process pool, creating it on first use."""
+    global _executor
+    if _executor is None:
+        # Spawn rather than fork: the caller runs an event loop and database
+        # threads that must not be duplicated into the workers
+        _executor = ProcessPoolExecutor(mp_context=multiprocessing.get_context('spawn'))
+    return _executor
+
+
+async def extract_page_data_async(html: str) -> Dict[str, Any]:
+    """
+    Extract page data in a worker process without blocking the event loop.
+    
+    Args:
+        html: HTML content
+        
+    Returns:
+        Dictionary with all extracted data (same as extract_page_data)
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), extract_page_data, html)
+
+
+def shutdown_extraction_executor() -> None:
+    """Stop the extraction worker processes, if they were started."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown()
+        _executor = None
@@ -1,7 +1,7 @@
 """HTML page fetching functionality."""
 from typing import Dict, List, Optional
 
-from app.utils.aio import fetch_urls_batch, SessionManager
+from app.utils.aio import fetch_urls_batch, get_default_session_manager, SessionManager
 from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -24,7 +24,8 @@ async def fetch_pages(
         timeout: Request timeout in seconds
         retry_attempts: Number of retry attempts
         user_agent: User agent string
-        session_manager: Optional session manager to reuse
+        session_manager: Optional session manager to reuse (defaults to the
+            shared manager from get_default_session_manager)
         
     Returns:
         Dictionary mapping URLs to their HTML content
@@ -33,30 +34,21 @@ async def fetch_pages(
     
     logger.info(f"Fetching {len(urls)} pages with {max_concurrent} concurrent requests")
     
-    should_close = session_manager is None
     if session_manager is None:
-        session_manager = SessionManager(
-            max_connections=max_concurrent * 2,
-            per_host_limit=min(max_concurrent, 5),
-            timeout=timeout
-        )
+        session_manager = get_default_session_manager()
     
     session = await session_manager.get_session()
     
-    try:
-        results = await fetch_urls_batch(
-            urls=urls,
-            max_concurrent=max_concurrent,
-            timeout=timeout,
-            retry_attempts=retry_attempts,
-            headers=headers,
-            session=session
-        )
-        
-        successful = sum(1 for content in results.values() if content is not None)
-        logger.info(f"Successfully fetched {successful}/{len(urls)} pages")
-        
-        return results
-    finally:
-        if should_close:
-            await session_manager.close()
+    results = await fetch_urls_batch(
+        urls=urls,
+        max_concurrent=max_concurrent,
+        timeout=timeout,
+        retry_attempts=retry_attempts,
+        headers=headers,
+        session=session
+    )
+    
+    successful = sum(1 for content in results.values() if content is not None)
+    logger.info(f"Successfully fetched {successful}/{len(urls)} pages")
+    
+    return results
@@ -1,14 +1,92 @@
 """Compare embeddings and compute similarities."""
 import numpy as np
-from typing import List, Tuple, Dict
+from typing import List, Tuple, Dict, Sequence, Union
 from sklearn.metrics.pairwise import cosine_similarity
 from sklearn.cluster import DBSCAN
+from app.embeddings.kernels import EPSILON, l2_normalize_rows
 from app.utils.logger import get_logger
 
+try:
+    import faiss
+except ImportError:
+    # Optional accelerator; fall back to NumPy matrix products
+    faiss = None
+
 logger = get_logger(__name__)
 
 # Constants
-EPSILON = 1e-10  # Small value to prevent division by zero in normalization
+FAISS_MIN_PAIRS = 10_000_000  # Below this many pairs a single NumPy matmul is as fast
+HNSW_NEIGHBORS = 32  # Graph degree (M) for approximate FAISS search
+HNSW_EF_SEARCH = 64  # Candidate list size for approximate FAISS search
+
+
+def _normalized_float32(embeddings: Union[List[np.ndarray], np.ndarray]) -> np.ndarray:
+    """
+    Stack embeddings into an L2-normalized float32 matrix.
+    
+    Lower-precision (e.g. float16) input is upcast once here so the dot
+    products run through float32 BLAS.
+    """
+    return l2_normalize_rows(np.array(embeddings, dtype=np.float32))
+
+
+class EmbeddingStore:
+    """L2-normalized float32 embedding matrix with per-row ids and URLs."""
+    
+    def __init__(
+        self,
+        ids: Sequence[int],
+        vecs: Union[List[np.ndarray], np.ndarray],
+        urls: Sequence[str],
+        normalized: bool = False
+    ):
+        """
+        Initialize embedding store.
+        
+        Args:
+            ids: Row identifiers (chunk IDs)
+            vecs: Embedding vectors, one per row
+            urls: Page URL for each row
+            normalized: Whether vecs is already an L2-normalized float32 matrix
+        """
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.urls = list(urls)
+        if normalized:
+            self.vecs = np.asarray(vecs, dtype=np.float32)
+        elif len(vecs):
+            self.vecs = _normalized_float32(vecs)
+        else:
+            self.vecs = np.empty((0, 0), dtype=np.float32)
+    
+    @classmethod
+    def from_tuples(cls, rows: List[Tuple[int, np.ndarray, str]]) -> 'EmbeddingStore':
+        """
+        Build a store from (id, embedding, url) tuples.
+        
+        Args:
+            rows: List of (id, embedding, url)
+            
+        Returns:
+            EmbeddingStore with rows in input order
+        """
+        return cls(
+            [row_id for row_id, _, _ in rows],
+            [embedding for _, embedding, _ in rows],
+            [url for _, _, url in rows]
+        )
+    
+    def __len__(self) -> int:
+        """Number of stored embeddings."""
+        return len(self.urls)
+
+
+def _as_normalized_matrix(
+    embeddings: Union[EmbeddingStore, List[np.ndarray], np.ndarray]
+) -> np.ndarray:
+    """Return the normalized float32 matrix for a store or raw embeddings."""
+    if isinstance(embeddings, EmbeddingStore):
+        return embeddings.vecs
+    return _normalized_float32(embeddings)
 
 
 def compute_similarity(embedding1: np.ndarray, embedding2: np.ndarray) -> float:
@@ -36,68 +114,88 @@ def compute_similarity(embedding1: np.ndarray, embedding2: np.ndarray) -> float:
 
 def find_most_similar(
     query_embedding: np.ndarray,
-    embeddings: List[np.ndarray],
-    top_k: int = 5
+    embeddings: Union[EmbeddingStore, List[np.ndarray], np.ndarray],
+    top_k: int = 5,
+    normalized: bool = False
 ) -> List[Tuple[int, float]]:
     """
     Find most similar embeddings to query.
     
     Args:
         query_embedding: Query embedding
-        embeddings: List of embeddings to compare
+        embeddings: EmbeddingStore, list of embeddings or a stacked (n, dim) matrix
         top_k: Number of top results to return
+        normalized: Whether the embeddings matrix rows are already L2-normalized,
+            so repeated queries against the same corpus skip renormalizing it
+            (always true for an EmbeddingStore)
         
     Returns:
         List of tuples (index, similarity_score)
     """
-    if not embeddings:
+    if len(embeddings) == 0 or top_k <= 0:
         return []
     
     # Normalize query embedding
     query = query_embedding / (np.linalg.norm(query_embedding) + EPSILON)
-    query = query.reshape(1, -1)
     
-    # Normalize all embeddings
-    embedding_matrix = np.array(embeddings)
-    norms = np.linalg.norm(embedding_matrix, axis=1, keepdims=True) + EPSILON
-    embedding_matrix = embedding_matrix / norms
+    if isinstance(embeddings, EmbeddingStore):
+        embedding_matrix = embeddings.vecs
+    elif normalized:
+        embedding_matrix = np.ascontiguousarray(embeddings, dtype=np.float32)
+    else:
+        embedding_matrix = _normalized_float32(embeddings)
     
-    similarities = cosine_similarity(query, embedding_matrix)[0]
+    similarities = embedding_matrix @ query.astype(np.float32, copy=False)
     
-    # Get top k indices
-    top_indices = np.argsort(similarities)[::-1][:top_k]
+    # Partial sort: select the top k in O(n), then order only those
+    if top_k < len(similarities):
+        top_indices = np.argpartition(-similarities, top_k)[:top_k]
+    else:
+        top_indices = np.arange(len(similarities))
+    top_indices = top_indices[np.argsort(-similarities[top_indices], kind='stable')]
     
     results = [(int(idx), float(similarities[idx])) for idx in top_indices]
     return results
 
 
 def cluster_embeddings(
-    embeddings: List[np.ndarray],
+    embeddings: Union[EmbeddingStore, List[np.ndarray], np.ndarray],
     eps: float = 0.3,
     min_samples: int = 2
 ) -> np.ndarray:
     """
     Cluster embeddings using DBSCAN.
     
+    Vectors are L2-normalized and clustered with euclidean distance on a ball
+    tree. On unit vectors ||a - b||^2 = 2 * (1 - cos(a, b)), so the cosine
+    distance eps maps to a euclidean radius of sqrt(2 * eps) and the clusters
+    match metric='cosine' without its brute-force pairwise distances.
+    
     Args:
-        embeddings: List of embedding vectors
-        eps: Maximum distance between samples
+        embeddings: EmbeddingStore or list of embedding vectors
+        eps: Maximum cosine distance between samples
         min_samples: Minimum samples in a cluster
         
     Returns:
         Cluster labels array
     """
-    if not embeddings or len(embeddings) < min_samples:
+    if len(embeddings) == 0 or len(embeddings) < min_samples:
         return np.array([])
     
-    embedding_matrix = np.array(embeddings)
+    embedding_matrix = _as_normalized_matrix(embeddings)
     
     # Use DBSCAN for clustering
-    clustering = DBSCAN(eps=eps, min_samples=min_samples, metric='cosine')
+    clustering = DBSCAN(
+        eps=float(np.sqrt(2 * eps)),
+        min_samples=min_samples,
+        metric='euclidean',
+        algorithm='ball_tree',
+        n_jobs=-1
+    )
     labels = clustering.fit_predict(embedding_matrix)
     
     n_clusters = len(set(labels)) - (1 if -1 in labels else 0)
-    n_noise = list(labels).count(-1)
+    n_noise = int(np.count_nonzero(labels == -1))
     
     logger.info(f"Found {n_clusters} clusters and {n_noise} noise points")
     
@@ -105,8 +203,8 @@ def cluster_embeddings(
 
 
 def compute_similarity_matrix(
-    embeddings1: List[np.ndarray],
-    embeddings2: List[np.ndarray]
+    embeddings1: Union[EmbeddingStore, List[np.ndarray], np.ndarray],
+    embeddings2: Union[EmbeddingStore, List[np.ndarray], np.ndarray]
 ) -> np.ndarray:
     """
     Compute similarity matrix between two sets of embeddings.
@@ -118,67 +216,101 @@ def compute_similarity_matrix(
     Returns:
         Similarity matrix
     """
-    if not embeddings1 or not embeddings2:
+    if len(embeddings1) == 0 or len(embeddings2) == 0:
         return np.array([])
     
-    # Normalize embeddings
-    matrix1 = np.array(embeddings1)
-    matrix2 = np.array(embeddings2)
+    # Normalized float32 rows, so the matrix product is the cosine similarity
+    matrix1 = _as_normalized_matrix(embeddings1)
+    matrix2 = _as_normalized_matrix(embeddings2)
     
-    norms1 = np.linalg.norm(matrix1, axis=1, keepdims=True) + EPSILON
-    norms2 = np.linalg.norm(matrix2, axis=1, keepdims=True) + EPSILON
+    return matrix1 @ matrix2.T
+
+
+def _nearest_primaries(
+    primary_vecs: np.ndarray,
+    competitor_vecs: np.ndarray,
+    approximate: bool = False
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Find the most similar primary row for every competitor row.
     
-    matrix1 = matrix1 / norms1
-    matrix2 = matrix2 / norms2
+    Uses a FAISS inner-product index when faiss is installed and the pool is
+    large, so the full (competitors, primaries) matrix is never materialized.
     
-    similarity_matrix = cosine_similarity(matrix1, matrix2)
+    Args:
+        primary_vecs: Normalized primary embedding matrix
+        competitor_vecs: Normalized competitor embedding matrix
+        approximate: Use an HNSW graph instead of exact search (FAISS only)
+        
+    Returns:
+        Tuple of (primary indices, similarities), one entry per competitor row
+    """
+    if faiss is not None and (approximate or len(primary_vecs) * len(competitor_vecs) >= FAISS_MIN_PAIRS):
+        primary_vecs = np.ascontiguousarray(primary_vecs, dtype=np.float32)
+        competitor_vecs = np.ascontiguousarray(competitor_vecs, dtype=np.float32)
+        
+        dim = primary_vecs.shape[1]
+        if approximate:
+            index = faiss.IndexHNSWFlat(dim, HNSW_NEIGHBORS, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efSearch = HNSW_EF_SEARCH
+        else:
+            index = faiss.IndexFlatIP(dim)
+        index.add(primary_vecs)
+        
+        similarities, indices = index.search(competitor_vecs, 1)
+        return indices[:, 0], similarities[:, 0]
     
-    return similarity_matrix
+    similarities = competitor_vecs @ primary_vecs.T  # (competitors, primaries)
+    max_indices = similarities.argmax(axis=1)
+    return max_indices, similarities[np.arange(len(competitor_vecs)), max_indices]
 
 
 def find_content_gaps(
-    primary_embeddings: List[Tuple[int, np.ndarray, str]],
-    competitor_embeddings: List[Tuple[int, np.ndarray, str]],
-    threshold: float = 0.45
+    primary_embeddings: Union[EmbeddingStore, List[Tuple[int, np.ndarray, str]]],
+    competitor_embeddings: Union[EmbeddingStore, List[Tuple[int, np.ndarray, str]]],
+    threshold: float = 0.45,
+    approximate: bool = False
 ) -> List[Dict]:
     """
     Find content gaps by comparing embeddings.
     
     Args:
-        primary_embeddings: List of (id, embedding, url) for primary site
-        competitor_embeddings: List of (id, embedding, url) for competitors
+        primary_embeddings: EmbeddingStore or list of (id, embedding, url) for primary site
+        competitor_embeddings: EmbeddingStore or list of (id, embedding, url) for competitors
         threshold: Similarity threshold
+        approximate: Use approximate HNSW nearest-neighbor search when faiss
+            is installed (exact search otherwise)
         
     Returns:
         List of gap dictionaries
     """
     gaps = []
     
-    if not primary_embeddings:
+    if not len(primary_embeddings):
         logger.warning("No primary embeddings found")
         return gaps
     
-    primary_embs = [emb for _, emb, _ in primary_embeddings]
+    if not len(competitor_embeddings):
+        logger.info("Found 0 potential content gaps")
+        return gaps
+    
+    # Normalize both sets once (lists are wrapped), then find each competitor's closest primary
+    if not isinstance(primary_embeddings, EmbeddingStore):
+        primary_embeddings = EmbeddingStore.from_tuples(primary_embeddings)
+    if not isinstance(competitor_embeddings, EmbeddingStore):
+        competitor_embeddings = EmbeddingStore.from_tuples(competitor_embeddings)
     
-    for comp_id, comp_emb, comp_url in competitor_embeddings:
-        # Find most similar primary content
-        similarities = [
-            compute_similarity(comp_emb, prim_emb)
-            for prim_emb in primary_embs
-        ]
-        
-        if similarities:
-            max_similarity = max(similarities)
-            max_idx = similarities.index(max_similarity)
-            closest_url = primary_embeddings[max_idx][2]
-            
-            if max_similarity < threshold:
-                gaps.append({
-                    'competitor_url': comp_url,
-                    'closest_match_url': closest_url,
-                    'similarity_score': max_similarity,
-                    'gap_type': 'missing_content'
-                })
+    max_indices, max_similarities = _nearest_primaries(
+        primary_embeddings.vecs, competitor_embeddings.vecs, approximate
+    )
+    
+    for comp_idx in np.flatnonzero(max_similarities < threshold):
+        gaps.append({
+            'competitor_url': competitor_embeddings.urls[comp_idx],
+            'closest_match_url': primary_embeddings.urls[max_indices[comp_idx]],
+            'similarity_score': float(max_similarities[comp_idx]),
+            'gap_type': 'missing_content'
+        })
     
     logger.info(f"Found {len(gaps)} potential content gaps")
     return gaps
@@ -1,16 +1,76 @@
 """Generate embeddings for content chunks."""
 import asyncio
+import base64
+import hashlib
+from collections import OrderedDict
 import numpy as np
-from typing import List, Optional
-from openai import AsyncOpenAI, APIError, RateLimitError, APIConnectionError
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+from app.embeddings.kernels import EPSILON, l2_normalize_rows
+from app.utils.aio import TokenBucket
 from app.utils.logger import get_logger
+from app.utils.openai_client import RETRYABLE_ERRORS, get_openai_client, llm_retrying
+from app.utils.text import count_tokens
 
 logger = get_logger(__name__)
 
 # Constants
-EPSILON = 1e-10  # Small value to prevent division by zero in normalization
-MAX_RETRY_WAIT = 60  # Maximum wait time between retries (seconds)
-API_ERROR_WAIT = 30  # Wait time for API errors (seconds)
+EMBEDDING_CACHE_SIZE = 4096  # Embeddings kept in memory (~50 MB at 3072 dimensions)
+RATE_LIMIT_BURST_SECONDS = 10  # Token budget that may be spent in one burst (seconds of quota)
+
+# Recently generated embeddings keyed by (model, text digest), least recent first
+_embedding_cache: "OrderedDict[Tuple[str, bytes], np.ndarray]" = OrderedDict()
+
+
+def _embedding_cache_key(model: str, text: str) -> Tuple[str, bytes]:
+    """Build the in-memory cache key for a text embedding."""
+    return model, hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+
+def _embedding_cache_get(model: str, text: str) -> Optional[np.ndarray]:
+    """Look up a cached embedding, marking it as recently used."""
+    key = _embedding_cache_key(model, text)
+    embedding = _embedding_cache.get(key)
+    if embedding is not None:
+        _embedding_cache.move_to_end(key)
+    return embedding
+
+
+def _embedding_cache_put(model: str, text: str, embedding: np.ndarray) -> np.ndarray:
+    """
+    Cache a normalized embedding, evicting the least recently used entry.
+    
+    Returns:
+        The cached array, made read-only so callers cannot corrupt the cache
+    """
+    embedding.flags.writeable = False
+    _embedding_cache[_embedding_cache_key(model, text)] = embedding
+    if len(_embedding_cache) > EMBEDDING_CACHE_SIZE:
+        _embedding_cache.popitem(last=False)
+    return embedding
+
+
+def _decode_embeddings(data: List[Any]) -> np.ndarray:
+    """
+    Decode base64 embedding payloads into an L2-normalized float32 matrix.
+    
+    Requesting base64 skips the SDK's conversion of every component into a
+    Python float; the raw bytes are read straight into NumPy. This is the
+    only place embeddings are normalized: the matrix is returned read-only,
+    and cached rows are served as-is without another normalization pass.
+    
+    Args:
+        data: Embedding objects from an embeddings response, in input order
+        
+    Returns:
+        Read-only float32 matrix with one normalized row per input
+    """
+    matrix = np.stack([
+        np.frombuffer(base64.b64decode(item.embedding), dtype=np.float32)
+        for item in data
+    ])
+    l2_normalize_rows(matrix, EPSILON)
+    matrix.flags.writeable = False
+    return matrix
 
 
 async def generate_embedding(
@@ -36,52 +96,33 @@ async def generate_embedding(
     if not text or not text.strip():
         return None
     
-    client = AsyncOpenAI(api_key=api_key, timeout=timeout)
+    cached = _embedding_cache_get(model, text)
+    if cached is not None:
+        return cached
     
-    for attempt in range(max_retries):
-        try:
-            response = await client.embeddings.create(
-                model=model,
-                input=text
-            )
-            
-            embedding = np.array(response.data[0].embedding, dtype=np.float32)
-            
-            # Normalize embedding
-            embedding = embedding / (np.linalg.norm(embedding) + EPSILON)
-            
-            logger.debug(f"Generated embedding of dimension {len(embedding)}")
-            return embedding
-            
-        except RateLimitError as e:
-            wait_time = min(2 ** attempt, MAX_RETRY_WAIT)  # Exponential backoff, capped
-            logger.warning(f"Rate limit hit, waiting {wait_time}s (attempt {attempt + 1}/{max_retries})")
-            if attempt < max_retries - 1:
-                await asyncio.sleep(wait_time)
-            else:
-                logger.error(f"Failed to generate embedding after {max_retries} attempts: {e}")
-                return None
-                
-        except (APIError, APIConnectionError) as e:
-            wait_time = min(2 ** attempt, API_ERROR_WAIT)
-            logger.warning(f"API error: {e}, retrying in {wait_time}s (attempt {attempt + 1}/{max_retries})")
-            if attempt < max_retries - 1:
-                await asyncio.sleep(wait_time)
-            else:
-                logger.error(f"Failed to generate embedding after {max_retries} attempts: {e}")
-                return None
-                
-        except asyncio.TimeoutError:
-            logger.warning(f"Timeout generating embedding (attempt {attempt + 1}/{max_retries})")
-            if attempt >= max_retries - 1:
-                logger.error(f"Failed to generate embedding after {max_retries} timeout attempts")
-                return None
-                
-        except Exception as e:
-            logger.error(f"Unexpected error generating embedding: {e}")
-            return None
+    client = get_openai_client(api_key, timeout)
     
-    return None
+    try:
+        async for attempt in llm_retrying(max_retries, logger):
+            with attempt:
+                response = await client.embeddings.create(
+                    model=model,
+                    input=text,
+                    encoding_format="base64"
+                )
+        
+        embedding = _decode_embeddings(response.data)[0]
+        
+        logger.debug(f"Generated embedding of dimension {len(embedding)}")
+        return _embedding_cache_put(model, text, embedding)
+        
+    except RETRYABLE_ERRORS as e:
+        logger.error(f"Failed to generate embedding after {max_retries} attempts: {e!r}")
+        return None
+        
+    except Exception as e:
+        logger.error(f"Unexpected error generating embedding: {e}")
+        return None
 
 
 async def generate_embeddings_batch(
@@ -91,7 +132,9 @@ async def generate_embeddings_batch(
     batch_size: int = 100,
     timeout: int = 60,
     max_retries: int = 3,
-    max_concurrent: int = 5
+    max_concurrent: int = 5,
+    on_batch: Optional[Callable[[int, List[Optional[np.ndarray]]], Awaitable[None]]] = None,
+    tokens_per_minute: Optional[int] = None
 ) -> List[Optional[np.ndarray]]:
     """
     Generate embeddings for multiple texts in batches with bounded parallelism.
@@ -104,71 +147,82 @@ async def generate_embeddings_batch(
         timeout: Request timeout in seconds
         max_retries: Maximum retry attempts
         max_concurrent: Maximum concurrent batch requests
+        on_batch: Optional coroutine called with (batch_start, batch_embeddings)
+            as each batch finishes, in completion order
+        tokens_per_minute: Optional token-per-minute quota; requests are paced
+            so estimated input tokens stay within it instead of running into 429s
         
     Returns:
         List of embedding vectors
     """
-    embeddings = []
-    client = AsyncOpenAI(api_key=api_key, timeout=timeout)
+    embeddings: List[Optional[np.ndarray]] = [None] * len(texts)
+    client = get_openai_client(api_key, timeout)
     semaphore = asyncio.Semaphore(max_concurrent)
+    bucket = None
+    if tokens_per_minute:
+        rate = tokens_per_minute / 60
+        bucket = TokenBucket(rate, rate * RATE_LIMIT_BURST_SECONDS)
     
-    async def process_batch(batch_start: int, batch_texts: List[str]) -> List[Optional[np.ndarray]]:
-        """Process a single batch with semaphore control."""
+    async def process_batch(
+        batch_start: int,
+        batch_texts: List[str]
+    ) -> Tuple[int, List[Optional[np.ndarray]]]:
+        """Embed one batch, tagging the result with its start offset for as_completed."""
+        return batch_start, await embed_batch(batch_start, batch_texts)
+    
+    async def embed_batch(batch_start: int, batch_texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Embed one batch, returning None for texts that failed."""
+        batch_embeddings: List[Optional[np.ndarray]] = [None] * len(batch_texts)
+        
+        # Filter out empty texts and serve repeated ones from the cache
+        valid_batch = []
+        for idx, text in enumerate(batch_texts):
+            if not text or not text.strip():
+                continue
+            cached = _embedding_cache_get(model, text)
+            if cached is not None:
+                batch_embeddings[idx] = cached
+            else:
+                valid_batch.append((idx, text))
+        
+        if not valid_batch:
+            return batch_embeddings
+        
+        indices, valid_texts = zip(*valid_batch)
+        
+        if bucket is not None:
+            await bucket.acquire(sum(count_tokens(text) for text in valid_texts))
+        
         async with semaphore:
-            # Filter out empty texts
-            valid_batch = [(idx, text) for idx, text in enumerate(batch_texts) if text and text.strip()]
-            
-            if not valid_batch:
-                return [None] * len(batch_texts)
-            
-            for attempt in range(max_retries):
-                try:
-                    indices, valid_texts = zip(*valid_batch)
-                    
-                    response = await client.embeddings.create(
-                        model=model,
-                        input=list(valid_texts)
-                    )
-                    
-                    batch_embeddings = [None] * len(batch_texts)
-                    for idx, embedding_data in zip(indices, response.data):
-                        embedding = np.array(embedding_data.embedding, dtype=np.float32)
-                        # Normalize embedding
-                        embedding = embedding / (np.linalg.norm(embedding) + EPSILON)
-                        batch_embeddings[idx] = embedding
-                    
-                    logger.info(f"Generated {len(valid_texts)} embeddings (batch starting at {batch_start})")
-                    return batch_embeddings
-                    
-                except RateLimitError as e:
-                    wait_time = min(2 ** attempt, MAX_RETRY_WAIT)
-                    logger.warning(f"Rate limit hit for batch {batch_start}, waiting {wait_time}s")
-                    if attempt < max_retries - 1:
-                        await asyncio.sleep(wait_time)
-                    else:
-                        logger.error(f"Failed batch {batch_start} after {max_retries} attempts: {e}")
-                        return [None] * len(batch_texts)
-                        
-                except (APIError, APIConnectionError) as e:
-                    wait_time = min(2 ** attempt, API_ERROR_WAIT)
-                    logger.warning(f"API error for batch {batch_start}: {e}, retrying in {wait_time}s")
-                    if attempt < max_retries - 1:
-                        await asyncio.sleep(wait_time)
-                    else:
-                        logger.error(f"Failed batch {batch_start} after {max_retries} attempts: {e}")
-                        return [None] * len(batch_texts)
-                        
-                except asyncio.TimeoutError:
-                    logger.warning(f"Timeout for batch {batch_start} (attempt {attempt + 1}/{max_retries})")
-                    if attempt >= max_retries - 1:
-                        logger.error(f"Failed batch {batch_start} after {max_retries} timeout attempts")
-                        return [None] * len(batch_texts)
-                        
-                except Exception as e:
-                    logger.error(f"Unexpected error for batch {batch_start}: {e}")
-                    return [None] * len(batch_texts)
-            
-            return [None] * len(batch_texts)
+            try:
+                async for attempt in llm_retrying(max_retries, logger):
+                    with attempt:
+                        response = await client.embeddings.create(
+                            model=model,
+                            input=list(valid_texts),
+                            encoding_format="base64"
+                        )
+            except RETRYABLE_ERRORS as e:
+                logger.error(f"Failed batch {batch_start} after {max_retries} attempts: {e!r}")
+                return batch_embeddings
+                
+            except Exception as e:
+                logger.error(f"Unexpected error for batch {batch_start}: {e}")
+                return batch_embeddings
+        
+        # Decode and normalize in a worker thread after releasing the semaphore,
+        # so the next request is already in flight while this batch is processed
+        try:
+            matrix = await asyncio.to_thread(_decode_embeddings, response.data)
+        except Exception as e:
+            logger.error(f"Failed to decode embeddings for batch {batch_start}: {e}")
+            return batch_embeddings
+        
+        for idx, text, embedding in zip(indices, valid_texts, matrix):
+            batch_embeddings[idx] = _embedding_cache_put(model, text, embedding)
+        
+        logger.info(f"Generated {len(valid_texts)} embeddings (batch starting at {batch_start})")
+        return batch_embeddings
     
     # Create tasks for all batches
     tasks = []
@@ -176,11 +230,11 @@ async def generate_embeddings_batch(
         batch = texts[i:i + batch_size]
         tasks.append(process_batch(i, batch))
     
-    # Process batches with bounded parallelism
-    batch_results = await asyncio.gather(*tasks)
-    
-    # Flatten results
-    for batch_result in batch_results:
-        embeddings.extend(batch_result)
+    # Handle each batch as soon as it finishes rather than waiting for the slowest
+    for next_batch in asyncio.as_completed(tasks):
+        batch_start, batch_result = await next_batch
+        embeddings[batch_start:batch_start + len(batch_result)] = batch_result
+        if on_batch is not None:
+            await on_batch(batch_start, batch_result)
     
     return embeddings
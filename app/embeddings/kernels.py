@@ -0,0 +1,54 @@
+"""Numeric kernels for embedding matrices, JIT-compiled with numba when available."""
+import math
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    # Optional accelerator; fall back to NumPy
+    numba = None
+
+# Constants
+EPSILON = 1e-10  # Small value to prevent division by zero in normalization
+
+
+if numba is not None:
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def _l2_normalize_rows_jit(matrix, eps):
+        """Normalize each row in place, fusing the norm and division passes."""
+        for i in numba.prange(matrix.shape[0]):
+            total = 0.0
+            for j in range(matrix.shape[1]):
+                total += matrix[i, j] * matrix[i, j]
+            inverse = 1.0 / (math.sqrt(total) + eps)
+            for j in range(matrix.shape[1]):
+                matrix[i, j] *= inverse
+
+
+def l2_normalize_rows(matrix: np.ndarray, eps: float = EPSILON) -> np.ndarray:
+    """
+    L2-normalize the rows of a float32 matrix in place.
+    
+    With numba installed, writable C-contiguous float32 matrices are normalized
+    by a parallel kernel that reads each row once for its norm and once to
+    scale it; other inputs use the equivalent NumPy expression.
+    
+    Args:
+        matrix: Writable (n, dim) float32 matrix
+        eps: Added to each norm to avoid division by zero
+        
+    Returns:
+        The same matrix, normalized
+    """
+    if (
+        numba is not None
+        and matrix.dtype == np.float32
+        and matrix.ndim == 2
+        and matrix.flags.c_contiguous
+        and matrix.flags.writeable
+    ):
+        _l2_normalize_rows_jit(matrix, eps)
+    else:
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + eps
+    return matrix
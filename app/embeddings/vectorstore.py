@@ -1,20 +1,193 @@
 """Vector storage and retrieval using SQLite."""
+import asyncio
+import heapq
+import os
+from pathlib import Path
+
 import numpy as np
 import aiosqlite
 from typing import List, Optional, Tuple, Dict, Any
 from pydantic import ValidationError
 
+from app.embeddings.comparer import EmbeddingStore
+from app.embeddings.kernels import EPSILON, l2_normalize_rows
+from app.utils.database import connection_or_open, get_shared_connection, write_transaction
 from app.utils.logger import get_logger
 from app.utils.models import ChunkModel, EmbeddingModel
 
 logger = get_logger(__name__)
 
+# Rows per multi-row chunk upsert; 4 parameters each keeps a statement well
+# under SQLite's bound-variable limit
+CHUNK_UPSERT_BATCH_SIZE = 500
+
+# Stored embeddings are int8 with a per-vector scale (a quarter of float32's
+# size); the symmetric range keeps zero exactly representable
+INT8_MAX = 127
+
+
+def quantize_embeddings(embeddings: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Quantize equal-length embeddings to int8 rows with per-row scales.
+    
+    Args:
+        embeddings: Embedding vectors of one dimension
+        
+    Returns:
+        Tuple of ((n, dim) int8 matrix, (n,) float32 scales)
+    """
+    matrix = np.array(embeddings, dtype=np.float32)
+    max_abs = np.abs(matrix).max(axis=1)
+    scales = np.where(max_abs > 0, max_abs / INT8_MAX, 1.0).astype(np.float32)
+    
+    matrix /= scales[:, None]
+    np.rint(matrix, out=matrix)
+    np.clip(matrix, -INT8_MAX, INT8_MAX, out=matrix)
+    return matrix.astype(np.int8), scales
+
+
+def vector_file_path(db_path: str, dim: int) -> Path:
+    """
+    Get the flat file holding a database's int8 embedding rows of one width.
+    
+    Args:
+        db_path: Path to database
+        dim: Embedding dimension
+        
+    Returns:
+        Path next to the database, e.g. data/pages.db-vectors-3072.i8
+    """
+    return Path(f"{db_path}-vectors-{dim}.i8")
+
+
+class _VectorSlots:
+    """In-process row allocator for one vector file."""
+    
+    def __init__(self, next_row: int, free: List[int]):
+        """
+        Initialize allocator.
+        
+        Args:
+            next_row: First row past the end of the file
+            free: Rows inside the file that no embedding references
+        """
+        self.next_row = next_row
+        self.free = free
+        heapq.heapify(self.free)
+        self.lock = asyncio.Lock()
+    
+    def allocate(self, count: int) -> List[int]:
+        """Take count rows, lowest free rows first, then rows past the end."""
+        slots = [heapq.heappop(self.free) for _ in range(min(count, len(self.free)))]
+        appended = count - len(slots)
+        slots.extend(range(self.next_row, self.next_row + appended))
+        self.next_row += appended
+        return slots
+    
+    def release(self, slots: List[int]) -> None:
+        """Return rows that no committed embedding references."""
+        for slot in slots:
+            heapq.heappush(self.free, slot)
+
+
+# Allocators keyed by vector file, built from the embeddings table on first use
+_vector_slots: Dict[Path, _VectorSlots] = {}
+
+
+async def _get_vector_slots(db: aiosqlite.Connection, path: Path, dim: int) -> _VectorSlots:
+    """
+    Get the row allocator for a vector file, building it on first use.
+    
+    Args:
+        db: Open connection
+        path: Vector file
+        dim: Embedding dimension
+        
+    Returns:
+        Allocator whose free list holds every unreferenced row of the file
+    """
+    slots = _vector_slots.get(path)
+    if slots is not None:
+        return slots
+    
+    used = {
+        row_index
+        for (row_index,) in await db.execute_fetchall(
+            "SELECT row_index FROM embeddings WHERE dim = ? AND row_index IS NOT NULL", (dim,)
+        )
+    }
+    # Another batch may have built it while we waited; its rows would look free here
+    slots = _vector_slots.get(path)
+    if slots is None:
+        next_row = path.stat().st_size // dim if path.exists() else 0
+        slots = _VectorSlots(next_row, [row for row in range(next_row) if row not in used])
+        _vector_slots[path] = slots
+    return slots
+
+
+def _write_vectors(path: Path, rows: np.ndarray, slots: List[int]) -> None:
+    """
+    Write int8 rows into allocated slots of a vector file and fsync it.
+    
+    The fsync lands before the database commit that references the rows.
+    Runs in a worker thread; the file is opened without truncation so
+    concurrent writers to other slots are safe.
+    
+    Args:
+        path: Vector file
+        rows: C-contiguous (n, dim) int8 matrix
+        slots: Row index to write each row to
+    """
+    row_bytes = rows.shape[1]
+    with open(os.open(path, os.O_RDWR | os.O_CREAT, 0o644), "r+b") as f:
+        for row, slot in zip(rows, slots):
+            f.seek(slot * row_bytes)
+            f.write(memoryview(row))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _file_rows(path: Path, dim: int) -> int:
+    """
+    Count the complete rows in a vector file.
+    
+    Args:
+        path: Vector file
+        dim: Embedding dimension
+        
+    Returns:
+        Number of complete dim-wide rows
+        
+    Raises:
+        ValueError: If the file is missing
+    """
+    if not path.exists():
+        raise ValueError(f"Embedding vector file {path} is missing; re-run embedding to rebuild it")
+    return path.stat().st_size // dim
+
+
+def dequantize_embedding(blob: bytes, scale: Optional[float]) -> np.ndarray:
+    """
+    Decode a stored embedding blob.
+    
+    Args:
+        blob: Stored embedding bytes
+        scale: Per-vector int8 scale, or None for legacy float32 rows
+        
+    Returns:
+        float32 embedding vector
+    """
+    if scale is None:
+        return np.frombuffer(blob, dtype=np.float32)
+    return np.frombuffer(blob, dtype=np.int8).astype(np.float32) * np.float32(scale)
+
 
 async def store_embedding(
     db_path: str,
     chunk_id: int,
     embedding: np.ndarray,
-    model: str
+    model: str,
+    conn: Optional[aiosqlite.Connection] = None
 ) -> None:
     """
     Store embedding in database.
@@ -24,38 +197,33 @@ async def store_embedding(
         chunk_id: Chunk ID
         embedding: Embedding vector
         model: Model name
+        conn: Open connection to reuse; the shared connection is used when omitted
     """
-    async with aiosqlite.connect(db_path) as db:
-        # Enable foreign key constraints
-        await db.execute("PRAGMA foreign_keys = ON")
-        embedding_blob = embedding.tobytes()
-        
-        await db.execute("""
-            INSERT INTO embeddings (chunk_id, embedding, model)
-            VALUES (?, ?, ?)
-            ON CONFLICT(chunk_id) DO UPDATE SET
-                embedding=excluded.embedding,
-                model=excluded.model,
-                created_at=CURRENT_TIMESTAMP
-        """, (chunk_id, embedding_blob, model))
-        
-        await db.commit()
+    await store_embeddings_batch(db_path, [chunk_id], [embedding], model, conn=conn)
 
 
 async def store_embeddings_batch(
     db_path: str,
     chunk_ids: List[int],
     embeddings: List[np.ndarray],
-    model: str
+    model: str,
+    conn: Optional[aiosqlite.Connection] = None
 ) -> None:
     """
     Store multiple embeddings in database with optimized batch insert.
     
+    Vectors are quantized to int8 and written to the database's flat vector
+    file (see vector_file_path); the embeddings table keeps each chunk's
+    scale, row_index and dim. New vectors only go to rows no committed
+    embedding references, so a failed batch never corrupts stored vectors;
+    a re-embedded chunk's old row is freed for reuse once the batch commits.
+    
     Args:
         db_path: Path to database
         chunk_ids: List of chunk IDs
         embeddings: List of embedding vectors
         model: Model name
+        conn: Open connection to reuse; the shared connection is used when omitted
     """
     # Validate embeddings
     for chunk_id, embedding in zip(chunk_ids, embeddings):
@@ -70,31 +238,63 @@ async def store_embeddings_batch(
                 logger.error(f"Embedding validation failed for chunk {chunk_id}: {e}")
                 raise
     
-    async with aiosqlite.connect(db_path) as db:
-        # Enable foreign key constraints
-        await db.execute("PRAGMA foreign_keys = ON")
-        # Prepare batch data
-        data = [
-            (chunk_id, embedding.tobytes(), model)
-            for chunk_id, embedding in zip(chunk_ids, embeddings)
-            if embedding is not None
-        ]
-        
-        if not data:
-            logger.warning("No valid embeddings to store")
-            return
+    # Keep the last embedding per chunk, so every allocated row gets referenced
+    valid = list({
+        chunk_id: embedding
+        for chunk_id, embedding in zip(chunk_ids, embeddings)
+        if embedding is not None
+    }.items())
+    if not valid:
+        logger.warning("No valid embeddings to store")
+        return
+    
+    valid_ids, vectors = zip(*valid)
+    rows, scales = quantize_embeddings(vectors)
+    dim = rows.shape[1]
+    
+    async with connection_or_open(db_path, conn) as db:
+        path = vector_file_path(db_path, dim)
+        slots = await _get_vector_slots(db, path, dim)
         
-        # Use executemany for batch insert
-        await db.executemany("""
-            INSERT INTO embeddings (chunk_id, embedding, model)
-            VALUES (?, ?, ?)
-            ON CONFLICT(chunk_id) DO UPDATE SET
-                embedding=excluded.embedding,
-                model=excluded.model,
-                created_at=CURRENT_TIMESTAMP
-        """, data)
+        # One batch per file at a time, so the rows read as superseded here are
+        # still theirs to free after the commit
+        async with slots.lock:
+            existing: Dict[int, int] = {}
+            for start in range(0, len(valid_ids), CHUNK_UPSERT_BATCH_SIZE):
+                batch = valid_ids[start:start + CHUNK_UPSERT_BATCH_SIZE]
+                rows_found = await db.execute_fetchall(f"""
+                    SELECT chunk_id, row_index FROM embeddings
+                    WHERE dim = ? AND row_index IS NOT NULL
+                    AND chunk_id IN ({', '.join(['?'] * len(batch))})
+                """, (dim, *batch))
+                existing.update(rows_found)
+            
+            row_indexes = slots.allocate(len(valid_ids))
+            try:
+                await asyncio.to_thread(_write_vectors, path, rows, row_indexes)
+                data = [
+                    (chunk_id, float(scale), row_index, dim, model)
+                    for chunk_id, scale, row_index in zip(valid_ids, scales, row_indexes)
+                ]
+                
+                # The inline blob column is only read for rows without a row_index
+                async with write_transaction(db):
+                    await db.executemany("""
+                        INSERT INTO embeddings (chunk_id, embedding, scale, row_index, dim, model)
+                        VALUES (?, X'', ?, ?, ?, ?)
+                        ON CONFLICT(chunk_id) DO UPDATE SET
+                            embedding=excluded.embedding,
+                            scale=excluded.scale,
+                            row_index=excluded.row_index,
+                            dim=excluded.dim,
+                            model=excluded.model,
+                            created_at=CURRENT_TIMESTAMP
+                    """, data)
+            except BaseException:
+                slots.release(row_indexes)
+                raise
+            slots.release(list(existing.values()))
         
-        await db.commit()
         logger.info(f"Stored {len(data)} embeddings in batch")
 
 
@@ -109,69 +309,121 @@ async def get_embedding(db_path: str, chunk_id: int) -> Optional[np.ndarray]:
     Returns:
         Embedding vector or None
     """
-    async with aiosqlite.connect(db_path) as db:
-        # Enable foreign key constraints
-        await db.execute("PRAGMA foreign_keys = ON")
-        cursor = await db.execute(
-            "SELECT embedding FROM embeddings WHERE chunk_id = ?",
-            (chunk_id,)
-        )
-        row = await cursor.fetchone()
-        
-        if row:
-            return np.frombuffer(row[0], dtype=np.float32)
+    db = await get_shared_connection(db_path)
+    cursor = await db.execute(
+        "SELECT embedding, scale, row_index, dim FROM embeddings WHERE chunk_id = ?",
+        (chunk_id,)
+    )
+    row = await cursor.fetchone()
+    
+    if not row:
         return None
+    blob, scale, row_index, dim = row
+    if row_index is None:
+        return dequantize_embedding(blob, scale)
+    path = vector_file_path(db_path, dim)
+    if row_index >= _file_rows(path, dim):
+        raise ValueError(f"Embedding row {row_index} for chunk {chunk_id} is past the end of {path}")
+    vector = np.fromfile(path, dtype=np.int8, count=dim, offset=row_index * dim)
+    return vector.astype(np.float32) * np.float32(scale)
 
 
 async def get_all_embeddings(
     db_path: str,
     is_primary: Optional[bool] = None
-) -> List[Tuple[int, int, np.ndarray, str]]:
+) -> EmbeddingStore:
     """
-    Retrieve all embeddings with metadata.
+    Retrieve all embeddings as one normalized matrix.
+    
+    Rows are counted first and streamed into a preallocated (N, D) float32
+    matrix, so similarity scoring runs as a single matrix product instead of
+    over N separately allocated vectors. Vectors kept in the flat vector file
+    are gathered from a read-only memmap in one fancy-indexing pass; only
+    legacy inline blobs are decoded row by row.
     
     Args:
         db_path: Path to database
         is_primary: Filter by primary site if specified
         
     Returns:
-        List of tuples: (chunk_id, page_id, embedding, url)
+        EmbeddingStore of chunk IDs, L2-normalized vectors and page URLs
     """
-    async with aiosqlite.connect(db_path) as db:
-        # Enable foreign key constraints
-        await db.execute("PRAGMA foreign_keys = ON")
-        if is_primary is not None:
-            query = """
-                SELECT e.chunk_id, c.page_id, e.embedding, p.url
-                FROM embeddings e
-                JOIN chunks c ON e.chunk_id = c.id
-                JOIN pages p ON c.page_id = p.id
-                WHERE p.is_primary = ?
-            """
-            cursor = await db.execute(query, (is_primary,))
-        else:
-            query = """
-                SELECT e.chunk_id, c.page_id, e.embedding, p.url
-                FROM embeddings e
-                JOIN chunks c ON e.chunk_id = c.id
-                JOIN pages p ON c.page_id = p.id
-            """
-            cursor = await db.execute(query)
-        
-        rows = await cursor.fetchall()
-        
-        results = [
-            (row[0], row[1], np.frombuffer(row[2], dtype=np.float32), row[3])
-            for row in rows
-        ]
-        
-        logger.info(f"Retrieved {len(results)} embeddings")
-        return results
+    query = """
+        FROM embeddings e
+        JOIN chunks c ON e.chunk_id = c.id
+        JOIN pages p ON c.page_id = p.id
+    """
+    params: Tuple[Any, ...] = ()
+    if is_primary is not None:
+        query += " WHERE p.is_primary = ?"
+        params = (is_primary,)
+    
+    db = await get_shared_connection(db_path)
+    cursor = await db.execute(f"SELECT COUNT(*) {query}", params)
+    count = (await cursor.fetchone())[0]
+    
+    ids = np.empty(count, dtype=np.int64)
+    urls: List[str] = []
+    matrix: Optional[np.ndarray] = None
+    
+    # Matrix slots, file rows and scales of file-backed vectors, filled after the scan
+    file_slots: List[int] = []
+    file_rows: List[int] = []
+    file_scales: List[float] = []
+    dim: Optional[int] = None
+    
+    i = 0
+    async with db.execute(
+        f"SELECT e.chunk_id, e.embedding, e.scale, e.row_index, e.dim, p.url {query}", params
+    ) as cursor:
+        async for chunk_id, blob, scale, row_index, row_dim, url in cursor:
+            if i == count:
+                # Rows inserted since the count are picked up on the next load
+                break
+            if row_index is None:
+                vector = dequantize_embedding(blob, scale)
+                row_dim = vector.shape[0]
+            if matrix is None:
+                dim = row_dim
+                matrix = np.empty((count, dim), dtype=np.float32)
+            if row_index is None:
+                matrix[i] = vector
+            else:
+                file_slots.append(i)
+                file_rows.append(row_index)
+                file_scales.append(scale)
+            ids[i] = chunk_id
+            urls.append(url)
+            i += 1
+    
+    if matrix is None:
+        logger.info("Retrieved 0 embeddings")
+        return EmbeddingStore([], [], [])
+    
+    if file_slots:
+        path = vector_file_path(db_path, dim)
+        row_count = _file_rows(path, dim)
+        if max(file_rows) >= row_count:
+            raise ValueError(
+                f"{path} holds {row_count} embedding rows but the database references row "
+                f"{max(file_rows)}; the file is truncated or from another database"
+            )
+        vectors = np.memmap(path, dtype=np.int8, mode='r', shape=(row_count, dim))
+        matrix[file_slots] = vectors[file_rows] * np.asarray(file_scales, dtype=np.float32)[:, None]
+        del vectors
+    
+    # Rows deleted since the count leave unused tail slots
+    ids, matrix = ids[:i], matrix[:i]
+    l2_normalize_rows(matrix, EPSILON)
+    
+    logger.info(f"Retrieved {i} embeddings")
+    return EmbeddingStore(ids, matrix, urls, normalized=True)
 
 
 async def store_chunks_batch(
     db_path: str,
-    chunks_data: List[Dict[str, Any]]
+    chunks_data: List[Dict[str, Any]],
+    conn: Optional[aiosqlite.Connection] = None
 ) -> List[int]:
     """
     Store multiple chunks in a single transaction.
@@ -180,6 +432,7 @@ async def store_chunks_batch(
         db_path: Path to database
         chunks_data: List of chunk data dictionaries with keys:
                     page_id, chunk_index, content, token_count
+        conn: Open connection to reuse; the shared connection is used when omitted
         
     Returns:
         List of chunk IDs
@@ -195,41 +448,32 @@ async def store_chunks_batch(
             logger.error(f"Chunk validation failed: {e}")
             raise
     
-    chunk_ids = []
-    async with aiosqlite.connect(db_path) as db:
-        # Enable foreign key constraints
-        await db.execute("PRAGMA foreign_keys = ON")
-        for chunk in chunks_data:
-            # Check if chunk exists
-            cursor = await db.execute(
-                "SELECT id FROM chunks WHERE page_id = ? AND chunk_index = ?",
-                (chunk['page_id'], chunk['chunk_index'])
-            )
-            row = await cursor.fetchone()
-            
-            if row:
-                # Update existing chunk
-                chunk_id = row[0]
-                await db.execute("""
-                    UPDATE chunks SET content=?, token_count=?
-                    WHERE id = ?
-                """, (chunk['content'], chunk['token_count'], chunk_id))
-            else:
-                # Insert new chunk
-                cursor = await db.execute("""
-                    INSERT INTO chunks (page_id, chunk_index, content, token_count)
-                    VALUES (?, ?, ?, ?)
-                """, (
-                    chunk['page_id'],
-                    chunk['chunk_index'],
-                    chunk['content'],
-                    chunk['token_count']
-                ))
-                chunk_id = cursor.lastrowid
-            
-            chunk_ids.append(chunk_id)
+    if not chunks_data:
+        return []
+    
+    async with connection_or_open(db_path, conn) as db, write_transaction(db):
+        # Multi-row upserts return the ids directly; conflicting rows keep theirs.
+        # RETURNING row order is unspecified, so map ids back by key
+        id_map: Dict[Tuple[int, int], int] = {}
+        for start in range(0, len(chunks_data), CHUNK_UPSERT_BATCH_SIZE):
+            batch = chunks_data[start:start + CHUNK_UPSERT_BATCH_SIZE]
+            params = [
+                value
+                for chunk in batch
+                for value in (chunk['page_id'], chunk['chunk_index'], chunk['content'], chunk['token_count'])
+            ]
+            rows = await db.execute_fetchall(f"""
+                INSERT INTO chunks (page_id, chunk_index, content, token_count)
+                VALUES {', '.join(['(?, ?, ?, ?)'] * len(batch))}
+                ON CONFLICT(page_id, chunk_index) DO UPDATE SET
+                    content=excluded.content,
+                    token_count=excluded.token_count
+                RETURNING page_id, chunk_index, id
+            """, params)
+            for page_id, chunk_index, chunk_id in rows:
+                id_map[(page_id, chunk_index)] = chunk_id
         
-        await db.commit()
+        chunk_ids = [id_map[(chunk['page_id'], chunk['chunk_index'])] for chunk in chunks_data]
         logger.info(f"Stored {len(chunk_ids)} chunks in batch")
     
     return chunk_ids
@@ -240,7 +484,8 @@ async def store_chunk(
     page_id: int,
     chunk_index: int,
     content: str,
-    token_count: int
+    token_count: int,
+    conn: Optional[aiosqlite.Connection] = None
 ) -> int:
     """
     Store content chunk in database.
@@ -251,6 +496,7 @@ async def store_chunk(
         chunk_index: Chunk index
         content: Chunk content
         token_count: Token count
+        conn: Open connection to reuse; the shared connection is used when omitted
         
     Returns:
         Chunk ID
@@ -270,9 +516,7 @@ async def store_chunk(
         logger.error(f"Chunk validation failed: {e}")
         raise
     
-    async with aiosqlite.connect(db_path) as db:
-        # Enable foreign key constraints
-        await db.execute("PRAGMA foreign_keys = ON")
+    async with connection_or_open(db_path, conn) as db, write_transaction(db):
         # Check if chunk exists
         cursor = await db.execute(
             "SELECT id FROM chunks WHERE page_id = ? AND chunk_index = ?",
@@ -294,6 +538,5 @@ async def store_chunk(
                 VALUES (?, ?, ?, ?)
             """, (page_id, chunk_index, content, token_count))
             chunk_id = cursor.lastrowid
-        
-        await db.commit()
-        return chunk_id
+    
+    return chunk_id
@@ -1,7 +1,10 @@
 """Content chunking functionality."""
+import os
 from typing import List
-import tiktoken
+
+import numpy as np
 from app.utils.logger import get_logger
+from app.utils.tokenizer import get_encoding
 
 logger = get_logger(__name__)
 
@@ -18,8 +21,8 @@ def count_tokens(text: str, model: str = "text-embedding-3-large") -> int:
         Token count
     """
     try:
-        # Use cl100k_base encoding for embedding models
-        encoding = tiktoken.get_encoding("cl100k_base")
+        # Encoder is cached per model (cl100k_base for embedding models)
+        encoding = get_encoding(model)
         return len(encoding.encode(text))
     except Exception:
         # Fallback to simple approximation
@@ -39,7 +42,7 @@ def chunk_text(
         text: Input text
         chunk_size: Target chunk size in tokens
         overlap: Overlap between chunks in tokens
-        model: Model name for tokenization (uses cl100k_base encoding)
+        model: Model name for tokenization (cl100k_base for embedding models)
         
     Returns:
         List of text chunks
@@ -48,8 +51,8 @@ def chunk_text(
         return []
     
     try:
-        # Use cl100k_base encoding for embedding models
-        encoding = tiktoken.get_encoding("cl100k_base")
+        # Encoder is cached per model (cl100k_base for embedding models)
+        encoding = get_encoding(model)
         tokens = encoding.encode(text)
     except Exception:
         # Fallback: split by characters
@@ -64,19 +67,21 @@ def chunk_text(
         
         return chunks
     
+    # Byte offset of every token boundary, so chunks are sliced from the
+    # original UTF-8 bytes instead of decoding each token window. Decoding
+    # with errors='replace' matches encoding.decode for windows that split a
+    # multi-byte character.
+    text_bytes = text.encode('utf-8')
+    offsets = np.zeros(len(tokens) + 1, dtype=np.int64)
+    np.cumsum([len(token_bytes) for token_bytes in encoding.decode_tokens_bytes(tokens)], out=offsets[1:])
+    
     # Split tokens into chunks
     chunks = []
     start = 0
     
     while start < len(tokens):
         end = min(start + chunk_size, len(tokens))
-        chunk_tokens = tokens[start:end]
-        
-        try:
-            chunk_text = encoding.decode(chunk_tokens)
-            chunks.append(chunk_text)
-        except Exception as e:
-            logger.warning(f"Failed to decode chunk: {e}")
+        chunks.append(text_bytes[offsets[start]:offsets[end]].decode('utf-8', errors='replace'))
         
         # Move start position with overlap
         start = end - overlap if end < len(tokens) else end
@@ -99,23 +104,28 @@ def chunk_by_paragraphs(
     Args:
         text: Input text
         target_chunk_size: Target chunk size in tokens
-        model: Model name for tokenization (uses cl100k_base encoding)
+        model: Model name for tokenization (cl100k_base for embedding models)
         
     Returns:
         List of text chunks
     """
-    paragraphs = text.split('\n\n')
+    paragraphs = [para.strip() for para in text.split('\n\n') if para.strip()]
     chunks = []
     current_chunk = []
     current_size = 0
     
-    for para in paragraphs:
-        para = para.strip()
-        if not para:
-            continue
-        
-        para_tokens = count_tokens(para, model)
-        
+    try:
+        # Tokenize all paragraphs in one call; tiktoken spreads the batch over
+        # its thread pool with the GIL released
+        token_lists = get_encoding(model).encode_ordinary_batch(
+            paragraphs, num_threads=os.cpu_count() or 1
+        )
+        token_counts = [len(tokens) for tokens in token_lists]
+    except Exception:
+        # Fallback to simple approximation
+        token_counts = [len(para) // 4 for para in paragraphs]
+    
+    for para, para_tokens in zip(paragraphs, token_counts):
         if current_size + para_tokens > target_chunk_size and current_chunk:
             # Save current chunk and start new one
             chunks.append('\n\n'.join(current_chunk))
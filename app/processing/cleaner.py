@@ -1,12 +1,61 @@
 """Text cleaning and normalization."""
 import re
-from typing import List, Optional
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
 
-from app.utils.text import normalize_whitespace, clean_html_remnants
+from app.utils.text import clean_html_and_whitespace, normalize_whitespace
 from app.utils.logger import get_logger
 
+try:
+    import re2
+except ImportError:
+    # Optional linear-time regex engine; fall back to the standard library
+    re2 = None
+
+try:
+    import ahocorasick
+except ImportError:
+    # Optional accelerator; fall back to the boilerplate regex
+    ahocorasick = None
+
 logger = get_logger(__name__)
 
+DEFAULT_BOILERPLATE_PHRASES = (
+    'cookie policy',
+    'privacy policy',
+    'terms of service',
+    'all rights reserved',
+    'copyright',
+    'skip to content',
+    'back to top'
+)
+
+# Characters of surrounding context removed on each side of a boilerplate phrase
+BOILERPLATE_CONTEXT = 50
+
+# URLs, email addresses and punctuation runs (group 1 keeps the last mark) in
+# one alternation. Email parts stop before an embedded URL, which is removed
+# on its own, so the result matches running the three patterns in turn.
+TOKEN_CLEANUP_RE = re.compile(
+    r'http[s]?://\S+'
+    r'|(?:(?!http[s]?://\S)\S)+@(?:(?!http[s]?://\S)\S)+'
+    r'|[!?.]+([!?.])'
+)
+
+# Whitespace before punctuation (dropped) or any other whitespace run (group 1)
+SPACE_CLEANUP_RE = re.compile(r'\s+(?=[,.!?;:])|(\s+)')
+
+
+def _replace_token(match: re.Match) -> str:
+    """Drop URLs and email addresses; collapse punctuation runs to their last mark."""
+    return match.group(1) or ''
+
+
+def _replace_space(match: re.Match) -> str:
+    """Drop whitespace before punctuation; collapse other whitespace runs."""
+    return '' if match.group(1) is None else ' '
+
 
 def clean_text(text: str) -> str:
     """
@@ -18,34 +67,101 @@ def clean_text(text: str) -> str:
     Returns:
         Cleaned text
     """
-    # Remove HTML remnants
-    text = clean_html_remnants(text)
+    # Remove HTML remnants and normalize whitespace
+    text = clean_html_and_whitespace(text)
     
-    # Normalize whitespace
-    text = normalize_whitespace(text)
+    # Remove URLs and email addresses, and collapse excessive punctuation
+    text = TOKEN_CLEANUP_RE.sub(_replace_token, text)
     
-    # Remove excessive punctuation
-    text = re.sub(r'([!?.]){2,}', r'\1', text)
+    # Remove spaces before punctuation and normalize whitespace again
+    text = SPACE_CLEANUP_RE.sub(_replace_space, text)
     
-    # Remove URLs
-    text = re.sub(r'http[s]?://\S+', '', text)
+    return text.strip()
+
+
+@lru_cache(maxsize=16)
+def _boilerplate_pattern(phrases: Tuple[str, ...]) -> Any:
+    """Compile one case-insensitive pattern matching any phrase with its context."""
+    alternation = '|'.join(re.escape(phrase) for phrase in phrases)
+    context = '.{0,%d}' % BOILERPLATE_CONTEXT
+    # Inline flag so the same pattern works with both re and re2
+    pattern = '(?i)' + context + '(?:' + alternation + ')' + context
+    if re2 is not None:
+        return re2.compile(pattern)
+    return re.compile(pattern)
+
+
+@lru_cache(maxsize=16)
+def _boilerplate_automaton(phrases: Tuple[str, ...]) -> Any:
+    """Build an Aho-Corasick automaton over the lowercased phrases."""
+    automaton = ahocorasick.Automaton()
+    for order, phrase in enumerate(phrases):
+        key = phrase.lower()
+        if key not in automaton:
+            automaton.add_word(key, (order, len(key)))
+    automaton.make_automaton()
+    return automaton
+
+
+def _boilerplate_spans(text: str, lowered: str, phrases: Tuple[str, ...]) -> List[Tuple[int, int]]:
+    """
+    Find the spans the boilerplate pattern would remove, in one automaton pass.
     
-    # Remove email addresses
-    text = re.sub(r'\S+@\S+', '', text)
+    Reproduces the regex's leftmost-greedy matching: each span starts as early
+    as possible, takes the furthest phrase reachable within the leading context
+    (the first listed phrase when several start there), and neither context
+    crosses a newline.
     
-    # Remove extra spaces around punctuation
-    text = re.sub(r'\s+([,.!?;:])', r'\1', text)
+    Args:
+        text: Input text
+        lowered: text.lower(), with the same length as text
+        phrases: Phrases to remove
+        
+    Returns:
+        Non-overlapping (start, end) spans in text order
+    """
+    # Phrase starting at each offset, keeping the earliest listed phrase
+    found: Dict[int, Tuple[int, int]] = {}
+    for end, (order, length) in _boilerplate_automaton(phrases).iter(lowered):
+        start = end - length + 1
+        if start not in found or order < found[start][0]:
+            found[start] = (order, length)
+    starts = sorted(found)
     
-    # Normalize whitespace again after all replacements
-    text = normalize_whitespace(text)
+    spans = []
+    pos = 0
+    i = 0
+    while True:
+        i = bisect_left(starts, pos, i)
+        if i == len(starts):
+            break
+        
+        # Earliest start that can still reach the next phrase on its line
+        first = starts[i]
+        span_start = max(pos, first - BOILERPLATE_CONTEXT, text.rfind('\n', 0, first) + 1)
+        
+        # The leading context is greedy, so it runs to the furthest phrase in reach
+        newline = text.find('\n', span_start)
+        reach = min(span_start + BOILERPLATE_CONTEXT, newline if newline != -1 else len(text))
+        phrase_start = starts[bisect_right(starts, reach) - 1]
+        phrase_end = phrase_start + found[phrase_start][1]
+        
+        newline = text.find('\n', phrase_end)
+        span_end = min(phrase_end + BOILERPLATE_CONTEXT, newline if newline != -1 else len(text))
+        spans.append((span_start, span_end))
+        pos = span_end
     
-    return text
+    return spans
 
 
 def remove_boilerplate(text: str, common_phrases: Optional[List[str]] = None) -> str:
     """
     Remove common boilerplate text.
     
+    All phrases are matched in a single scan: an Aho-Corasick automaton when
+    pyahocorasick is installed, otherwise one combined pattern (run by re2's
+    linear-time engine when installed).
+    
     Args:
         text: Input text
         common_phrases: List of common phrases to remove
@@ -53,23 +169,21 @@ def remove_boilerplate(text: str, common_phrases: Optional[List[str]] = None) ->
     Returns:
         Text with boilerplate removed
     """
-    if not common_phrases:
-        common_phrases = [
-            'cookie policy',
-            'privacy policy',
-            'terms of service',
-            'all rights reserved',
-            'copyright',
-            'skip to content',
-            'back to top'
-        ]
-    
-    text_lower = text.lower()
+    phrases = tuple(common_phrases) if common_phrases else DEFAULT_BOILERPLATE_PHRASES
     
-    for phrase in common_phrases:
-        # Remove phrase and surrounding context
-        pattern = re.compile(r'.{0,50}' + re.escape(phrase) + r'.{0,50}', re.IGNORECASE)
-        text = pattern.sub('', text)
+    # Remove phrases and surrounding context
+    lowered = text.lower() if ahocorasick is not None and all(phrases) else None
+    if lowered is not None and len(lowered) == len(text):
+        pieces = []
+        kept_from = 0
+        for start, end in _boilerplate_spans(text, lowered, phrases):
+            pieces.append(text[kept_from:start])
+            kept_from = end
+        pieces.append(text[kept_from:])
+        text = ''.join(pieces)
+    else:
+        # Lowercasing changed offsets (rare Unicode), so use the pattern
+        text = _boilerplate_pattern(phrases).sub('', text)
     
     return normalize_whitespace(text)
 
@@ -88,8 +202,9 @@ def validate_content(text: str, min_length: int = 100) -> bool:
     if not text or len(text) < min_length:
         return False
     
-    # Check if it's mostly meaningful text (not just numbers/symbols)
-    words = text.split()
+    # Check if it's mostly meaningful text (not just numbers/symbols); a
+    # bounded split stops after 20 words instead of splitting the whole page
+    words = text.split(None, 19)
     if len(words) < 20:
         return False
     
@@ -1,16 +1,38 @@
 """Content summarization using LLM."""
 import asyncio
-from typing import List, Optional
+import hashlib
+from typing import Any, Dict, List, Optional
 
-from openai import AsyncOpenAI, APIError, RateLimitError, APIConnectionError
-import tiktoken
+import aiohttp
 
+from app.processing.chunker import chunk_text
+from app.utils import jsonutil
+from app.utils.database import get_cached_llm_response, store_cached_llm_response
 from app.utils.logger import get_logger
+from app.utils.models import SummaryModel
+from app.utils.openai_client import get_openai_client, llm_retrying, post_chat_completion
+from app.utils.tokenizer import get_encoding, truncate_to_tokens
 
 logger = get_logger(__name__)
 
 # Constants
 CHARS_PER_TOKEN_APPROX = 4  # Approximate character to token ratio for fallback
+MAX_INPUT_TOKENS = 3000  # Content tokens sent with each summary/topic request
+MAP_CHUNK_TOKENS = 2500  # Chunk size when summarizing long content map-reduce style
+SUMMARY_MAX_TOKENS = 500  # Default response budget for the summary
+TOPICS_MAX_TOKENS = 200  # Response budget reserved for the topic list
+MAP_MAX_CONCURRENT = 4  # Default cap on concurrent chunk requests for one page
+
+# Instructions live entirely in the system message and the page text is the
+# whole user message, so every request shares the same prompt prefix and can
+# hit OpenAI's prompt cache
+SUMMARY_SYSTEM_PROMPT = (
+    "You are a helpful assistant that creates concise summaries of web page content "
+    "and identifies its main topics. Summarize the content in the user message in "
+    "2-3 sentences, focusing on the main topics and key points, and list up to "
+    "{max_topics} main topics. Respond with a JSON object of the form "
+    '{{"summary": "...", "topics": ["...", "..."]}} and nothing else.'
+)
 
 
 def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
@@ -25,25 +47,306 @@ def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
         Token count
     """
     try:
-        # Use cl100k_base encoding for GPT-4 models
-        encoding = tiktoken.get_encoding("cl100k_base")
-        return len(encoding.encode(text))
+        # Encoder is built once per model and shared across calls
+        return len(get_encoding(model).encode(text))
     except Exception:
         # Fallback to simple approximation
         return len(text) // CHARS_PER_TOKEN_APPROX
 
 
+def _summary_cache_key(
+    text: str,
+    model: str,
+    max_topics: int,
+    max_tokens: int,
+    full_coverage: bool
+) -> bytes:
+    """
+    Hash a summary request into a compact llm_cache key.
+    
+    Args:
+        text: Untruncated page text
+        model: Model name
+        max_topics: Maximum number of topics
+        max_tokens: Maximum tokens in the response
+        full_coverage: Whether the whole text is map-reduce summarized
+        
+    Returns:
+        16-byte BLAKE2b digest
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    parts = ('summary', model, str(max_topics), str(max_tokens), str(full_coverage), SUMMARY_SYSTEM_PROMPT, text)
+    for part in parts:
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\x1f')
+    return digest.digest()
+
+
+async def _cached_summary(cache_db_path: str, cache_key: bytes) -> Optional[SummaryModel]:
+    """Return a cached summary, treating cache failures as misses."""
+    try:
+        cached = await get_cached_llm_response(cache_db_path, cache_key)
+        return SummaryModel.model_validate_json(cached) if cached else None
+    except Exception as e:
+        logger.warning(f"Summary cache lookup failed: {e}")
+        return None
+
+
+async def _store_summary(
+    cache_db_path: str,
+    cache_key: bytes,
+    model: str,
+    result: SummaryModel
+) -> None:
+    """Store a summary in the cache, logging rather than raising on failure."""
+    try:
+        await store_cached_llm_response(
+            cache_db_path, cache_key, 'summary', model, result.model_dump_json()
+        )
+    except Exception as e:
+        logger.warning(f"Summary cache store failed: {e}")
+
+
+async def _chat(
+    api_key: str,
+    timeout: int,
+    session: Optional[aiohttp.ClientSession],
+    request: Dict[str, Any]
+) -> str:
+    """
+    Send one chat completion request.
+    
+    Args:
+        api_key: OpenAI API key
+        timeout: Request timeout in seconds
+        session: Aiohttp session for the direct REST path, or None for the SDK
+        request: Chat completion arguments (model, messages, ...)
+        
+    Returns:
+        Content of the first choice
+    """
+    if session is not None:
+        return await post_chat_completion(session, api_key, request, timeout)
+    
+    client = get_openai_client(api_key, timeout)
+    response = await client.chat.completions.create(**request)
+    return response.choices[0].message.content
+
+
+async def _summarize_once(
+    text: str,
+    api_key: str,
+    model: str,
+    max_topics: int,
+    max_tokens: int,
+    timeout: int,
+    max_retries: int,
+    session: Optional[aiohttp.ClientSession]
+) -> Optional[SummaryModel]:
+    """
+    Summarize text truncated to MAX_INPUT_TOKENS in a single request, with retries.
+    
+    Args:
+        text: Content to analyze
+        api_key: OpenAI API key
+        model: Model to use
+        max_topics: Maximum number of topics
+        max_tokens: Maximum tokens in the JSON response
+        timeout: Request timeout in seconds
+        max_retries: Maximum retry attempts
+        session: Optional aiohttp session for the direct REST path
+        
+    Returns:
+        Summary and topics, or None if failed
+    """
+    # Limit input text to MAX_INPUT_TOKENS with a single encode
+    text = truncate_to_tokens(text, MAX_INPUT_TOKENS, model)
+    
+    request = {
+        "model": model,
+        "messages": [
+            {
+                "role": "system",
+                "content": SUMMARY_SYSTEM_PROMPT.format(max_topics=max_topics)
+            },
+            {
+                "role": "user",
+                "content": text
+            }
+        ],
+        "max_tokens": max_tokens,
+        "temperature": 0.3,
+        "response_format": {"type": "json_object"}
+    }
+    
+    try:
+        async for attempt in llm_retrying(max_retries, logger):
+            with attempt:
+                content = await _chat(api_key, timeout, session, request)
+        
+        result = SummaryModel.model_validate(jsonutil.loads(content))
+        result.topics = result.topics[:max_topics]
+        logger.debug(f"Generated summary: {result.summary[:100]}... topics: {result.topics}")
+        return result
+        
+    except Exception as e:
+        logger.error(f"Failed to summarize content: {e}")
+        return None
+
+
+async def _summarize_chunks(
+    chunks: List[str],
+    api_key: str,
+    model: str,
+    max_topics: int,
+    max_tokens: int,
+    timeout: int,
+    max_retries: int,
+    session: Optional[aiohttp.ClientSession],
+    max_concurrent: int = MAP_MAX_CONCURRENT
+) -> Optional[SummaryModel]:
+    """
+    Map-reduce summarize: summarize chunks concurrently, then their summaries.
+    
+    When the joined chunk summaries are still longer than one chunk, they are
+    split and summarized again, so the final request sees all of them instead
+    of a truncated prefix.
+    
+    Args:
+        chunks: Consecutive pieces of the content
+        api_key: OpenAI API key
+        model: Model to use
+        max_topics: Maximum number of topics
+        max_tokens: Maximum tokens in each JSON response
+        timeout: Request timeout in seconds
+        max_retries: Maximum retry attempts
+        session: Optional aiohttp session for the direct REST path
+        max_concurrent: Maximum chunk requests in flight at once
+        
+    Returns:
+        Summary and topics of the whole content, or None if failed
+    """
+    semaphore = asyncio.Semaphore(max_concurrent)
+    
+    async def summarize(chunk: str) -> Optional[SummaryModel]:
+        async with semaphore:
+            return await _summarize_once(
+                chunk, api_key, model, max_topics, max_tokens, timeout, max_retries, session
+            )
+    
+    while True:
+        partials = await asyncio.gather(*(summarize(chunk) for chunk in chunks))
+        summaries = [partial.summary for partial in partials if partial is not None]
+        if not summaries:
+            return None
+        
+        combined = "\n".join(summaries)
+        groups = chunk_text(combined, chunk_size=MAP_CHUNK_TOKENS, overlap=0, model=model)
+        if len(groups) <= 1:
+            break
+        if len(groups) >= len(chunks):
+            logger.warning(
+                f"Chunk summaries stopped shrinking; reduce input truncated to {MAX_INPUT_TOKENS} tokens"
+            )
+            break
+        logger.debug(f"Re-summarizing {len(summaries)} chunk summaries in {len(groups)} groups")
+        chunks = groups
+    
+    logger.debug(f"Reducing {len(summaries)}/{len(chunks)} chunk summaries")
+    return await _summarize_once(
+        combined, api_key, model, max_topics, max_tokens, timeout, max_retries, session
+    )
+
+
+async def summarize_and_topics(
+    text: str,
+    api_key: str,
+    model: str = "gpt-4o-mini",
+    max_topics: int = 5,
+    max_tokens: int = SUMMARY_MAX_TOKENS + TOPICS_MAX_TOKENS,
+    timeout: int = 30,
+    max_retries: int = 3,
+    session: Optional[aiohttp.ClientSession] = None,
+    cache_db_path: Optional[str] = None,
+    full_coverage: bool = False,
+    max_concurrent: int = MAP_MAX_CONCURRENT
+) -> Optional[SummaryModel]:
+    """
+    Generate a summary and the main topics of content in one LLM call.
+    
+    The page text is sent once and the model answers with a JSON object
+    holding both fields, instead of two requests that each re-send it.
+    With cache_db_path set, results are kept in the llm_cache table keyed by
+    a hash of the text, model and request settings, so unchanged pages are
+    not re-summarized on later runs.
+    
+    Only the first MAX_INPUT_TOKENS tokens are sent by default. With
+    full_coverage, longer text is split into MAP_CHUNK_TOKENS chunks that are
+    summarized concurrently (at most max_concurrent at a time) and then
+    summarized together, at the cost of one request per chunk plus the
+    reduce requests.
+    
+    Args:
+        text: Content to analyze
+        api_key: OpenAI API key
+        model: Model to use
+        max_topics: Maximum number of topics
+        max_tokens: Maximum tokens in the JSON response
+        timeout: Request timeout in seconds
+        max_retries: Maximum retry attempts
+        session: Optional aiohttp session; when given, the request is posted
+            directly to the REST endpoint instead of through the SDK client
+        cache_db_path: Optional database holding the LLM response cache
+        full_coverage: Summarize the whole text instead of truncating it
+        max_concurrent: Maximum chunk requests in flight with full_coverage
+        
+    Returns:
+        Summary and topics, or None if failed
+    """
+    if not text or len(text) < 100:
+        return None
+    
+    cache_key = None
+    if cache_db_path:
+        # Key on the raw text so cache hits skip tokenization entirely
+        cache_key = _summary_cache_key(text, model, max_topics, max_tokens, full_coverage)
+        cached = await _cached_summary(cache_db_path, cache_key)
+        if cached is not None:
+            logger.debug("Summary cache hit")
+            return cached
+    
+    chunks = chunk_text(text, chunk_size=MAP_CHUNK_TOKENS, overlap=0, model=model) if full_coverage else []
+    if len(chunks) > 1:
+        result = await _summarize_chunks(
+            chunks, api_key, model, max_topics, max_tokens, timeout, max_retries, session, max_concurrent
+        )
+    else:
+        result = await _summarize_once(
+            text, api_key, model, max_topics, max_tokens, timeout, max_retries, session
+        )
+    
+    if result is not None and cache_key is not None:
+        await _store_summary(cache_db_path, cache_key, model, result)
+    return result
+
+
 async def summarize_content(
     text: str,
     api_key: str,
     model: str = "gpt-4o-mini",
-    max_tokens: int = 500,
+    max_tokens: int = SUMMARY_MAX_TOKENS,
     timeout: int = 30,
-    max_retries: int = 3
+    max_retries: int = 3,
+    session: Optional[aiohttp.ClientSession] = None,
+    cache_db_path: Optional[str] = None,
+    full_coverage: bool = False
 ) -> Optional[str]:
     """
     Generate summary of content using LLM with retry logic.
     
+    Thin wrapper over summarize_and_topics; call that directly when the
+    topics are needed too.
+    
     Args:
         text: Content to summarize
         api_key: OpenAI API key
@@ -51,74 +354,24 @@ async def summarize_content(
         max_tokens: Maximum tokens in summary
         timeout: Request timeout in seconds
         max_retries: Maximum retry attempts
+        session: Optional aiohttp session; when given, the request is posted
+            directly to the REST endpoint instead of through the SDK client
+        cache_db_path: Optional database holding the LLM response cache
+        full_coverage: Summarize the whole text instead of truncating it
         
     Returns:
         Summary text or None if failed
     """
-    if not text or len(text) < 100:
-        return None
-    
-    # Limit input text based on token count
-    text_tokens = count_tokens(text, model)
-    if text_tokens > 3000:
-        # Truncate to approximately 3000 tokens
-        encoding = tiktoken.get_encoding("cl100k_base")
-        tokens = encoding.encode(text)[:3000]
-        text = encoding.decode(tokens)
-    
-    client = AsyncOpenAI(api_key=api_key, timeout=timeout)
-    
-    for attempt in range(max_retries):
-        try:
-            response = await client.chat.completions.create(
-                model=model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a helpful assistant that creates concise summaries of web page content. Focus on the main topics and key points."
-                    },
-                    {
-                        "role": "user",
-                        "content": f"Summarize the following content in 2-3 sentences:\n\n{text}"
-                    }
-                ],
-                max_tokens=max_tokens,
-                temperature=0.3
-            )
-            
-            summary = response.choices[0].message.content.strip()
-            logger.debug(f"Generated summary: {summary[:100]}...")
-            return summary
-            
-        except RateLimitError as e:
-            wait_time = min(2 ** attempt, 60)
-            logger.warning(f"Rate limit hit, waiting {wait_time}s (attempt {attempt + 1}/{max_retries})")
-            if attempt < max_retries - 1:
-                await asyncio.sleep(wait_time)
-            else:
-                logger.error(f"Failed to generate summary after {max_retries} attempts: {e}")
-                return None
-                
-        except (APIError, APIConnectionError) as e:
-            wait_time = min(2 ** attempt, 30)
-            logger.warning(f"API error: {e}, retrying in {wait_time}s")
-            if attempt < max_retries - 1:
-                await asyncio.sleep(wait_time)
-            else:
-                logger.error(f"Failed to generate summary after {max_retries} attempts: {e}")
-                return None
-                
-        except asyncio.TimeoutError:
-            logger.warning(f"Timeout generating summary (attempt {attempt + 1}/{max_retries})")
-            if attempt >= max_retries - 1:
-                logger.error(f"Failed to generate summary after {max_retries} timeout attempts")
-                return None
-                
-        except Exception as e:
-            logger.error(f"Failed to generate summary: {e}")
-            return None
-    
-    return None
+    result = await summarize_and_topics(
+        text, api_key, model,
+        max_tokens=max_tokens + TOPICS_MAX_TOKENS,
+        timeout=timeout,
+        max_retries=max_retries,
+        session=session,
+        cache_db_path=cache_db_path,
+        full_coverage=full_coverage
+    )
+    return result.summary if result else None
 
 
 async def extract_topics(
@@ -127,11 +380,16 @@ async def extract_topics(
     model: str = "gpt-4o-mini",
     max_topics: int = 5,
     timeout: int = 30,
-    max_retries: int = 3
+    max_retries: int = 3,
+    session: Optional[aiohttp.ClientSession] = None,
+    cache_db_path: Optional[str] = None
 ) -> Optional[List[str]]:
     """
     Extract main topics from content using LLM with retry logic.
     
+    Thin wrapper over summarize_and_topics; call that directly when the
+    summary is needed too.
+    
     Args:
         text: Content to analyze
         api_key: OpenAI API key
@@ -139,73 +397,19 @@ async def extract_topics(
         max_topics: Maximum number of topics
         timeout: Request timeout in seconds
         max_retries: Maximum retry attempts
+        session: Optional aiohttp session; when given, the request is posted
+            directly to the REST endpoint instead of through the SDK client
+        cache_db_path: Optional database holding the LLM response cache
         
     Returns:
         List of topics or None if failed
     """
-    if not text or len(text) < 100:
-        return None
-    
-    # Limit input text based on token count
-    text_tokens = count_tokens(text, model)
-    if text_tokens > 3000:
-        encoding = tiktoken.get_encoding("cl100k_base")
-        tokens = encoding.encode(text)[:3000]
-        text = encoding.decode(tokens)
-    
-    client = AsyncOpenAI(api_key=api_key, timeout=timeout)
-    
-    for attempt in range(max_retries):
-        try:
-            response = await client.chat.completions.create(
-                model=model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": f"You are a helpful assistant that identifies main topics in web content. Return a comma-separated list of {max_topics} main topics."
-                    },
-                    {
-                        "role": "user",
-                        "content": f"What are the main topics in this content?\n\n{text}"
-                    }
-                ],
-                max_tokens=200,
-                temperature=0.3
-            )
-            
-            topics_text = response.choices[0].message.content.strip()
-            topics = [t.strip() for t in topics_text.split(',')]
-            topics = topics[:max_topics]
-            
-            logger.debug(f"Extracted topics: {topics}")
-            return topics
-            
-        except RateLimitError as e:
-            wait_time = min(2 ** attempt, 60)
-            logger.warning(f"Rate limit hit, waiting {wait_time}s (attempt {attempt + 1}/{max_retries})")
-            if attempt < max_retries - 1:
-                await asyncio.sleep(wait_time)
-            else:
-                logger.error(f"Failed to extract topics after {max_retries} attempts: {e}")
-                return None
-                
-        except (APIError, APIConnectionError) as e:
-            wait_time = min(2 ** attempt, 30)
-            logger.warning(f"API error: {e}, retrying in {wait_time}s")
-            if attempt < max_retries - 1:
-                await asyncio.sleep(wait_time)
-            else:
-                logger.error(f"Failed to extract topics after {max_retries} attempts: {e}")
-                return None
-                
-        except asyncio.TimeoutError:
-            logger.warning(f"Timeout extracting topics (attempt {attempt + 1}/{max_retries})")
-            if attempt >= max_retries - 1:
-                logger.error(f"Failed to extract topics after {max_retries} timeout attempts")
-                return None
-                
-        except Exception as e:
-            logger.error(f"Failed to extract topics: {e}")
-            return None
-    
-    return None
+    result = await summarize_and_topics(
+        text, api_key, model,
+        max_topics=max_topics,
+        timeout=timeout,
+        max_retries=max_retries,
+        session=session,
+        cache_db_path=cache_db_path
+    )
+    return result.topics if result else None
@@ -1,23 +1,60 @@
 """Generate JSON format gap analysis report."""
-import json
-from datetime import datetime
-from typing import Dict, Any
+import asyncio
+from datetime import datetime, timezone
+from typing import Any, BinaryIO, Dict, Optional
 from pathlib import Path
 from pydantic import ValidationError
 
+from app.utils import jsonutil
 from app.utils.logger import get_logger
 from app.utils.models import ReportModel
 
 logger = get_logger(__name__)
 
 
+def _write_json(f: BinaryIO, value: Any, depth: int, level: int = 0) -> None:
+    """
+    Write indented JSON, streaming the outer containers element by element.
+    
+    Containers nested less than depth levels deep are written one member at a
+    time, so only a single member is ever serialized in memory; deeper values
+    are serialized whole. The output matches jsonutil.dumps_pretty(value).
+    
+    Args:
+        f: Binary file to write to
+        value: Object to serialize
+        depth: Number of container levels to stream
+        level: Current nesting level, used for indentation
+    """
+    if depth > 0 and isinstance(value, (dict, list)) and value:
+        if isinstance(value, dict):
+            opening, closing = b'{', b'}'
+            members = ((jsonutil.dumps_pretty(str(key)) + b': ', item) for key, item in value.items())
+        else:
+            opening, closing = b'[', b']'
+            members = ((b'', item) for item in value)
+        
+        newline = b'\n' + b'  ' * (level + 1)
+        f.write(opening)
+        separator = newline
+        for prefix, item in members:
+            f.write(separator + prefix)
+            _write_json(f, item, depth - 1, level + 1)
+            separator = b',' + newline
+        f.write(b'\n' + b'  ' * level + closing)
+    else:
+        # JSON strings never contain raw newlines, so re-indenting is safe
+        f.write(jsonutil.dumps_pretty(value).replace(b'\n', b'\n' + b'  ' * level))
+
+
 def generate_json_report(
     gaps: Dict[str, Any],
     summary: Dict[str, Any],
     action_plan: list[Dict[str, Any]],
     quick_wins: list[Dict[str, Any]],
     config: Dict[str, Any],
-    output_path: str = "reports/gap_report.json"
+    output_path: str = "reports/gap_report.json",
+    generated_at: Optional[str] = None
 ) -> None:
     """
     Generate comprehensive JSON report.
@@ -29,6 +66,8 @@ def generate_json_report(
         quick_wins: Quick win opportunities
         config: Configuration used
         output_path: Output file path
+        generated_at: ISO 8601 generation timestamp; pass the same value to
+            sibling reports so they agree (defaults to the current UTC time)
         
     Raises:
         ValidationError: If report data is invalid
@@ -48,7 +87,7 @@ def generate_json_report(
     
     report = {
         'metadata': {
-            'generated_at': datetime.now().isoformat(),
+            'generated_at': generated_at or datetime.now(timezone.utc).isoformat(),
             'primary_site': config.get('site', 'Unknown'),
             'competitors_analyzed': len(config.get('competitors', [])),
             'version': '1.0'
@@ -67,9 +106,9 @@ def generate_json_report(
     # Ensure directory exists
     Path(output_path).parent.mkdir(parents=True, exist_ok=True)
     
-    # Write JSON file
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(report, f, indent=2, ensure_ascii=False)
+    # Stream the report section by section, and each gap list item by item
+    with open(output_path, 'wb') as f:
+        _write_json(f, report, depth=3)
     
     logger.info(f"JSON report saved to {output_path}")
 
@@ -87,7 +126,52 @@ def save_detailed_gaps(
     """
     Path(output_path).parent.mkdir(parents=True, exist_ok=True)
     
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(gaps_with_analysis, f, indent=2, ensure_ascii=False)
+    with open(output_path, 'wb') as f:
+        _write_json(f, gaps_with_analysis, depth=1)
     
     logger.info(f"Detailed gaps saved to {output_path}")
+
+
+async def generate_json_report_async(
+    gaps: Dict[str, Any],
+    summary: Dict[str, Any],
+    action_plan: list[Dict[str, Any]],
+    quick_wins: list[Dict[str, Any]],
+    config: Dict[str, Any],
+    output_path: str = "reports/gap_report.json",
+    generated_at: Optional[str] = None
+) -> None:
+    """
+    Generate the JSON report in a worker thread without blocking the event loop.
+    
+    Args:
+        gaps: All detected gaps
+        summary: Executive summary
+        action_plan: Prioritized action plan
+        quick_wins: Quick win opportunities
+        config: Configuration used
+        output_path: Output file path
+        generated_at: ISO 8601 generation timestamp; pass the same value to
+            sibling reports so they agree (defaults to the current UTC time)
+        
+    Raises:
+        ValidationError: If report data is invalid
+    """
+    await asyncio.to_thread(
+        generate_json_report, gaps, summary, action_plan, quick_wins, config,
+        output_path, generated_at
+    )
+
+
+async def save_detailed_gaps_async(
+    gaps_with_analysis: list[Dict[str, Any]],
+    output_path: str = "reports/detailed_gaps.json"
+) -> None:
+    """
+    Save detailed gap analysis in a worker thread without blocking the event loop.
+    
+    Args:
+        gaps_with_analysis: Gaps with LLM analysis
+        output_path: Output file path
+    """
+    await asyncio.to_thread(save_detailed_gaps, gaps_with_analysis, output_path)
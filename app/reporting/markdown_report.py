@@ -1,11 +1,44 @@
 """Generate Markdown format gap analysis report."""
-from datetime import datetime
-from typing import Dict, Any
+import asyncio
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
 from pathlib import Path
 from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# Number of entries listed per detailed gap section
+GAP_SECTION_LIMIT = 15
+
+# Per-entry templates; each ends with a newline that becomes the blank line
+# separating entries once the lines are joined
+_ACTION_TEMPLATE = (
+    "### {rank}. {action}\n"
+    "\n"
+    "- **Category:** {category}\n"
+    "- **Priority:** {priority}\n"
+    "- **Impact Score:** {impact_score:.1f}\n"
+    "{references}"
+    "- **Description:** {description}\n"
+)
+_MISSING_PAGE_TEMPLATE = (
+    "- **Competitor URL:** {competitor_url}\n"
+    "  - Similarity to closest match: {similarity_score:.2%}\n"
+    "  - Closest match: {closest_match_url}\n"
+    "  - Priority: {priority}\n"
+)
+_THIN_CONTENT_TEMPLATE = (
+    "- **Your URL:** {primary_url}\n"
+    "  - Your word count: {primary_word_count}\n"
+    "  - Competitor word count: {competitor_word_count}\n"
+    "  - Ratio: {ratio:.1f}x\n"
+    "  - Competitor reference: {competitor_url}\n"
+)
+_METADATA_TEMPLATE = (
+    "- **URL:** {url}\n"
+    "  - Missing: {missing}\n"
+)
+
 
 def generate_markdown_report(
     gaps: Dict[str, Any],
@@ -13,7 +46,8 @@ def generate_markdown_report(
     action_plan: list[Dict[str, Any]],
     quick_wins: list[Dict[str, Any]],
     config: Dict[str, Any],
-    output_path: str = "reports/gap_report.md"
+    output_path: str = "reports/gap_report.md",
+    generated_at: Optional[str] = None
 ) -> None:
     """
     Generate comprehensive Markdown report.
@@ -25,12 +59,16 @@ def generate_markdown_report(
         quick_wins: Quick win opportunities
         config: Configuration used
         output_path: Output file path
+        generated_at: ISO 8601 generation timestamp; pass the same value to
+            sibling reports so they agree (defaults to the current UTC time)
     """
+    generated = datetime.fromisoformat(generated_at) if generated_at else datetime.now(timezone.utc)
+    
     # Build markdown content
     md_lines = [
         "# SEO Content Gap Analysis Report",
         "",
-        f"**Generated:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
+        f"**Generated:** {generated.strftime('%Y-%m-%d %H:%M:%S %Z').rstrip()}",
         f"**Primary Site:** {config.get('site', 'Unknown')}",
         f"**Competitors Analyzed:** {len(config.get('competitors', []))}",
         "",
@@ -88,20 +126,21 @@ def generate_markdown_report(
         ""
     ])
     
-    for action in action_plan[:20]:
-        md_lines.append(f"### {action.get('rank')}. {action.get('action', 'Unknown Action')}")
-        md_lines.append("")
-        md_lines.append(f"- **Category:** {action.get('category', 'Unknown')}")
-        md_lines.append(f"- **Priority:** {action.get('priority', 'medium').upper()}")
-        md_lines.append(f"- **Impact Score:** {action.get('impact_score', 0):.1f}")
-        
-        if action.get('url'):
-            md_lines.append(f"- **URL:** {action['url']}")
-        if action.get('url_reference'):
-            md_lines.append(f"- **Reference:** {action['url_reference']}")
-        
-        md_lines.append(f"- **Description:** {action.get('description', 'No description')}")
-        md_lines.append("")
+    md_lines.extend(
+        _ACTION_TEMPLATE.format(
+            rank=action.get('rank'),
+            action=action.get('action', 'Unknown Action'),
+            category=action.get('category', 'Unknown'),
+            priority=action.get('priority', 'medium').upper(),
+            impact_score=action.get('impact_score', 0),
+            references=(
+                (f"- **URL:** {action['url']}\n" if action.get('url') else "")
+                + (f"- **Reference:** {action['url_reference']}\n" if action.get('url_reference') else "")
+            ),
+            description=action.get('description', 'No description')
+        )
+        for action in action_plan[:20]
+    )
     
     md_lines.extend([
         "---",
@@ -119,12 +158,15 @@ def generate_markdown_report(
             ""
         ])
         
-        for gap in gaps['missing_pages'][:15]:
-            md_lines.append(f"- **Competitor URL:** {gap.get('competitor_url', 'N/A')}")
-            md_lines.append(f"  - Similarity to closest match: {gap.get('similarity_score', 0):.2%}")
-            md_lines.append(f"  - Closest match: {gap.get('closest_match_url', 'N/A')}")
-            md_lines.append(f"  - Priority: {gap.get('priority', 'medium').upper()}")
-            md_lines.append("")
+        md_lines.extend(
+            _MISSING_PAGE_TEMPLATE.format(
+                competitor_url=gap.get('competitor_url', 'N/A'),
+                similarity_score=gap.get('similarity_score', 0),
+                closest_match_url=gap.get('closest_match_url', 'N/A'),
+                priority=gap.get('priority', 'medium').upper()
+            )
+            for gap in gaps['missing_pages'][:GAP_SECTION_LIMIT]
+        )
     
     # Thin Content
     if gaps.get('thin_content'):
@@ -135,13 +177,16 @@ def generate_markdown_report(
             ""
         ])
         
-        for gap in gaps['thin_content'][:15]:
-            md_lines.append(f"- **Your URL:** {gap.get('primary_url', 'N/A')}")
-            md_lines.append(f"  - Your word count: {gap.get('primary_word_count', 0)}")
-            md_lines.append(f"  - Competitor word count: {gap.get('competitor_word_count', 0)}")
-            md_lines.append(f"  - Ratio: {gap.get('ratio', 0):.1f}x")
-            md_lines.append(f"  - Competitor reference: {gap.get('competitor_url', 'N/A')}")
-            md_lines.append("")
+        md_lines.extend(
+            _THIN_CONTENT_TEMPLATE.format(
+                primary_url=gap.get('primary_url', 'N/A'),
+                primary_word_count=gap.get('primary_word_count', 0),
+                competitor_word_count=gap.get('competitor_word_count', 0),
+                ratio=gap.get('ratio', 0),
+                competitor_url=gap.get('competitor_url', 'N/A')
+            )
+            for gap in gaps['thin_content'][:GAP_SECTION_LIMIT]
+        )
     
     # Metadata Gaps
     if gaps.get('metadata_gaps'):
@@ -152,10 +197,13 @@ def generate_markdown_report(
             ""
         ])
         
-        for gap in gaps['metadata_gaps'][:15]:
-            md_lines.append(f"- **URL:** {gap.get('url', 'N/A')}")
-            md_lines.append(f"  - Missing: {', '.join(gap.get('missing_elements', []))}")
-            md_lines.append("")
+        md_lines.extend(
+            _METADATA_TEMPLATE.format(
+                url=gap.get('url', 'N/A'),
+                missing=', '.join(gap.get('missing_elements', []))
+            )
+            for gap in gaps['metadata_gaps'][:GAP_SECTION_LIMIT]
+        )
     
     # Schema Gaps
     if gaps.get('schema_gaps'):
@@ -166,8 +214,7 @@ def generate_markdown_report(
             ""
         ])
         
-        for gap in gaps['schema_gaps'][:15]:
-            md_lines.append(f"- {gap.get('url', 'N/A')}")
+        md_lines.extend(f"- {gap.get('url', 'N/A')}" for gap in gaps['schema_gaps'][:GAP_SECTION_LIMIT])
         md_lines.append("")
     
     md_lines.extend([
@@ -197,7 +244,34 @@ def generate_markdown_report(
     # Write markdown file
     Path(output_path).parent.mkdir(parents=True, exist_ok=True)
     
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write('\n'.join(md_lines))
+    Path(output_path).write_text('\n'.join(md_lines), encoding='utf-8')
     
     logger.info(f"Markdown report saved to {output_path}")
+
+
+async def generate_markdown_report_async(
+    gaps: Dict[str, Any],
+    summary: Dict[str, Any],
+    action_plan: list[Dict[str, Any]],
+    quick_wins: list[Dict[str, Any]],
+    config: Dict[str, Any],
+    output_path: str = "reports/gap_report.md",
+    generated_at: Optional[str] = None
+) -> None:
+    """
+    Generate the Markdown report in a worker thread without blocking the event loop.
+    
+    Args:
+        gaps: All detected gaps
+        summary: Executive summary
+        action_plan: Prioritized action plan
+        quick_wins: Quick win opportunities
+        config: Configuration used
+        output_path: Output file path
+        generated_at: ISO 8601 generation timestamp; pass the same value to
+            sibling reports so they agree (defaults to the current UTC time)
+    """
+    await asyncio.to_thread(
+        generate_markdown_report, gaps, summary, action_plan, quick_wins, config,
+        output_path, generated_at
+    )
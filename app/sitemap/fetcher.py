@@ -4,7 +4,7 @@ from typing import Optional
 
 import aiohttp
 from app.utils.logger import get_logger
-from app.utils.aio import fetch_url, SessionManager
+from app.utils.aio import fetch_url, get_default_session_manager, SessionManager
 
 logger = get_logger(__name__)
 
@@ -24,29 +24,27 @@ async def fetch_sitemap(
         timeout: Request timeout in seconds
         retry_attempts: Number of retry attempts
         user_agent: User agent string
-        session: Optional existing session to reuse
+        session: Optional existing session to reuse (defaults to the session
+            of the shared manager from get_default_session_manager)
         
     Returns:
         Sitemap XML content or None if failed
     """
     headers = {"User-Agent": user_agent}
     
-    should_close = session is None
     if session is None:
-        session = aiohttp.ClientSession(headers=headers)
+        session = await get_default_session_manager().get_session()
     
-    try:
-        content = await fetch_url(session, url, timeout, retry_attempts)
-        
-        if content:
-            logger.info(f"Successfully fetched sitemap: {url}")
-        else:
-            logger.error(f"Failed to fetch sitemap: {url}")
-        
-        return content
-    finally:
-        if should_close:
-            await session.close()
+    content = await fetch_url(
+        session, url, timeout=timeout, retry_attempts=retry_attempts, headers=headers
+    )
+    
+    if content:
+        logger.info(f"Successfully fetched sitemap: {url}")
+    else:
+        logger.error(f"Failed to fetch sitemap: {url}")
+    
+    return content
 
 
 async def fetch_sitemaps(
@@ -66,7 +64,8 @@ async def fetch_sitemaps(
         retry_attempts: Number of retry attempts
         user_agent: User agent string
         max_concurrent: Maximum concurrent requests
-        session_manager: Optional session manager to reuse
+        session_manager: Optional session manager to reuse (defaults to the
+            shared manager from get_default_session_manager)
         
     Returns:
         Dictionary mapping URLs to their XML content
@@ -74,39 +73,32 @@ async def fetch_sitemaps(
     results = {}
     headers = {"User-Agent": user_agent}
     
-    should_close = session_manager is None
     if session_manager is None:
-        session_manager = SessionManager(
-            max_connections=max_concurrent * 2,
-            per_host_limit=max_concurrent,
-            timeout=timeout
-        )
+        session_manager = get_default_session_manager()
     
     session = await session_manager.get_session()
     
-    try:
-        # Fetch sitemaps concurrently with semaphore
-        semaphore = asyncio.Semaphore(max_concurrent)
-        
-        async def fetch_with_semaphore(url: str):
-            async with semaphore:
-                content = await fetch_url(session, url, timeout, retry_attempts, headers)
-                if content:
-                    logger.info(f"Successfully fetched sitemap: {url}")
-                else:
-                    logger.error(f"Failed to fetch sitemap: {url}")
-                return url, content
-        
-        tasks = [fetch_with_semaphore(url) for url in urls]
-        responses = await asyncio.gather(*tasks)
-        
-        for url, content in responses:
-            results[url] = content
-            
-        logger.info(f"Fetched {len([c for c in results.values() if c])}/{len(urls)} sitemaps successfully")
+    # Fetch sitemaps concurrently with semaphore
+    semaphore = asyncio.Semaphore(max_concurrent)
+    
+    async def fetch_with_semaphore(url: str):
+        async with semaphore:
+            content = await fetch_url(
+                session, url, timeout=timeout, retry_attempts=retry_attempts, headers=headers
+            )
+            if content:
+                logger.info(f"Successfully fetched sitemap: {url}")
+            else:
+                logger.error(f"Failed to fetch sitemap: {url}")
+            return url, content
+    
+    async with asyncio.TaskGroup() as tg:
+        tasks = [tg.create_task(fetch_with_semaphore(url)) for url in urls]
+    
+    for task in tasks:
+        url, content = task.result()
+        results[url] = content
         
-    finally:
-        if should_close:
-            await session_manager.close()
+    logger.info(f"Fetched {len([c for c in results.values() if c])}/{len(urls)} sitemaps successfully")
     
     return results
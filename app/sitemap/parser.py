@@ -1,77 +1,165 @@
 """Sitemap parsing functionality."""
+import io
+import re
 import xml.etree.ElementTree as ET
-from typing import Optional
+from functools import lru_cache, partial
+from typing import Callable, Optional, Union
 from urllib.parse import urljoin
 
 from app.utils.logger import get_logger
 from app.utils.text import normalize_url
 
+try:
+    from lxml import etree as lxml_etree
+except ImportError:
+    # Optional accelerator; fall back to the standard library
+    lxml_etree = None
+
+try:
+    import hyperscan
+except ImportError:
+    # Optional accelerator; fall back to the standard library
+    hyperscan = None
+
 logger = get_logger(__name__)
 
+# Namespaces used by sitemap documents
+SITEMAP_NAMESPACES = {
+    'sm': 'http://www.sitemaps.org/schemas/sitemap/0.9',
+    'xhtml': 'http://www.w3.org/1999/xhtml'
+}
+
+# Pattern count from which filter_urls matches with hyperscan when installed
+HYPERSCAN_MIN_PATTERNS = 8
+
+# Clark-notation tags matched while streaming with lxml
+_SM_LOC = '{http://www.sitemaps.org/schemas/sitemap/0.9}loc'
+_SM_SITEMAP = '{http://www.sitemaps.org/schemas/sitemap/0.9}sitemap'
+_SM_URL = '{http://www.sitemaps.org/schemas/sitemap/0.9}url'
 
-def parse_sitemap(xml_content: str, base_url: Optional[str] = None) -> list[str]:
+if lxml_etree is not None:
+    _PARSE_ERRORS = (ET.ParseError, lxml_etree.XMLSyntaxError)
+else:
+    _PARSE_ERRORS = (ET.ParseError,)
+
+
+def _extract_locs_lxml(xml_content: Union[str, bytes]) -> list[str]:
     """
-    Parse sitemap XML and extract URLs.
+    Stream <loc> values with lxml iterparse, keeping memory bounded.
+    
+    Each <url>/<sitemap> entry is discarded once its <loc> has been read, so
+    the tree never holds more than a few entries even for 50k-URL sitemaps.
     
     Args:
         xml_content: Sitemap XML content
-        base_url: Base URL for resolving relative URLs
         
     Returns:
-        List of URLs found in sitemap
+        Unstripped <loc> texts, sitemap index entries first
     """
-    urls = []
+    if isinstance(xml_content, str):
+        # lxml rejects str input that carries an encoding declaration
+        xml_content = xml_content.encode('utf-8')
     
-    try:
-        root = ET.fromstring(xml_content)
+    index_locs = []
+    url_locs = []
+    plain_locs = []
+    # Sitemaps are untrusted input, so iterparse never expands entities or
+    # fetches external resources
+    for _, elem in lxml_etree.iterparse(
+        io.BytesIO(xml_content),
+        tag=(_SM_LOC, 'loc'),
+        resolve_entities=False,
+        no_network=True
+    ):
+        entry = elem.getparent()
+        if elem.text:
+            if elem.tag == 'loc':
+                plain_locs.append(elem.text)
+            elif entry is not None and entry.tag == _SM_SITEMAP:
+                index_locs.append(elem.text)
+            elif entry is not None and entry.tag == _SM_URL:
+                url_locs.append(elem.text)
         
-        # Handle different sitemap formats
-        namespaces = {
-            'sm': 'http://www.sitemaps.org/schemas/sitemap/0.9',
-            'xhtml': 'http://www.w3.org/1999/xhtml'
-        }
+        # Free the <loc> and every entry already read before this one
+        elem.clear(keep_tail=True)
+        if entry is not None and entry.getparent() is not None:
+            while entry.getprevious() is not None:
+                del entry.getparent()[0]
+    
+    if index_locs:
+        logger.info("Found sitemap index with nested sitemaps")
+    
+    # Fallback: try without namespace
+    return index_locs + url_locs or plain_locs
+
+
+def _extract_locs_etree(xml_content: Union[str, bytes]) -> list[str]:
+    """
+    Extract raw <loc> values with the standard library parser.
+    
+    Args:
+        xml_content: Sitemap XML content
         
-        # Check if it's a sitemap index
-        sitemap_elements = root.findall('.//sm:sitemap/sm:loc', namespaces)
-        if sitemap_elements:
-            logger.info("Found sitemap index with nested sitemaps")
-            for elem in sitemap_elements:
-                if elem.text:
-                    url = elem.text.strip()
-                    if base_url:
-                        url = urljoin(base_url, url)
-                    urls.append(normalize_url(url))
+    Returns:
+        Unstripped <loc> texts, sitemap index entries first
+    """
+    root = ET.fromstring(xml_content)
+    
+    # One walk over the tree, classifying each <loc> by its entry element
+    index_locs = []
+    url_locs = []
+    plain_locs = []
+    for entry in root.iter():
+        for elem in entry:
+            if not elem.text:
+                continue
+            if elem.tag == 'loc':
+                plain_locs.append(elem.text)
+            elif elem.tag == _SM_LOC and entry.tag == _SM_SITEMAP:
+                index_locs.append(elem.text)
+            elif elem.tag == _SM_LOC and entry.tag == _SM_URL:
+                url_locs.append(elem.text)
+    
+    if index_locs:
+        logger.info("Found sitemap index with nested sitemaps")
+    
+    # Fallback: try without namespace
+    return index_locs + url_locs or plain_locs
+
+
+def parse_sitemap(xml_content: Union[str, bytes], base_url: Optional[str] = None) -> list[str]:
+    """
+    Parse sitemap XML and extract URLs.
+    
+    Uses lxml when installed and the standard library parser otherwise.
+    
+    Args:
+        xml_content: Sitemap XML content
+        base_url: Base URL for resolving relative URLs
         
-        # Extract regular URLs
-        url_elements = root.findall('.//sm:url/sm:loc', namespaces)
-        for elem in url_elements:
-            if elem.text:
-                url = elem.text.strip()
-                if base_url:
-                    url = urljoin(base_url, url)
-                urls.append(normalize_url(url))
+    Returns:
+        List of URLs found in sitemap
+    """
+    try:
+        if lxml_etree is not None:
+            locs = _extract_locs_lxml(xml_content)
+        else:
+            locs = _extract_locs_etree(xml_content)
         
-        # Fallback: try without namespace
-        if not urls:
-            for elem in root.iter('loc'):
-                if elem.text:
-                    url = elem.text.strip()
-                    if base_url:
-                        url = urljoin(base_url, url)
-                    urls.append(normalize_url(url))
+        urls = []
+        for loc in locs:
+            url = loc.strip()
+            if base_url:
+                url = urljoin(base_url, url)
+            urls.append(normalize_url(url))
         
         # Remove duplicates while preserving order
-        seen = set()
-        unique_urls = []
-        for url in urls:
-            if url not in seen:
-                seen.add(url)
-                unique_urls.append(url)
+        unique_urls = list(dict.fromkeys(urls))
         
         logger.info(f"Parsed {len(unique_urls)} unique URLs from sitemap")
         return unique_urls
         
-    except ET.ParseError as e:
+    except _PARSE_ERRORS as e:
         logger.error(f"Failed to parse sitemap XML: {e}")
         return []
     except Exception as e:
@@ -79,6 +167,62 @@ def parse_sitemap(xml_content: str, base_url: Optional[str] = None) -> list[str]
         return []
 
 
+@lru_cache(maxsize=32)
+def _compile_patterns(patterns: tuple[str, ...]) -> re.Pattern:
+    """
+    Fuse filter patterns into one compiled alternation, cached per pattern set.
+    
+    Args:
+        patterns: Regex patterns
+        
+    Returns:
+        Pattern that matches wherever any of the patterns matches
+    """
+    return re.compile("|".join(f"(?:{pattern})" for pattern in patterns))
+
+
+def _hyperscan_search(database, url: str) -> bool:
+    """Return whether any pattern compiled into a hyperscan database matches url."""
+    matched = []
+    database.scan(
+        url.encode('utf-8'),
+        match_event_handler=lambda *_: matched.append(True)
+    )
+    return bool(matched)
+
+
+@lru_cache(maxsize=32)
+def _url_matcher(patterns: tuple[str, ...]) -> Callable[[str], object]:
+    """
+    Build a search function for a set of filter patterns, cached per pattern set.
+    
+    Large pattern sets are compiled into a hyperscan database, which matches
+    all of them in a single DFA pass. Sets that hyperscan cannot compile
+    (lookarounds, backreferences) and small sets use the fused re alternation.
+    
+    Args:
+        patterns: Regex patterns
+        
+    Returns:
+        Callable returning a truthy value when any pattern matches the URL
+    """
+    if hyperscan is not None and len(patterns) >= HYPERSCAN_MIN_PATTERNS:
+        flags = hyperscan.HS_FLAG_SINGLEMATCH | hyperscan.HS_FLAG_UTF8 | hyperscan.HS_FLAG_UCP
+        database = hyperscan.Database()
+        try:
+            database.compile(
+                expressions=[pattern.encode('utf-8') for pattern in patterns],
+                ids=list(range(len(patterns))),
+                elements=len(patterns),
+                flags=[flags] * len(patterns)
+            )
+        except hyperscan.error as e:
+            logger.debug(f"Hyperscan cannot compile URL filters, using re: {e}")
+        else:
+            return partial(_hyperscan_search, database)
+    return _compile_patterns(patterns).search
+
+
 def filter_urls(
     urls: list[str],
     include_patterns: Optional[list[str]] = None,
@@ -95,21 +239,14 @@ def filter_urls(
     Returns:
         Filtered list of URLs
     """
-    import re
-    
-    filtered = urls
-    
-    if include_patterns:
-        filtered = [
-            url for url in filtered
-            if any(re.search(pattern, url) for pattern in include_patterns)
-        ]
+    include = _url_matcher(tuple(include_patterns)) if include_patterns else None
+    exclude = _url_matcher(tuple(exclude_patterns)) if exclude_patterns else None
     
-    if exclude_patterns:
-        filtered = [
-            url for url in filtered
-            if not any(re.search(pattern, url) for pattern in exclude_patterns)
-        ]
+    filtered = [
+        url for url in urls
+        if (include is None or include(url))
+        and (exclude is None or not exclude(url))
+    ]
     
     logger.info(f"Filtered {len(urls)} URLs to {len(filtered)} URLs")
     return filtered
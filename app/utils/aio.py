@@ -1,18 +1,46 @@
 """Async utilities for HTTP requests."""
 import asyncio
 import logging
-from typing import Dict, List, Optional
+import random
+import sys
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional, Union
 from urllib.parse import urlparse
 
 import aiohttp
 from app.utils.logger import get_logger, log_with_context
 
+try:
+    import aiodns
+except ImportError:
+    # Optional accelerator; fall back to aiohttp's threaded resolver
+    aiodns = None
+
 logger = get_logger(__name__)
 
 # Constants
 DEFAULT_PER_HOST_LIMIT = 5  # Default maximum concurrent connections per host
 DEFAULT_RETRY_BACKOFF_BASE = 2  # Base for exponential backoff
 MAX_RETRY_WAIT = 60  # Maximum wait time between retries (seconds)
+MAX_BACKOFF_WAIT = 4  # Maximum jittered wait after a timeout or server error (seconds)
+CONNECT_TIMEOUT = 10  # Maximum time to acquire a connection (seconds)
+DNS_CACHE_TTL = 600  # Seconds resolved host addresses are reused
+KEEPALIVE_TIMEOUT = 75  # Seconds an idle keep-alive connection stays pooled
+
+
+def _make_resolver() -> Optional[aiohttp.abc.AbstractResolver]:
+    """
+    Build a c-ares resolver that resolves on the event loop, when available.
+    
+    Returns:
+        AsyncResolver, or None to use aiohttp's default threaded resolver
+        when aiodns is not installed or on Windows, where aiodns needs a
+        selector event loop
+    """
+    if aiodns is None or sys.platform == 'win32':
+        return None
+    return aiohttp.AsyncResolver()
 
 
 class SessionManager:
@@ -22,7 +50,9 @@ class SessionManager:
         self,
         max_connections: int = 100,
         per_host_limit: int = 10,
-        timeout: int = 30
+        timeout: int = 30,
+        headers: Optional[Dict[str, str]] = None,
+        ttl_dns_cache: int = DNS_CACHE_TTL
     ):
         """
         Initialize session manager.
@@ -31,10 +61,17 @@ class SessionManager:
             max_connections: Total connection limit
             per_host_limit: Connections per host
             timeout: Default timeout in seconds
+            headers: Default headers sent with every request of the session
+            ttl_dns_cache: Seconds resolved host addresses are reused; a crawl
+                hits the same few hosts repeatedly, so a long TTL means one
+                lookup per host for the run, at the cost of not noticing DNS
+                changes within that window
         """
         self.max_connections = max_connections
         self.per_host_limit = per_host_limit
         self.timeout = timeout
+        self.headers = headers
+        self.ttl_dns_cache = ttl_dns_cache
         self._session: Optional[aiohttp.ClientSession] = None
         
     async def get_session(self) -> aiohttp.ClientSession:
@@ -43,12 +80,19 @@ class SessionManager:
             connector = aiohttp.TCPConnector(
                 limit=self.max_connections,
                 limit_per_host=self.per_host_limit,
-                ttl_dns_cache=300
+                resolver=_make_resolver(),
+                use_dns_cache=True,
+                ttl_dns_cache=self.ttl_dns_cache,
+                keepalive_timeout=KEEPALIVE_TIMEOUT
             )
-            timeout = aiohttp.ClientTimeout(total=self.timeout)
+            timeout = client_timeout(self.timeout)
+            # No Accept-Encoding override: aiohttp already advertises gzip and
+            # deflate, adds br when brotli is installed, and only lists
+            # encodings it can decode
             self._session = aiohttp.ClientSession(
                 connector=connector,
-                timeout=timeout
+                timeout=timeout,
+                headers=self.headers
             )
         return self._session
     
@@ -59,6 +103,128 @@ class SessionManager:
             self._session = None
 
 
+class TokenBucket:
+    """Async token-bucket rate limiter."""
+    
+    def __init__(self, rate: float, capacity: float):
+        """
+        Initialize token bucket.
+        
+        Args:
+            rate: Tokens added per second
+            capacity: Maximum tokens held, i.e. the largest burst allowed
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+    
+    def _refill(self) -> None:
+        """Add the tokens accrued since the last update."""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+    
+    async def acquire(self, amount: float = 1) -> None:
+        """
+        Wait until amount tokens are available, then take them.
+        
+        Waiters are served in arrival order. A request larger than the
+        capacity waits for a full bucket and leaves it in debt, so later
+        requests wait for the overdraft to refill.
+        
+        Args:
+            amount: Tokens to take
+        """
+        async with self._lock:
+            needed = min(amount, self.capacity)
+            self._refill()
+            while self._tokens < needed:
+                await asyncio.sleep((needed - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= amount
+
+
+@lru_cache(maxsize=16)
+def client_timeout(total: float) -> aiohttp.ClientTimeout:
+    """
+    Get a shared ClientTimeout, cached per total so requests do not rebuild it.
+    
+    Args:
+        total: Total request timeout in seconds
+        
+    Returns:
+        Timeout with the given total and a CONNECT_TIMEOUT connect limit
+    """
+    return aiohttp.ClientTimeout(total=total, connect=CONNECT_TIMEOUT)
+
+
+def decode_body(raw: bytes, charset: Optional[str]) -> str:
+    """
+    Decode a response body using its declared charset, without detection.
+    
+    Args:
+        raw: Response body
+        charset: Charset from the Content-Type header, if any
+        
+    Returns:
+        Decoded text, with undecodable bytes replaced
+    """
+    try:
+        return raw.decode(charset or 'utf-8', errors='replace')
+    except LookupError:
+        # Unknown charset name in the header
+        return raw.decode('utf-8', errors='replace')
+
+
+def retry_after_delay(headers) -> Optional[float]:
+    """
+    Read the Retry-After header of a response.
+    
+    Args:
+        headers: Response headers
+        
+    Returns:
+        Delay in seconds, or None if the header is absent or an HTTP date
+    """
+    value = headers.get('Retry-After')
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        return None
+
+
+_default_session_manager: Optional[SessionManager] = None
+
+
+def get_default_session_manager() -> SessionManager:
+    """
+    Get the process-wide session manager, created on first use.
+    
+    Sharing one manager keeps the connection pool and keep-alive connections
+    alive across fetch batches. It sets no default headers because sitemap
+    and page fetches share it with their own user agents, which they pass per
+    request. Close it with close_default_session_manager before the event
+    loop shuts down.
+    
+    Returns:
+        Shared SessionManager
+    """
+    global _default_session_manager
+    if _default_session_manager is None:
+        _default_session_manager = SessionManager(per_host_limit=DEFAULT_PER_HOST_LIMIT)
+    return _default_session_manager
+
+
+async def close_default_session_manager() -> None:
+    """Close the shared session manager's session, if one was created."""
+    if _default_session_manager is not None:
+        await _default_session_manager.close()
+
+
 async def fetch_url(
     session: aiohttp.ClientSession,
     url: str,
@@ -68,7 +234,7 @@ async def fetch_url(
     backoff_base: float = DEFAULT_RETRY_BACKOFF_BASE
 ) -> Optional[str]:
     """
-    Fetch URL content with retry logic and exponential backoff.
+    Fetch URL content with retry logic and full-jitter exponential backoff.
     
     Args:
         session: Aiohttp client session
@@ -81,29 +247,37 @@ async def fetch_url(
     Returns:
         Response text or None if failed
     """
-    last_error = None
+    last_error: Optional[Union[Exception, str]] = None
     
     for attempt in range(retry_attempts):
         try:
             async with session.get(
                 url, 
-                timeout=aiohttp.ClientTimeout(total=timeout),
+                timeout=client_timeout(timeout),
                 headers=headers
             ) as response:
                 if response.status == 200:
-                    return await response.text()
+                    return decode_body(await response.read(), response.charset)
                 elif response.status == 429:
-                    # Rate limited - use longer backoff
-                    wait_time = min(backoff_base ** (attempt + 2), MAX_RETRY_WAIT)
+                    last_error = "HTTP 429"
+                    if attempt >= retry_attempts - 1:
+                        # No attempts left; don't wait just to give up
+                        break
+                    # Rate limited - honor Retry-After, else a longer jittered backoff
+                    wait_time = retry_after_delay(response.headers)
+                    if wait_time is None:
+                        wait_time = random.uniform(0, backoff_base ** (attempt + 2))
+                    wait_time = min(wait_time, MAX_RETRY_WAIT)
                     log_with_context(
                         logger, logging.WARNING,
-                        f"Rate limited fetching {url}, waiting {wait_time}s",
+                        f"Rate limited fetching {url}, waiting {wait_time:.1f}s",
                         context={'url': url, 'attempt': attempt + 1, 'status': 429}
                     )
                     await asyncio.sleep(wait_time)
                     continue
                 elif response.status >= 500:
                     # Server error - retry with backoff
+                    last_error = f"HTTP {response.status}"
                     log_with_context(
                         logger, logging.WARNING,
                         f"Server error fetching {url}: HTTP {response.status}",
@@ -146,9 +320,9 @@ async def fetch_url(
             )
             return None
         
-        # Exponential backoff for retries
+        # Full-jitter exponential backoff so concurrent fetches do not retry in lockstep
         if attempt < retry_attempts - 1:
-            wait_time = min(backoff_base ** attempt, MAX_RETRY_WAIT)
+            wait_time = random.uniform(0, min(backoff_base ** attempt, MAX_BACKOFF_WAIT))
             await asyncio.sleep(wait_time)
     
     # All retries failed
@@ -180,37 +354,30 @@ async def fetch_urls_batch(
         timeout: Request timeout in seconds
         retry_attempts: Number of retry attempts
         headers: Optional HTTP headers
-        session: Optional existing session to reuse
+        session: Optional existing session to reuse (defaults to the session
+            of the shared manager from get_default_session_manager)
         
     Returns:
         Dictionary mapping URLs to their content
     """
-    semaphore = asyncio.Semaphore(max_concurrent)
-    results = {}
+    # Reuse the shared pool so connections and DNS entries outlive the batch
+    if session is None:
+        session = await get_default_session_manager().get_session()
     
-    async def fetch_with_semaphore(sess: aiohttp.ClientSession, url: str):
-        async with semaphore:
-            content = await fetch_url(sess, url, timeout, retry_attempts, headers)
-            return url, content
+    results: Dict[str, Optional[str]] = dict.fromkeys(urls)
+    pending = iter(results)
     
-    # Use provided session or create a new one
-    should_close = session is None
-    if session is None:
-        connector = aiohttp.TCPConnector(
-            limit=max_concurrent,
-            limit_per_host=min(max_concurrent, 5)
-        )
-        session = aiohttp.ClientSession(connector=connector, headers=headers)
+    async def worker():
+        # Workers share one iterator, so each URL is taken exactly once and at
+        # most max_concurrent requests are in flight without a semaphore
+        for url in pending:
+            results[url] = await fetch_url(
+                session, url, timeout=timeout, retry_attempts=retry_attempts, headers=headers
+            )
     
-    try:
-        tasks = [fetch_with_semaphore(session, url) for url in urls]
-        responses = await asyncio.gather(*tasks)
-        
-        for url, content in responses:
-            results[url] = content
-    finally:
-        if should_close:
-            await session.close()
+    async with asyncio.TaskGroup() as tg:
+        for _ in range(min(max_concurrent, len(results))):
+            tg.create_task(worker())
     
     return results
 
@@ -239,22 +406,27 @@ async def fetch_urls_concurrent(
     """
     should_close = session_manager is None
     if session_manager is None:
+        # A manager owned by this call sets the headers once on the session
         session_manager = SessionManager(
             max_connections=max_concurrent * 2,
             per_host_limit=min(max_concurrent, DEFAULT_PER_HOST_LIMIT),
-            timeout=timeout
+            timeout=timeout,
+            headers=headers
         )
+        request_headers = None
+    else:
+        # A caller's manager may be shared with other user agents; send per request
+        request_headers = headers
     
     session = await session_manager.get_session()
     
     try:
-        # Pass headers to fetch_urls_batch which will use them per request
         results = await fetch_urls_batch(
             urls,
             max_concurrent,
             timeout,
             retry_attempts,
-            headers=headers,
+            headers=request_headers,
             session=session
         )
         return results
@@ -1,14 +1,23 @@
 """Configuration management for the SEO Gap Analysis Agent."""
+import json
 import os
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 import yaml
 from pydantic import BaseModel, Field, field_validator, ValidationError
 from pydantic_settings import BaseSettings
 
+from app.utils import jsonutil
 from app.utils.logger import get_logger
 
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:
+    # Optional accelerator; PyYAML built without libyaml uses the pure-Python loader
+    from yaml import SafeLoader as YamlLoader
+
 logger = get_logger(__name__)
 
 
@@ -47,6 +56,7 @@ class Settings(BaseSettings):
     request_timeout: int = Field(default=30, gt=0, le=300)
     retry_attempts: int = Field(default=3, ge=1, le=10)
     user_agent: str = "SEO-Gap-Analysis-Agent/1.0"
+    embedding_tokens_per_minute: Optional[int] = Field(default=None, gt=0)
     
     models: ModelsConfig = Field(default_factory=ModelsConfig)
     database: DatabaseConfig = Field(default_factory=DatabaseConfig)
@@ -74,6 +84,10 @@ def load_config(config_path: str = "config/settings.yaml") -> Settings:
     """
     Load configuration from YAML file.
     
+    Parsed settings are cached per (path, modification time), so repeated
+    calls skip the YAML parse and validation until the file changes. Each call
+    returns its own deep copy of the cached Settings.
+    
     Args:
         config_path: Path to configuration file
         
@@ -92,9 +106,17 @@ def load_config(config_path: str = "config/settings.yaml") -> Settings:
         logger.error(error_msg)
         raise FileNotFoundError(error_msg)
     
+    return _load_config_cached(config_path, config_file.stat().st_mtime_ns).model_copy(deep=True)
+
+
+@lru_cache(maxsize=8)
+def _load_config_cached(config_path: str, mtime_ns: int) -> Settings:
+    """Parse and validate a configuration file; mtime_ns only keys the cache."""
+    config_file = Path(config_path)
+    
     try:
         with open(config_file, "r", encoding="utf-8") as f:
-            config_data = yaml.safe_load(f)
+            config_data = yaml.load(f, Loader=YamlLoader)
         
         if not config_data:
             error_msg = "Configuration file is empty"
@@ -121,10 +143,14 @@ def load_config(config_path: str = "config/settings.yaml") -> Settings:
 
 def load_competitors(competitors_path: str = "config/competitors.yaml") -> List[str]:
     """
-    Load competitor sitemaps from YAML file.
+    Load competitor sitemaps from a YAML or JSON file.
+    
+    Files ending in .json are parsed as JSON with the same
+    {"competitors": [...]} layout. Results are cached per (path, modification
+    time) like load_config.
     
     Args:
-        competitors_path: Path to competitors file
+        competitors_path: Path to competitors file (.yaml or .json)
         
     Returns:
         List of competitor sitemap URLs
@@ -141,9 +167,20 @@ def load_competitors(competitors_path: str = "config/competitors.yaml") -> List[
         logger.error(error_msg)
         raise FileNotFoundError(error_msg)
     
+    return list(_load_competitors_cached(competitors_path, competitors_file.stat().st_mtime_ns))
+
+
+@lru_cache(maxsize=8)
+def _load_competitors_cached(competitors_path: str, mtime_ns: int) -> tuple[str, ...]:
+    """Parse and validate a competitors file; mtime_ns only keys the cache."""
+    competitors_file = Path(competitors_path)
+    
     try:
-        with open(competitors_file, "r", encoding="utf-8") as f:
-            data = yaml.safe_load(f)
+        if competitors_file.suffix == ".json":
+            data = jsonutil.loads(competitors_file.read_bytes())
+        else:
+            with open(competitors_file, "r", encoding="utf-8") as f:
+                data = yaml.load(f, Loader=YamlLoader)
         
         if not data:
             error_msg = "Competitors file is empty"
@@ -162,12 +199,16 @@ def load_competitors(competitors_path: str = "config/competitors.yaml") -> List[
         validated = CompetitorListModel(competitors=competitors)
         
         logger.info(f"Successfully loaded {len(validated.competitors)} competitors")
-        return validated.competitors
+        return tuple(validated.competitors)
         
     except yaml.YAMLError as e:
         error_msg = f"Failed to parse YAML competitors file: {e}"
         logger.error(error_msg)
         raise ValueError(f"Invalid YAML in competitors file: {e}") from e
+    except json.JSONDecodeError as e:
+        error_msg = f"Failed to parse JSON competitors file: {e}"
+        logger.error(error_msg)
+        raise ValueError(f"Invalid JSON in competitors file: {e}") from e
     except ValidationError as e:
         logger.error(f"Competitor validation failed: {e}")
         raise
@@ -1,7 +1,8 @@
 """Database utilities and schema management."""
+import asyncio
 import aiosqlite
 from pathlib import Path
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple, Union
 from contextlib import asynccontextmanager
 from pydantic import ValidationError
 from enum import IntEnum
@@ -11,6 +12,32 @@ from app.utils.models import PageModel, GapModel
 
 logger = get_logger(__name__)
 
+# Pragmas applied to every pooled connection: WAL so readers never block each
+# other, and a large page cache plus mmap so hot pages stay in memory between queries
+CONNECTION_PRAGMAS = (
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA cache_size = -65536",
+)
+
+# Page size for newly created databases; larger pages suit the long content rows
+PAGE_SIZE = 8192
+
+# Pragmas for read-only pooled connections; journal_mode cannot be changed on a
+# read-only connection, and query_only guards against accidental writes
+READ_ONLY_PRAGMAS = (
+    "PRAGMA query_only = ON",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA cache_size = -65536",
+)
+
+# Pages per multi-row upsert; 9 bound columns each stays well under SQLite's variable limit
+PAGE_UPSERT_BATCH_SIZE = 500
+
 
 class Priority(IntEnum):
     """Priority levels for gaps."""
@@ -22,54 +49,91 @@ class Priority(IntEnum):
 class DatabasePool:
     """Simple connection pool for aiosqlite."""
     
-    def __init__(self, db_path: str, max_connections: int = 5):
+    def __init__(self, db_path: str, max_connections: int = 5, read_only: bool = False):
         """
         Initialize database pool.
         
         Args:
             db_path: Path to database
             max_connections: Maximum number of connections
+            read_only: Open connections in read-only, query-only mode
         """
         self.db_path = db_path
         self.max_connections = max_connections
+        self.read_only = read_only
         self._connections: List[aiosqlite.Connection] = []
-        self._available: List[aiosqlite.Connection] = []
+        self._available: asyncio.Queue = asyncio.Queue()
+        self._opened = 0
+    
+    async def _open_connection(self) -> aiosqlite.Connection:
+        """Open a new connection and apply the pool's pragmas."""
+        if self.read_only:
+            uri = f"{Path(self.db_path).resolve().as_uri()}?mode=ro"
+            conn = await aiosqlite.connect(uri, uri=True)
+            pragmas = READ_ONLY_PRAGMAS
+        else:
+            conn = await aiosqlite.connect(self.db_path)
+            pragmas = CONNECTION_PRAGMAS
+        try:
+            for pragma in pragmas:
+                await conn.execute(pragma)
+        except Exception:
+            await conn.close()
+            raise
+        return conn
         
     async def get_connection(self) -> aiosqlite.Connection:
         """Get a connection from the pool."""
-        if self._available:
-            return self._available.pop()
-        
-        if len(self._connections) < self.max_connections:
-            conn = await aiosqlite.connect(self.db_path)
-            # Enable foreign key constraints
-            await conn.execute("PRAGMA foreign_keys = ON")
+        if self._available.empty() and self._opened < self.max_connections:
+            # Reserve the slot before awaiting so concurrent callers cannot overshoot
+            self._opened += 1
+            try:
+                conn = await self._open_connection()
+            except Exception:
+                self._opened -= 1
+                raise
             self._connections.append(conn)
             return conn
         
         # Wait for an available connection
-        import asyncio
-        while not self._available:
-            await asyncio.sleep(0.01)
-        return self._available.pop()
+        return await self._available.get()
     
     def release_connection(self, conn: aiosqlite.Connection):
         """Release a connection back to the pool."""
         if conn in self._connections:
-            self._available.append(conn)
+            self._available.put_nowait(conn)
+    
+    @asynccontextmanager
+    async def connection(self):
+        """
+        Check out a pooled connection for the duration of the block.
+        
+        Yields:
+            Database connection
+        """
+        conn = await self.get_connection()
+        try:
+            yield conn
+        finally:
+            self.release_connection(conn)
     
     async def close_all(self):
         """Close all connections."""
         for conn in self._connections:
             await conn.close()
         self._connections.clear()
-        self._available.clear()
+        self._available = asyncio.Queue()
+        self._opened = 0
 
 
 @asynccontextmanager
 async def get_db_connection(db_path: str):
     """
-    Context manager for database connections with foreign keys enabled.
+    Context manager for a write connection tuned for bulk inserts.
+    
+    Applies CONNECTION_PRAGMAS (foreign keys, WAL, synchronous=NORMAL), so a
+    caller holding the connection across many batch writes pays one WAL
+    append per commit instead of a full fsync per row.
     
     Args:
         db_path: Path to database
@@ -79,13 +143,103 @@ async def get_db_connection(db_path: str):
     """
     conn = await aiosqlite.connect(db_path)
     try:
-        # Enable foreign key constraints
-        await conn.execute("PRAGMA foreign_keys = ON")
+        for pragma in CONNECTION_PRAGMAS:
+            await conn.execute(pragma)
         yield conn
     finally:
         await conn.close()
 
 
+# Long-lived write connections keyed by database path, so the page cache and
+# mmap stay warm across calls instead of being rebuilt on every open
+_shared_connections: Dict[str, aiosqlite.Connection] = {}
+_shared_connection_lock: Optional[asyncio.Lock] = None
+
+
+async def get_shared_connection(db_path: str) -> aiosqlite.Connection:
+    """
+    Get the process-wide connection for a database, opened on first use.
+    
+    The connection has CONNECTION_PRAGMAS applied. Callers must not close it;
+    close_shared_connections closes every shared connection at shutdown.
+    
+    Args:
+        db_path: Path to database
+        
+    Returns:
+        Shared database connection
+    """
+    conn = _shared_connections.get(db_path)
+    if conn is not None:
+        return conn
+    
+    global _shared_connection_lock
+    if _shared_connection_lock is None:
+        _shared_connection_lock = asyncio.Lock()
+    
+    async with _shared_connection_lock:
+        # Another caller may have opened it while we waited
+        conn = _shared_connections.get(db_path)
+        if conn is None:
+            conn = await aiosqlite.connect(db_path)
+            try:
+                for pragma in CONNECTION_PRAGMAS:
+                    await conn.execute(pragma)
+            except Exception:
+                await conn.close()
+                raise
+            _shared_connections[db_path] = conn
+    return conn
+
+
+async def close_shared_connections() -> None:
+    """Close every shared connection opened by get_shared_connection."""
+    global _shared_connection_lock
+    connections = list(_shared_connections.values())
+    _shared_connections.clear()
+    _shared_connection_lock = None
+    for conn in connections:
+        await conn.close()
+
+
+@asynccontextmanager
+async def connection_or_open(db_path: str, db: Optional[aiosqlite.Connection] = None):
+    """
+    Use the caller's connection if given, otherwise the shared one for db_path.
+    
+    Args:
+        db_path: Path to database
+        db: Open connection to reuse
+        
+    Yields:
+        Database connection, left open afterwards
+    """
+    yield db if db is not None else await get_shared_connection(db_path)
+
+
+@asynccontextmanager
+async def write_transaction(db: aiosqlite.Connection):
+    """
+    Commit the writes made in the block, or roll them back if it raises.
+    
+    Writers on the long-lived shared connection must not leave a failed
+    transaction open, or the next unrelated commit on that connection would
+    persist its partial writes.
+    
+    Args:
+        db: Open connection
+        
+    Yields:
+        The same connection
+    """
+    try:
+        yield db
+    except BaseException:
+        await db.rollback()
+        raise
+    await db.commit()
+
+
 async def init_database(db_path: str) -> None:
     """
     Initialize database schema.
@@ -97,8 +251,13 @@ async def init_database(db_path: str) -> None:
     Path(db_path).parent.mkdir(parents=True, exist_ok=True)
     
     async with aiosqlite.connect(db_path) as db:
-        # Enable foreign key constraints
-        await db.execute("PRAGMA foreign_keys = ON")
+        # page_size only takes effect before the first table is created (and
+        # before WAL is enabled); existing databases keep theirs until a VACUUM
+        # outside WAL mode. WAL itself is persistent, so enabling it here covers
+        # connections opened without CONNECTION_PRAGMAS too
+        await db.execute(f"PRAGMA page_size = {PAGE_SIZE}")
+        for pragma in CONNECTION_PRAGMAS:
+            await db.execute(pragma)
         # Pages table
         await db.execute("""
             CREATE TABLE IF NOT EXISTS pages (
@@ -136,6 +295,9 @@ async def init_database(db_path: str) -> None:
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 chunk_id INTEGER NOT NULL,
                 embedding BLOB NOT NULL,
+                scale REAL,
+                row_index INTEGER,
+                dim INTEGER,
                 model TEXT NOT NULL,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 FOREIGN KEY (chunk_id) REFERENCES chunks(id) ON DELETE CASCADE,
@@ -143,6 +305,17 @@ async def init_database(db_path: str) -> None:
             )
         """)
         
+        # Embeddings stored before int8 quantization are float32 with no scale;
+        # rows with a row_index keep their vector in the flat vector file and
+        # leave the inline blob empty
+        cursor = await db.execute("PRAGMA table_info(embeddings)")
+        embedding_columns = {row[1] for row in await cursor.fetchall()}
+        if 'scale' not in embedding_columns:
+            await db.execute("ALTER TABLE embeddings ADD COLUMN scale REAL")
+        if 'row_index' not in embedding_columns:
+            await db.execute("ALTER TABLE embeddings ADD COLUMN row_index INTEGER")
+            await db.execute("ALTER TABLE embeddings ADD COLUMN dim INTEGER")
+        
         # Gaps table
         await db.execute("""
             CREATE TABLE IF NOT EXISTS gaps (
@@ -157,12 +330,53 @@ async def init_database(db_path: str) -> None:
             )
         """)
         
+        # LLM response cache, keyed by a hash of the model and prompt inputs
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                cache_key BLOB PRIMARY KEY,
+                kind TEXT NOT NULL,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                embedding BLOB,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        # Caches created before the semantic tier have no embedding column
+        cursor = await db.execute("PRAGMA table_info(llm_cache)")
+        if 'embedding' not in {row[1] for row in await cursor.fetchall()}:
+            await db.execute("ALTER TABLE llm_cache ADD COLUMN embedding BLOB")
+        
         # Create indexes
         await db.execute("CREATE INDEX IF NOT EXISTS idx_pages_domain ON pages(domain)")
         await db.execute("CREATE INDEX IF NOT EXISTS idx_pages_is_primary ON pages(is_primary)")
         await db.execute("CREATE INDEX IF NOT EXISTS idx_chunks_page_id ON chunks(page_id)")
         await db.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_chunk_id ON embeddings(chunk_id)")
-        await db.execute("CREATE INDEX IF NOT EXISTS idx_gaps_type ON gaps(gap_type)")
+        # Covering index for the missing-pages filter + sort; supersedes idx_gaps_type
+        await db.execute("DROP INDEX IF EXISTS idx_gaps_type")
+        await db.execute("""
+            CREATE INDEX IF NOT EXISTS idx_gaps_type_score
+            ON gaps(gap_type, similarity_score, competitor_url, closest_match_url)
+        """)
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_gaps_closest_match ON gaps(closest_match_url, gap_type)")
+        # Partial indexes covering the primary pages the metadata/schema detectors look for
+        await db.execute("""
+            CREATE INDEX IF NOT EXISTS idx_pages_primary_meta
+            ON pages(url, title, description, h1)
+            WHERE is_primary = 1 AND (title IS NULL OR description IS NULL OR h1 IS NULL)
+        """)
+        await db.execute("""
+            CREATE INDEX IF NOT EXISTS idx_pages_primary_no_schema
+            ON pages(url)
+            WHERE is_primary = 1 AND (schema_data IS NULL OR schema_data = '')
+        """)
+        await db.execute("""
+            CREATE INDEX IF NOT EXISTS idx_pages_competitor_schema
+            ON pages(url)
+            WHERE is_primary = 0 AND schema_data IS NOT NULL AND schema_data != ''
+        """)
+        # Partial indexes on competitor pages for the thin-content title/h1 joins
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_pages_title ON pages(title) WHERE is_primary = 0")
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_pages_h1 ON pages(h1) WHERE is_primary = 0")
         
         await db.commit()
         logger.info(f"Database initialized at {db_path}")
@@ -183,6 +397,9 @@ async def store_page(
     """
     Store page data in database.
     
+    Thin wrapper around store_pages_batch; prefer the batch form when storing
+    many pages so they share one transaction.
+    
     Args:
         db_path: Path to database
         url: Page URL
@@ -201,49 +418,18 @@ async def store_page(
     Raises:
         ValidationError: If page data is invalid
     """
-    # Validate page data before storing
-    try:
-        page_model = PageModel(
-            url=url,
-            domain=domain,
-            is_primary=is_primary,
-            title=title,
-            description=description,
-            h1=h1,
-            content_text=content_text,
-            word_count=word_count,
-            schema_data=schema_data
-        )
-    except ValidationError as e:
-        logger.error(f"Page validation failed for {url}: {e}")
-        raise
-    
-    async with aiosqlite.connect(db_path) as db:
-        # Enable foreign key constraints
-        await db.execute("PRAGMA foreign_keys = ON")
-        # First, try to get existing page ID
-        cursor = await db.execute("SELECT id FROM pages WHERE url = ?", (url,))
-        row = await cursor.fetchone()
-        
-        if row:
-            # Update existing page
-            page_id = row[0]
-            await db.execute("""
-                UPDATE pages SET
-                    title=?, description=?, h1=?, content_text=?,
-                    word_count=?, schema_data=?, last_crawled=CURRENT_TIMESTAMP
-                WHERE id = ?
-            """, (title, description, h1, content_text, word_count, schema_data, page_id))
-        else:
-            # Insert new page
-            cursor = await db.execute("""
-                INSERT INTO pages (url, domain, is_primary, title, description, h1, content_text, word_count, schema_data)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (url, domain, is_primary, title, description, h1, content_text, word_count, schema_data))
-            page_id = cursor.lastrowid
-        
-        await db.commit()
-        return page_id
+    page_ids = await store_pages_batch(db_path, [{
+        'url': url,
+        'domain': domain,
+        'is_primary': is_primary,
+        'title': title,
+        'description': description,
+        'h1': h1,
+        'content_text': content_text,
+        'word_count': word_count,
+        'schema_data': schema_data
+    }])
+    return page_ids[0]
 
 
 async def get_page_id(db_path: str, url: str) -> Optional[int]:
@@ -257,12 +443,80 @@ async def get_page_id(db_path: str, url: str) -> Optional[int]:
     Returns:
         Page ID or None
     """
-    async with aiosqlite.connect(db_path) as db:
-        # Enable foreign key constraints
-        await db.execute("PRAGMA foreign_keys = ON")
-        cursor = await db.execute("SELECT id FROM pages WHERE url = ?", (url,))
-        row = await cursor.fetchone()
-        return row[0] if row else None
+    db = await get_shared_connection(db_path)
+    cursor = await db.execute("SELECT id FROM pages WHERE url = ?", (url,))
+    row = await cursor.fetchone()
+    return row[0] if row else None
+
+
+async def get_cached_llm_response(db_path: str, cache_key: bytes) -> Optional[str]:
+    """
+    Look up a cached LLM response.
+    
+    Args:
+        db_path: Path to database
+        cache_key: Hash of the request inputs
+        
+    Returns:
+        Cached response text or None
+    """
+    db = await get_shared_connection(db_path)
+    cursor = await db.execute(
+        "SELECT response FROM llm_cache WHERE cache_key = ?", (cache_key,)
+    )
+    row = await cursor.fetchone()
+    return row[0] if row else None
+
+
+async def store_cached_llm_response(
+    db_path: str,
+    cache_key: bytes,
+    kind: str,
+    model: str,
+    response: str,
+    embedding: Optional[Union[bytes, memoryview]] = None
+) -> None:
+    """
+    Store an LLM response in the cache.
+    
+    Args:
+        db_path: Path to database
+        cache_key: Hash of the request inputs
+        kind: Request type (e.g. 'compare', 'outline', 'rewrite')
+        model: Model that produced the response
+        response: Response text
+        embedding: Optional float32 embedding of the inputs for similarity lookups,
+            as bytes or a buffer sqlite3 can bind without copying
+    """
+    db = await get_shared_connection(db_path)
+    async with write_transaction(db):
+        await db.execute("""
+            INSERT OR REPLACE INTO llm_cache (cache_key, kind, model, response, embedding)
+            VALUES (?, ?, ?, ?, ?)
+        """, (cache_key, kind, model, response, embedding))
+
+
+async def get_llm_cache_embeddings(
+    db_path: str,
+    kind: str,
+    model: str
+) -> List[Tuple[bytes, str]]:
+    """
+    Get cached LLM responses that have input embeddings.
+    
+    Args:
+        db_path: Path to database
+        kind: Request type
+        model: Model that produced the responses
+        
+    Returns:
+        List of (embedding blob, response text) tuples
+    """
+    db = await get_shared_connection(db_path)
+    return list(await db.execute_fetchall("""
+        SELECT embedding, response FROM llm_cache
+        WHERE kind = ? AND model = ? AND embedding IS NOT NULL
+    """, (kind, model)))
 
 
 async def store_pages_batch(
@@ -283,47 +537,27 @@ async def store_pages_batch(
         ValidationError: If any page data is invalid
     """
     # Validate all pages first
-    validated_pages = []
     for page in pages:
         try:
-            page_model = PageModel(**page)
-            validated_pages.append(page)
+            PageModel(**page)
         except ValidationError as e:
             logger.error(f"Page validation failed for {page.get('url')}: {e}")
             raise
     
-    page_ids = []
-    async with aiosqlite.connect(db_path) as db:
-        # Enable foreign key constraints
-        await db.execute("PRAGMA foreign_keys = ON")
-        for page in validated_pages:
-            # Check if page exists
-            cursor = await db.execute("SELECT id FROM pages WHERE url = ?", (page['url'],))
-            row = await cursor.fetchone()
-            
-            if row:
-                # Update existing page
-                page_id = row[0]
-                await db.execute("""
-                    UPDATE pages SET
-                        title=?, description=?, h1=?, content_text=?,
-                        word_count=?, schema_data=?, last_crawled=CURRENT_TIMESTAMP
-                    WHERE id = ?
-                """, (
-                    page.get('title'),
-                    page.get('description'),
-                    page.get('h1'),
-                    page.get('content_text'),
-                    page.get('word_count'),
-                    page.get('schema_data'),
-                    page_id
-                ))
-            else:
-                # Insert new page
-                cursor = await db.execute("""
-                    INSERT INTO pages (url, domain, is_primary, title, description, h1, content_text, word_count, schema_data)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
+    if not pages:
+        return []
+    
+    db = await get_shared_connection(db_path)
+    async with write_transaction(db):
+        # Multi-row upserts return the ids directly; existing pages keep their id,
+        # domain and is_primary. RETURNING row order is unspecified, so map by url
+        id_map: Dict[str, int] = {}
+        for start in range(0, len(pages), PAGE_UPSERT_BATCH_SIZE):
+            batch = pages[start:start + PAGE_UPSERT_BATCH_SIZE]
+            params = [
+                value
+                for page in batch
+                for value in (
                     page['url'],
                     page['domain'],
                     page['is_primary'],
@@ -333,13 +567,26 @@ async def store_pages_batch(
                     page.get('content_text'),
                     page.get('word_count'),
                     page.get('schema_data')
-                ))
-                page_id = cursor.lastrowid
-            
-            page_ids.append(page_id)
-        
-        await db.commit()
-        logger.info(f"Stored {len(page_ids)} pages in batch")
+                )
+            ]
+            rows = await db.execute_fetchall(f"""
+                INSERT INTO pages (url, domain, is_primary, title, description, h1, content_text, word_count, schema_data)
+                VALUES {', '.join(['(?, ?, ?, ?, ?, ?, ?, ?, ?)'] * len(batch))}
+                ON CONFLICT(url) DO UPDATE SET
+                    title=excluded.title,
+                    description=excluded.description,
+                    h1=excluded.h1,
+                    content_text=excluded.content_text,
+                    word_count=excluded.word_count,
+                    schema_data=excluded.schema_data,
+                    last_crawled=CURRENT_TIMESTAMP
+                RETURNING url, id
+            """, params)
+            for url, page_id in rows:
+                id_map[url] = page_id
+    
+    page_ids = [id_map[page['url']] for page in pages]
+    logger.info(f"Stored {len(page_ids)} pages in batch")
     
     return page_ids
 
@@ -376,9 +623,8 @@ async def store_gaps_batch(
         }
         return priority_map.get(priority_str, Priority.LOW)
     
-    async with aiosqlite.connect(db_path) as db:
-        # Enable foreign key constraints
-        await db.execute("PRAGMA foreign_keys = ON")
+    db = await get_shared_connection(db_path)
+    async with write_transaction(db):
         await db.executemany("""
             INSERT INTO gaps (competitor_url, gap_type, similarity_score, closest_match_url, analysis, priority)
             VALUES (?, ?, ?, ?, ?, ?)
@@ -393,5 +639,17 @@ async def store_gaps_batch(
             )
             for gap in gaps
         ])
-        await db.commit()
-        logger.info(f"Stored {len(gaps)} gaps in batch")
+    logger.info(f"Stored {len(gaps)} gaps in batch")
+
+
+async def optimize_database(db_path: str) -> None:
+    """
+    Refresh planner statistics after a bulk load.
+    
+    Args:
+        db_path: Path to database
+    """
+    db = await get_shared_connection(db_path)
+    await db.execute("ANALYZE")
+    await db.commit()
+    logger.info("Database statistics refreshed")
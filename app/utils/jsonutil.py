@@ -0,0 +1,54 @@
+"""Fast JSON helpers using orjson when available."""
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:
+    # Optional accelerator; fall back to the standard library
+    orjson = None
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """
+    Parse JSON text.
+    
+    Args:
+        data: JSON document as str or bytes
+        
+    Returns:
+        Parsed Python object
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj: Any) -> str:
+    """
+    Serialize an object to compact JSON text.
+    
+    Args:
+        obj: Object to serialize
+        
+    Returns:
+        JSON document as str
+    """
+    if orjson is not None:
+        return orjson.dumps(obj).decode('utf-8')
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+
+
+def dumps_pretty(obj: Any) -> bytes:
+    """
+    Serialize an object to indented UTF-8 JSON for files meant to be read.
+    
+    Args:
+        obj: Object to serialize
+        
+    Returns:
+        JSON document as bytes, indented by two spaces
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, indent=2, ensure_ascii=False).encode('utf-8')
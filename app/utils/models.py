@@ -63,6 +63,27 @@ class EmbeddingModel(BaseModel):
         return v
 
 
+class SummaryModel(BaseModel):
+    """Model for a page summary and its main topics returned by the LLM."""
+    summary: str = Field(min_length=1)
+    topics: List[str] = Field(default_factory=list)
+    
+    @field_validator('summary')
+    @classmethod
+    def validate_summary(cls, v: str) -> str:
+        """Strip surrounding whitespace and reject blank summaries."""
+        v = v.strip()
+        if not v:
+            raise ValueError('Summary cannot be empty')
+        return v
+    
+    @field_validator('topics')
+    @classmethod
+    def validate_topics(cls, v: List[str]) -> List[str]:
+        """Strip topics and drop blank entries."""
+        return [topic.strip() for topic in v if topic and topic.strip()]
+
+
 class GapModel(BaseModel):
     """Model for gap data validation."""
     competitor_url: str
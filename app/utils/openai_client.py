@@ -0,0 +1,186 @@
+"""Shared OpenAI client management."""
+import asyncio
+import logging
+from functools import lru_cache
+from typing import Any, Dict, Mapping, Optional
+
+import aiohttp
+from openai import APIConnectionError, APIError, AsyncOpenAI, RateLimitError
+from tenacity import (
+    AsyncRetrying,
+    RetryCallState,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_random_exponential,
+)
+
+from app.utils import jsonutil
+from app.utils.aio import client_timeout
+
+# Upper bound on a single backoff wait (seconds)
+MAX_RETRY_WAIT = 60
+
+# Chat completions endpoint for requests sent without the SDK
+OPENAI_CHAT_URL = "https://api.openai.com/v1/chat/completions"
+
+_random_exponential = wait_random_exponential(multiplier=1, max=MAX_RETRY_WAIT)
+
+
+@lru_cache(maxsize=8)
+def get_openai_client(api_key: str, timeout: float = 60, max_retries: int = 0) -> AsyncOpenAI:
+    """
+    Get a shared async OpenAI client.
+    
+    Clients are cached per (api_key, timeout, max_retries) so repeated calls
+    reuse the same HTTP connection pool and keep-alive TLS connections. SDK
+    retries are off by default because callers retry through llm_retrying;
+    leaving both on multiplies the attempts made under rate limiting.
+    
+    Args:
+        api_key: OpenAI API key
+        timeout: Request timeout in seconds
+        max_retries: Retries performed inside the SDK itself
+        
+    Returns:
+        Cached AsyncOpenAI client
+    """
+    return AsyncOpenAI(api_key=api_key, timeout=timeout, max_retries=max_retries)
+
+
+class DirectAPIError(Exception):
+    """Error status returned to a direct (SDK-less) OpenAI request."""
+    
+    def __init__(self, status: int, message: str, headers: Optional[Mapping[str, str]] = None):
+        """
+        Initialize error.
+        
+        Args:
+            status: HTTP status code
+            message: Error message from the response body
+            headers: Response headers
+        """
+        super().__init__(f"HTTP {status}: {message}")
+        self.status = status
+        self.headers = headers or {}
+
+
+class DirectRateLimitError(DirectAPIError):
+    """HTTP 429 from a direct OpenAI request."""
+
+
+class DirectServerError(DirectAPIError):
+    """HTTP 5xx from a direct OpenAI request."""
+
+
+# Errors worth retrying; anything else fails the request immediately
+RETRYABLE_ERRORS = (
+    RateLimitError,
+    APIError,
+    APIConnectionError,
+    asyncio.TimeoutError,
+    DirectRateLimitError,
+    DirectServerError,
+    aiohttp.ClientError
+)
+
+
+async def post_chat_completion(
+    session: aiohttp.ClientSession,
+    api_key: str,
+    payload: Dict[str, Any],
+    timeout: float = 60
+) -> str:
+    """
+    Send a chat completion request straight to the REST endpoint.
+    
+    Uses the caller's aiohttp session and connection pool instead of the SDK's
+    HTTP client, which serializes poorly at high concurrency.
+    
+    Args:
+        session: Aiohttp client session
+        api_key: OpenAI API key
+        payload: Request body for /v1/chat/completions
+        timeout: Request timeout in seconds
+        
+    Returns:
+        Content of the first choice
+        
+    Raises:
+        DirectRateLimitError: On HTTP 429
+        DirectServerError: On HTTP 5xx
+        DirectAPIError: On any other error status
+    """
+    async with session.post(
+        OPENAI_CHAT_URL,
+        json=payload,
+        headers={"Authorization": f"Bearer {api_key}"},
+        timeout=client_timeout(timeout)
+    ) as response:
+        if response.status >= 400:
+            message = await response.text()
+            if response.status == 429:
+                raise DirectRateLimitError(response.status, message, response.headers)
+            if response.status >= 500:
+                raise DirectServerError(response.status, message, response.headers)
+            raise DirectAPIError(response.status, message, response.headers)
+        data = await response.json(loads=jsonutil.loads)
+    return data["choices"][0]["message"]["content"]
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """
+    Read the server-requested retry delay from an API error.
+    
+    Args:
+        error: Exception raised by the OpenAI client or post_chat_completion
+        
+    Returns:
+        Delay in seconds from the retry-after-ms or Retry-After header, or None
+    """
+    # SDK errors carry the response; direct request errors carry its headers
+    response = getattr(error, 'response', None)
+    headers = response.headers if response is not None else getattr(error, 'headers', None)
+    if headers is None:
+        return None
+    
+    try:
+        if 'retry-after-ms' in headers:
+            return float(headers['retry-after-ms']) / 1000
+        if 'retry-after' in headers:
+            return float(headers['retry-after'])
+    except ValueError:
+        # Retry-After may also be an HTTP date; fall back to backoff
+        return None
+    return None
+
+
+def _wait_retry_after_or_jitter(retry_state: RetryCallState) -> float:
+    """Wait as long as the server asks, else use full-jitter exponential backoff."""
+    error = retry_state.outcome.exception() if retry_state.outcome else None
+    delay = retry_after_seconds(error) if error is not None else None
+    if delay is not None:
+        return min(max(delay, 0.0), MAX_RETRY_WAIT)
+    return _random_exponential(retry_state)
+
+
+def llm_retrying(max_retries: int, logger: logging.Logger) -> AsyncRetrying:
+    """
+    Build the retry policy for OpenAI requests.
+    
+    Args:
+        max_retries: Maximum attempts, including the first
+        logger: Logger for retry warnings
+        
+    Returns:
+        AsyncRetrying that re-raises the last error once attempts run out
+    """
+    return AsyncRetrying(
+        retry=retry_if_exception_type(RETRYABLE_ERRORS),
+        wait=_wait_retry_after_or_jitter,
+        stop=stop_after_attempt(max(max_retries, 1)),
+        before_sleep=lambda retry_state: logger.warning(
+            f"OpenAI request failed: {retry_state.outcome.exception()!r}, retrying in "
+            f"{retry_state.next_action.sleep:.1f}s (attempt {retry_state.attempt_number}/{max_retries})"
+        ),
+        reraise=True
+    )
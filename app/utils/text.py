@@ -2,6 +2,13 @@
 import re
 from typing import Optional
 
+WHITESPACE_RE = re.compile(r'\s+')
+HTML_REMNANT_RE = re.compile(r'&[a-zA-Z]+;|&#\d+;|<[^>]+>')
+
+# HTML remnants and whitespace in one alternation, so runs of either collapse
+# to a single space in one scan
+HTML_REMNANT_OR_SPACE_RE = re.compile(r'(?:\s|&[a-zA-Z]+;|&#\d+;|<[^>]+>)+')
+
 
 def normalize_whitespace(text: str) -> str:
     """
@@ -14,7 +21,7 @@ def normalize_whitespace(text: str) -> str:
         Text with normalized whitespace
     """
     # Replace multiple whitespace with single space
-    text = re.sub(r'\s+', ' ', text)
+    text = WHITESPACE_RE.sub(' ', text)
     # Remove leading/trailing whitespace
     text = text.strip()
     return text
@@ -30,14 +37,23 @@ def clean_html_remnants(text: str) -> str:
     Returns:
         Cleaned text
     """
-    # Remove HTML entities
-    text = re.sub(r'&[a-zA-Z]+;', ' ', text)
-    text = re.sub(r'&#\d+;', ' ', text)
+    # Remove HTML entities and any remaining HTML tags
+    return HTML_REMNANT_RE.sub(' ', text)
+
+
+def clean_html_and_whitespace(text: str) -> str:
+    """
+    Remove HTML remnants and normalize whitespace in a single pass.
     
-    # Remove any remaining HTML tags
-    text = re.sub(r'<[^>]+>', ' ', text)
+    Equivalent to normalize_whitespace(clean_html_remnants(text)).
     
-    return text
+    Args:
+        text: Input text
+        
+    Returns:
+        Cleaned text with normalized whitespace
+    """
+    return HTML_REMNANT_OR_SPACE_RE.sub(' ', text).strip()
 
 
 def truncate_text(text: str, max_length: int = 1000, suffix: str = "...") -> str:
@@ -0,0 +1,82 @@
+"""Shared tiktoken encodings and token-bounded truncation."""
+import hashlib
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Tuple
+
+import tiktoken
+
+DEFAULT_ENCODING = "cl100k_base"
+
+# Upper bound on characters per token used to pre-slice long text before
+# encoding, so megabyte inputs are not tokenized just to keep a short prefix
+MAX_CHARS_PER_TOKEN = 16
+
+# Truncated texts kept in memory; a primary page is compared against many
+# competitor pages, so its excerpt is reused across calls
+TRUNCATE_CACHE_SIZE = 128
+
+# Excerpts keyed by (text digest, max_tokens, model), least recent first; keying
+# on a digest keeps only the bounded excerpts alive, not the full page texts
+_truncate_cache: "OrderedDict[Tuple[bytes, int, str], str]" = OrderedDict()
+
+
+@lru_cache(maxsize=8)
+def get_encoding(model: str) -> tiktoken.Encoding:
+    """
+    Get the tiktoken encoding for a model, cached per model name.
+    
+    Args:
+        model: Model name
+        
+    Returns:
+        Encoding for the model, or cl100k_base if the model is unknown
+    """
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding(DEFAULT_ENCODING)
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str = "gpt-4o-mini") -> str:
+    """
+    Truncate text to at most max_tokens tokens, memoized per (text, max_tokens, model).
+    
+    Args:
+        text: Input text
+        max_tokens: Maximum number of tokens to keep
+        model: Model whose tokenizer defines the limit
+        
+    Returns:
+        Text prefix of at most max_tokens tokens
+    """
+    if not text:
+        return text
+    
+    key = (hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest(), max_tokens, model)
+    excerpt = _truncate_cache.get(key)
+    if excerpt is not None:
+        _truncate_cache.move_to_end(key)
+        return excerpt
+    
+    excerpt = _truncate(text, max_tokens, model)
+    _truncate_cache[key] = excerpt
+    if len(_truncate_cache) > TRUNCATE_CACHE_SIZE:
+        _truncate_cache.popitem(last=False)
+    return excerpt
+
+
+def _truncate(text: str, max_tokens: int, model: str) -> str:
+    """Truncate text to at most max_tokens tokens without caching."""
+    encoding = get_encoding(model)
+    
+    # Encode only a bounded prefix; fall back to the full text when the prefix
+    # does not already hold more than max_tokens tokens
+    prefix = text[:max_tokens * MAX_CHARS_PER_TOKEN]
+    tokens = encoding.encode(prefix, disallowed_special=())
+    if len(prefix) < len(text) and len(tokens) <= max_tokens:
+        tokens = encoding.encode(text, disallowed_special=())
+    
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
@@ -2,26 +2,40 @@
 import asyncio
 import logging
 import sys
+from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
+import numpy as np
+
 from app.utils.config import load_config, load_competitors
 from app.utils.logger import setup_logger, log_with_context
-from app.utils.database import init_database, store_page, get_page_id, store_gaps_batch
+from app.utils.database import (
+    init_database,
+    store_page,
+    store_pages_batch,
+    PAGE_UPSERT_BATCH_SIZE,
+    get_page_id,
+    store_gaps_batch,
+    optimize_database,
+    get_db_connection,
+    close_shared_connections
+)
 from app.utils.text import extract_domain, count_tokens
+from app.utils.aio import close_default_session_manager
 
 from app.sitemap.fetcher import fetch_sitemaps
 from app.sitemap.parser import parse_sitemap
 
 from app.crawler.fetcher import fetch_pages
-from app.crawler.extractor import extract_page_data
+from app.crawler.extractor import extract_page_data_async, shutdown_extraction_executor
 
 from app.processing.cleaner import clean_text, validate_content
 from app.processing.chunker import chunk_text
 from app.processing.metadata import extract_metadata_signals
 
 from app.embeddings.generator import generate_embeddings_batch
-from app.embeddings.vectorstore import store_embeddings_batch, get_all_embeddings, store_chunk
+from app.embeddings.vectorstore import store_embeddings_batch, get_all_embeddings, store_chunks_batch
 from app.embeddings.comparer import find_content_gaps
 
 from app.analysis.gap_detector import get_all_gaps
@@ -33,8 +47,8 @@ from app.analysis.recommender import (
     generate_quick_wins
 )
 
-from app.reporting.json_report import generate_json_report
-from app.reporting.markdown_report import generate_markdown_report
+from app.reporting.json_report import generate_json_report_async
+from app.reporting.markdown_report import generate_markdown_report_async
 
 
 logger = None
@@ -99,14 +113,20 @@ async def crawl_and_extract(
     )
     
     page_ids = []
+    pending: List[Dict[str, Any]] = []
     
-    for url, html in pages_html.items():
-        if not html:
-            continue
-        
+    # Extract content in worker processes so parsing runs on all cores
+    fetched = [(url, html) for url, html in pages_html.items() if html]
+    extracted = await asyncio.gather(
+        *(extract_page_data_async(html) for _, html in fetched),
+        return_exceptions=True
+    )
+    
+    for (url, _), page_data in zip(fetched, extracted):
         try:
-            # Extract content
-            page_data = extract_page_data(html)
+            if isinstance(page_data, Exception):
+                raise page_data
+            
             metadata = page_data['metadata']
             content = page_data['content']
             
@@ -118,28 +138,36 @@ async def crawl_and_extract(
                 logger.warning(f"Skipping {url}: content too short")
                 continue
             
-            # Store page
-            domain = extract_domain(url)
-            page_id = await store_page(
-                db_path,
-                url=url,
-                domain=domain,
-                is_primary=is_primary,
-                title=metadata.get('title'),
-                description=metadata.get('description'),
-                h1=metadata.get('h1'),
-                content_text=cleaned_content,
-                word_count=page_data['word_count'],
-                schema_data=page_data.get('schema')
-            )
-            
-            page_ids.append(page_id)
-            logger.info(f"Stored page: {url}")
+            # Buffer the page; pages are written in batched transactions below
+            pending.append({
+                'url': url,
+                'domain': extract_domain(url),
+                'is_primary': is_primary,
+                'title': metadata.get('title'),
+                'description': metadata.get('description'),
+                'h1': metadata.get('h1'),
+                'content_text': cleaned_content,
+                'word_count': page_data['word_count'],
+                'schema_data': page_data.get('schema')
+            })
             
         except Exception as e:
             logger.error(f"Error processing {url}: {e}")
             continue
     
+    for start in range(0, len(pending), PAGE_UPSERT_BATCH_SIZE):
+        batch = pending[start:start + PAGE_UPSERT_BATCH_SIZE]
+        try:
+            page_ids.extend(await store_pages_batch(db_path, batch))
+        except Exception as e:
+            # One bad page fails the whole batch; store the rest individually
+            logger.error(f"Batch page store failed, retrying pages individually: {e}")
+            for page in batch:
+                try:
+                    page_ids.append(await store_page(db_path, **page))
+                except Exception as e:
+                    logger.error(f"Error storing {page['url']}: {e}")
+    
     logger.info(f"Successfully crawled and stored {len(page_ids)} pages")
     return page_ids
 
@@ -156,13 +184,12 @@ async def process_and_embed(
         context={'page_count': len(page_ids)}
     )
     
-    import aiosqlite
-    
     all_chunk_ids = []
     all_chunks_text = []
     
     try:
-        async with aiosqlite.connect(db_path) as db:
+        async with get_db_connection(db_path) as db:
+            chunks_data = []
             for page_id in page_ids:
                 # Get page content
                 cursor = await db.execute(
@@ -183,18 +210,17 @@ async def process_and_embed(
                     overlap=200
                 )
                 
-                # Store chunks
                 for i, chunk in enumerate(chunks[:config.max_chunks_per_page]):
-                    token_count = count_tokens(chunk)
-                    chunk_id = await store_chunk(
-                        db_path,
-                        page_id=page_id,
-                        chunk_index=i,
-                        content=chunk,
-                        token_count=token_count
-                    )
-                    all_chunk_ids.append(chunk_id)
+                    chunks_data.append({
+                        'page_id': page_id,
+                        'chunk_index': i,
+                        'content': chunk,
+                        'token_count': count_tokens(chunk)
+                    })
                     all_chunks_text.append(chunk)
+            
+            # Store all chunks in one transaction
+            all_chunk_ids = await store_chunks_batch(db_path, chunks_data, conn=db)
         
         log_with_context(
             logger, logging.INFO,
@@ -214,32 +240,48 @@ async def process_and_embed(
         )
         
         try:
-            embeddings = await generate_embeddings_batch(
-                all_chunks_text,
-                api_key=config.openai_api_key,
-                model=config.models.embeddings,
-                batch_size=100
-            )
+            stored_count = 0
             
-            # Store embeddings
-            valid_embeddings = [
-                (chunk_id, emb)
-                for chunk_id, emb in zip(all_chunk_ids, embeddings)
-                if emb is not None
-            ]
-            
-            if valid_embeddings:
+            async def store_batch(batch_start: int, batch_embeddings: List[Optional[np.ndarray]]) -> None:
+                """Store a finished batch while later batches are still embedding."""
+                nonlocal stored_count
+                valid_embeddings = [
+                    (chunk_id, emb)
+                    for chunk_id, emb in zip(
+                        all_chunk_ids[batch_start:batch_start + len(batch_embeddings)],
+                        batch_embeddings
+                    )
+                    if emb is not None
+                ]
+                if not valid_embeddings:
+                    return
+                
                 chunk_ids, emb_arrays = zip(*valid_embeddings)
                 await store_embeddings_batch(
                     db_path,
                     list(chunk_ids),
                     list(emb_arrays),
-                    config.models.embeddings
+                    config.models.embeddings,
+                    conn=db
+                )
+                stored_count += len(valid_embeddings)
+            
+            # Keep one WAL connection open so each batch costs a single commit
+            async with get_db_connection(db_path) as db:
+                await generate_embeddings_batch(
+                    all_chunks_text,
+                    api_key=config.openai_api_key,
+                    model=config.models.embeddings,
+                    batch_size=100,
+                    on_batch=store_batch,
+                    tokens_per_minute=config.embedding_tokens_per_minute
                 )
+            
+            if stored_count:
                 log_with_context(
                     logger, logging.INFO,
-                    f"Stored {len(valid_embeddings)} embeddings",
-                    context={'embedding_count': len(valid_embeddings)}
+                    f"Stored {stored_count} embeddings",
+                    context={'embedding_count': stored_count}
                 )
             else:
                 log_with_context(
@@ -269,20 +311,17 @@ async def analyze_gaps(db_path: str, config: dict) -> Dict[str, List[Dict[str, A
     """Perform gap analysis."""
     logger.info("Analyzing content gaps...")
     
-    # Get all embeddings
-    primary_embeddings = await get_all_embeddings(db_path, is_primary=True)
-    competitor_embeddings = await get_all_embeddings(db_path, is_primary=False)
+    # Load each side as one normalized matrix store
+    primary_store = await get_all_embeddings(db_path, is_primary=True)
+    competitor_store = await get_all_embeddings(db_path, is_primary=False)
     
-    logger.info(f"Primary embeddings: {len(primary_embeddings)}")
-    logger.info(f"Competitor embeddings: {len(competitor_embeddings)}")
+    logger.info(f"Primary embeddings: {len(primary_store)}")
+    logger.info(f"Competitor embeddings: {len(competitor_store)}")
     
     # Find content gaps using embeddings
-    primary_data = [(cid, emb, url) for cid, pid, emb, url in primary_embeddings]
-    competitor_data = [(cid, emb, url) for cid, pid, emb, url in competitor_embeddings]
-    
     content_gaps = find_content_gaps(
-        primary_data,
-        competitor_data,
+        primary_store,
+        competitor_store,
         threshold=config.similarity_threshold
     )
     
@@ -290,6 +329,9 @@ async def analyze_gaps(db_path: str, config: dict) -> Dict[str, List[Dict[str, A
     if content_gaps:
         await store_gaps_batch(db_path, content_gaps)
     
+    # Refresh index statistics so the detector queries get good plans
+    await optimize_database(db_path)
+    
     # Get all gaps
     gaps = await get_all_gaps(
         db_path,
@@ -312,36 +354,37 @@ async def generate_reports(gaps: dict, config: dict) -> None:
     quick_wins = generate_quick_wins(prioritized)
     summary = generate_summary(gaps)
     
-    # Generate JSON report
-    generate_json_report(
-        gaps=gaps,
-        summary=summary,
-        action_plan=action_plan,
-        quick_wins=quick_wins,
-        config={
-            'site': config.site,
-            'competitors': getattr(config, 'competitors', []),
-            'similarity_threshold': config.similarity_threshold,
-            'chunk_size': config.chunk_size,
-            'thin_content_ratio': config.thresholds.thin_content_ratio
-        },
-        output_path=config.output.json_report
-    )
+    report_config = {
+        'site': config.site,
+        'competitors': getattr(config, 'competitors', []),
+        'similarity_threshold': config.similarity_threshold,
+        'chunk_size': config.chunk_size,
+        'thin_content_ratio': config.thresholds.thin_content_ratio
+    }
     
-    # Generate Markdown report
-    generate_markdown_report(
-        gaps=gaps,
-        summary=summary,
-        action_plan=action_plan,
-        quick_wins=quick_wins,
-        config={
-            'site': config.site,
-            'competitors': getattr(config, 'competitors', []),
-            'similarity_threshold': config.similarity_threshold,
-            'chunk_size': config.chunk_size,
-            'thin_content_ratio': config.thresholds.thin_content_ratio
-        },
-        output_path=config.output.markdown_report
+    # One timestamp shared by both reports
+    generated_at = datetime.now(timezone.utc).isoformat()
+    
+    # Write the JSON and Markdown reports concurrently in worker threads
+    await asyncio.gather(
+        generate_json_report_async(
+            gaps=gaps,
+            summary=summary,
+            action_plan=action_plan,
+            quick_wins=quick_wins,
+            config=report_config,
+            output_path=config.output.json_report,
+            generated_at=generated_at
+        ),
+        generate_markdown_report_async(
+            gaps=gaps,
+            summary=summary,
+            action_plan=action_plan,
+            quick_wins=quick_wins,
+            config=report_config,
+            output_path=config.output.markdown_report,
+            generated_at=generated_at
+        )
     )
     
     logger.info("Reports generated successfully")
@@ -532,6 +575,10 @@ async def main():
             exc_info=True
         )
         raise
+    finally:
+        await close_default_session_manager()
+        await close_shared_connections()
+        shutdown_extraction_executor()
 
 
 if __name__ == "__main__":
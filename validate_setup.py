@@ -19,8 +19,9 @@ def check_dependencies():
     required = [
         ('aiohttp', 'aiohttp'),
         ('yaml', 'pyyaml'),
-        ('bs4', 'beautifulsoup4'),
+        ('selectolax', 'selectolax'),
         ('openai', 'openai'),
+        ('tenacity', 'tenacity'),
         ('numpy', 'numpy'),
         ('sklearn', 'scikit-learn'),
         ('tiktoken', 'tiktoken'),